@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import argparse
+import array
+import json
+import math
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import opuslib_next.sim  # noqa: E402
+
+
+FS = 48000
+CHANNELS = 1
+
+
+def make_pcm16(seconds: float, seed: int) -> bytes:
+    """Tone with a slow amplitude envelope and background noise."""
+    generator = random.Random(seed)
+    pcm = array.array("h")
+    for i in range(int(seconds * FS)):
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 0.7 * i / FS)
+        value = 9000 * envelope * math.sin(2 * math.pi * 220 * i / FS)
+        pcm.append(int(value + generator.uniform(-300, 300)))
+    return pcm.tobytes()
+
+
+def scenarios(seed: int) -> list[tuple[str, object]]:
+    return [
+        ("no loss", lambda: None),
+        ("bernoulli 2%", lambda: opuslib_next.sim.BernoulliLoss(0.02, seed=seed)),
+        ("bernoulli 5%", lambda: opuslib_next.sim.BernoulliLoss(0.05, seed=seed)),
+        ("bernoulli 10%", lambda: opuslib_next.sim.BernoulliLoss(0.10, seed=seed)),
+        (
+            "gilbert 5% burst 3",
+            lambda: opuslib_next.sim.GilbertElliottLoss.from_rate(0.05, 3, seed=seed),
+        ),
+    ]
+
+
+def run(args: argparse.Namespace) -> list[dict]:
+    pcm = make_pcm16(args.seconds, args.seed)
+    results = []
+    for name, make_loss in scenarios(args.seed):
+        for fec in (False, True):
+            network = opuslib_next.sim.Network(
+                loss=make_loss(),
+                delay=args.delay,
+                jitter=args.jitter,
+                reorder=args.reorder,
+                seed=args.seed,
+            )
+            result = opuslib_next.sim.simulate(
+                pcm,
+                network,
+                fs=FS,
+                channels=CHANNELS,
+                bitrate=args.bitrate,
+                inband_fec=fec,
+                frame_duration=args.frame_duration,
+            )
+            results.append(
+                {
+                    "scenario": name,
+                    "fec": fec,
+                    "frames": result.frames,
+                    "network_lost": result.network_lost,
+                    "late": result.late,
+                    "recovered": result.recovered,
+                    "concealed": result.concealed,
+                    "expanded": result.expanded,
+                    "concealed_ratio": result.concealed_ratio,
+                    "bitrate": result.bitrate,
+                    "send_us_per_frame": result.send_cpu_per_frame * 1_000_000,
+                    "receive_us_per_frame": result.receive_cpu_per_frame * 1_000_000,
+                }
+            )
+    return results
+
+
+def format_table(results: list[dict]) -> str:
+    lines = [
+        "| Scenario | FEC | Lost | Late | Recovered | Concealed | Concealed ratio | Bitrate | Send us/frame | Receive us/frame |",
+        "| --- | --- | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: |",
+    ]
+    for item in results:
+        lines.append(
+            f"| {item['scenario']} | {'on' if item['fec'] else 'off'} "
+            f"| {item['network_lost']} | {item['late']} | {item['recovered']} | {item['concealed']} "
+            f"| {item['concealed_ratio']:.2%} | {item['bitrate'] / 1000:.1f} kb/s "
+            f"| {item['send_us_per_frame']:.1f} | {item['receive_us_per_frame']:.1f} |"
+        )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure the CPU and concealment cost of in-band FEC under simulated network impairments."
+    )
+    parser.add_argument("--seconds", type=float, default=20.0, help="Length of the test signal.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the signal and impairments.")
+    parser.add_argument("--bitrate", type=int, default=24000, help="Encoder bitrate in bits per second.")
+    parser.add_argument("--delay", type=int, default=2400, help="Base delay in samples at 48 kHz.")
+    parser.add_argument("--jitter", type=int, default=1920, help="Largest jitter in samples at 48 kHz.")
+    parser.add_argument("--frame-duration", type=int, default=960, help="Frame duration in samples at 48 kHz.")
+    parser.add_argument("--reorder", type=float, default=0.01, help="Fraction of packets held back.")
+    parser.add_argument(
+        "--output-json",
+        type=Path,
+        help="Optional path to save the raw results as JSON.",
+    )
+    args = parser.parse_args()
+
+    results = run(args)
+    print(format_table(results))
+
+    if args.output_json:
+        args.output_json.parent.mkdir(parents=True, exist_ok=True)
+        args.output_json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nWrote raw results to {args.output_json}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
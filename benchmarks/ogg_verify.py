@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import opuslib_next.ogg  # noqa: E402
+
+
+MODES = (
+    opuslib_next.ogg.VERIFY_NONE,
+    opuslib_next.ogg.VERIFY_PAGE,
+    opuslib_next.ogg.VERIFY_BULK,
+)
+
+
+def write_file(path: str, megabytes: float, packet_size: int) -> int:
+    """Writes random 20 ms CELT packets, returns the packet count."""
+    count = int(megabytes * 1024 * 1024 / packet_size)
+    payload = os.urandom(packet_size - 1)
+    packet = bytes([31 << 3]) + payload
+    with open(path, "wb") as fileobj:
+        with opuslib_next.ogg.OggOpusWriter(fileobj, 2) as writer:
+            for _ in range(count):
+                writer.write_packet(packet, 960)
+    return count
+
+
+def read_all(path: str, verify: str) -> int:
+    count = 0
+    with opuslib_next.ogg.OggOpusReader(path, verify=verify) as reader:
+        for packet, _ in reader:
+            count += 1
+            packet.release()
+    return count
+
+
+def measure(path: str, verify: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read_all(path, verify)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure the cost of Ogg page checksum verification when reading."
+    )
+    parser.add_argument("--megabytes", type=float, default=30.0, help="Size of the test file.")
+    parser.add_argument("--packet-size", type=int, default=160, help="Bytes per packet.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode, the best is kept.")
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=2.0,
+        help="Largest allowed time of a verified read relative to an unverified one.",
+    )
+    parser.add_argument(
+        "--output-json",
+        type=Path,
+        help="Optional path to save the raw results as JSON.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.opus")
+        packets = write_file(path, args.megabytes, args.packet_size)
+        times = {verify: measure(path, verify, args.repeat) for verify in MODES}
+
+    baseline = times[opuslib_next.ogg.VERIFY_NONE]
+    results = {
+        "megabytes": args.megabytes,
+        "packets": packets,
+        "seconds": times,
+        "ratios": {verify: seconds / baseline for verify, seconds in times.items()},
+    }
+    print("| Mode | Seconds | Ratio |")
+    print("| --- | ---: | ---: |")
+    for verify in MODES:
+        print(f"| {verify} | {times[verify]:.3f} | {results['ratios'][verify]:.2f}x |")
+
+    if args.output_json:
+        args.output_json.parent.mkdir(parents=True, exist_ok=True)
+        args.output_json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nWrote raw results to {args.output_json}")
+
+    failed = [
+        verify for verify in MODES if results["ratios"][verify] > args.max_ratio
+    ]
+    if failed:
+        print(f"\nVerification exceeds {args.max_ratio:.1f}x: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
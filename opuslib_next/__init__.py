@@ -24,4 +24,5 @@ from .classes import (
     MultiStreamEncoder,
     ProjectionDecoder,
     ProjectionEncoder,
+    Repacketizer,
 )
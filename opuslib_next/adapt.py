@@ -0,0 +1,296 @@
+"""
+Closed-loop bitrate, FEC and frame duration control from receiver feedback.
+
+Usage example:
+
+>>> import opuslib_next.adapt
+>>> encoder = opuslib_next.Encoder(48000, 1, opuslib_next.APPLICATION_VOIP)
+>>> controller = opuslib_next.adapt.RateController(encoder)
+>>> controller.update(loss=0.05, rtt=0.12, bandwidth=64000)
+True
+>>> packet = encoder.encode(pcm, controller.frame_size)
+
+The target bitrate follows a loss-based rule: it is cut in proportion to
+the loss above 10%, raised by 8% per report below 2%, and held in between.
+The bitrate written is the target capped by the available bandwidth, less
+the per-packet header overhead of the chosen frame duration, so it recovers
+as soon as the bandwidth does. The loss percentage, in-band FEC, maximum
+bandpass and frame duration each switch with hysteresis, and an encoder CTL
+is only written when its value changes. A controller is a slotted object,
+so thousands of them cost little memory and a report that changes nothing
+costs no calls into libopus.
+"""
+
+import typing
+
+import opuslib_next
+
+
+DEFAULT_MIN_BITRATE = 6000
+
+DEFAULT_MAX_BITRATE = 64000
+
+DEFAULT_START_BITRATE = 32000
+
+# IPv4, UDP and RTP headers carried by every packet, in bytes
+DEFAULT_PACKET_OVERHEAD = 40
+
+# Weight of a new report in the smoothed loss and round-trip time
+DEFAULT_SMOOTHING = 0.5
+
+# Loss fractions above which the bitrate decreases, and below which it grows
+LOSS_HIGH = 0.10
+
+LOSS_LOW = 0.02
+
+INCREASE_FACTOR = 1.08
+
+# Share of the estimated bandwidth left unused
+BANDWIDTH_HEADROOM = 0.1
+
+# Smallest relative change of the target worth a bitrate write
+BITRATE_DEADBAND = 0.05
+
+# Smallest change of the loss percentage worth a write, in percent
+LOSS_PERC_DEADBAND = 2
+
+# In-band FEC turns on above the first loss fraction and off below the
+# second, with the first halved when the round-trip time is at least
+# `HIGH_RTT` seconds, as retransmission is then not an option
+FEC_ON_LOSS = 0.02
+
+FEC_OFF_LOSS = 0.005
+
+HIGH_RTT = 0.25
+
+# Tiers of (value, bitrate from which it applies), relative switching margin
+BANDWIDTH_TIERS = (
+    (opuslib_next.BANDWIDTH_NARROWBAND, 0),
+    (opuslib_next.BANDWIDTH_WIDEBAND, 12000),
+    (opuslib_next.BANDWIDTH_SUPERWIDEBAND, 20000),
+    (opuslib_next.BANDWIDTH_FULLBAND, 28000),
+)
+
+# Frame durations in samples at 48 kHz, longer frames at low bitrates
+# spend less on headers
+FRAME_DURATION_TIERS = (
+    (2880, 0),
+    (1920, 12000),
+    (960, 20000),
+)
+
+TIER_MARGIN = 0.1
+
+
+def _tier(
+        current: int,
+        value: float,
+        tiers: typing.Sequence[typing.Tuple[int, int]],
+        margin: float
+) -> int:
+    """
+    Returns the index of the tier for `value`, moving from `current` only
+    once `value` clears a threshold by `margin`.
+    """
+    index = current
+    while index + 1 < len(tiers) and \
+            value >= tiers[index + 1][1] * (1 + margin):
+        index += 1
+    while index > 0 and value < tiers[index][1] * (1 - margin):
+        index -= 1
+    return index
+
+
+class RateController(object):
+
+    """
+    Drives the bitrate, loss percentage, in-band FEC, maximum bandpass and
+    frame duration of one encoder from receiver reports.
+
+    The public attributes mirror what was last written to the encoder.
+    """
+
+    __slots__ = (
+        'encoder',
+        'min_bitrate',
+        'max_bitrate',
+        'packet_overhead',
+        'smoothing',
+        'loss',
+        'rtt',
+        'available_bandwidth',
+        'bitrate',
+        'packet_loss_perc',
+        'inband_fec',
+        'max_bandwidth',
+        'frame_duration',
+        'writes',
+        '_fs',
+        '_target',
+        '_bandwidth_tier',
+        '_frame_tier',
+    )
+
+    def __init__(
+            self,
+            encoder,
+            min_bitrate: int = DEFAULT_MIN_BITRATE,
+            max_bitrate: int = DEFAULT_MAX_BITRATE,
+            start_bitrate: int = DEFAULT_START_BITRATE,
+            packet_overhead: int = DEFAULT_PACKET_OVERHEAD,
+            smoothing: float = DEFAULT_SMOOTHING
+    ) -> None:
+        """
+        :param encoder: Encoder of any of the encoder classes.
+        :param min_bitrate: Lowest bitrate set, in bits per second.
+        :param max_bitrate: Highest bitrate set, in bits per second.
+        :param start_bitrate: Bitrate before the first report.
+        :param packet_overhead: Header bytes sent along with each packet.
+        :param smoothing: Weight of a new report in the smoothed values.
+        """
+        if not 0 < min_bitrate <= max_bitrate:
+            raise ValueError('`min_bitrate` must be between 0 and '
+                             '`max_bitrate`')
+        if not 0 < smoothing <= 1:
+            raise ValueError('`smoothing` must be in (0, 1]')
+        self.encoder = encoder
+        self.min_bitrate = min_bitrate
+        self.max_bitrate = max_bitrate
+        self.packet_overhead = packet_overhead
+        self.smoothing = smoothing
+        self._fs = encoder._fs
+
+        self.loss = None
+        self.rtt = None
+        self.available_bandwidth = None
+
+        target = min(max(start_bitrate, min_bitrate), max_bitrate)
+        self._target = float(target)
+        self._bandwidth_tier = _tier(
+            0, target, BANDWIDTH_TIERS, TIER_MARGIN)
+        self._frame_tier = _tier(
+            0, target, FRAME_DURATION_TIERS, TIER_MARGIN)
+
+        # Bring the encoder in line with the mirrored state
+        self.bitrate = target
+        self.packet_loss_perc = 0
+        self.inband_fec = False
+        self.max_bandwidth = BANDWIDTH_TIERS[self._bandwidth_tier][0]
+        self.frame_duration = FRAME_DURATION_TIERS[self._frame_tier][0]
+        encoder.bitrate = self.bitrate
+        encoder.packet_loss_perc = 0
+        encoder.inband_fec = 0
+        encoder.max_bandwidth = self.max_bandwidth
+        self.writes = 4
+
+    def __repr__(self) -> str:
+        return (
+            '{}(bitrate={}, packet_loss_perc={}, inband_fec={}, '
+            'max_bandwidth={}, frame_duration={})'.format(
+                type(self).__name__, self.bitrate, self.packet_loss_perc,
+                self.inband_fec, self.max_bandwidth, self.frame_duration)
+        )
+
+    @property
+    def frame_size(self) -> int:
+        """Frame size to encode with, in samples at the encoder's rate."""
+        return self.frame_duration * self._fs // 48000
+
+    def update(
+            self,
+            loss: typing.Optional[float] = None,
+            rtt: typing.Optional[float] = None,
+            bandwidth: typing.Optional[float] = None
+    ) -> bool:
+        """
+        Takes a receiver report and adjusts the encoder.
+
+        :param loss: Fraction of packets lost since the last report, 0 to 1.
+        :param rtt: Round-trip time, in seconds.
+        :param bandwidth: Estimated available bandwidth, in bits per second,
+            headers included.
+        :returns: True if any setting changed.
+        """
+        smoothing = self.smoothing
+        target = self._target
+        if loss is not None:
+            loss = min(max(loss, 0.0), 1.0)
+            if self.loss is None:
+                self.loss = loss
+            else:
+                self.loss += (loss - self.loss) * smoothing
+            if self.loss > LOSS_HIGH:
+                target *= 1 - 0.5 * self.loss
+            elif self.loss < LOSS_LOW:
+                target *= INCREASE_FACTOR
+        if rtt is not None:
+            self.rtt = rtt if self.rtt is None else \
+                self.rtt + (rtt - self.rtt) * smoothing
+        if bandwidth is not None:
+            self.available_bandwidth = bandwidth
+
+        target = min(max(target, self.min_bitrate), self.max_bitrate)
+        self._target = target
+        budget = self.available_bandwidth
+        overhead = self.packet_overhead * 8 * 48000
+        if budget is None:
+            rate = target
+        else:
+            # The header overhead depends on the frame duration, which is
+            # chosen from the bitrate left at the current duration
+            budget *= 1 - BANDWIDTH_HEADROOM
+            rate = min(target, budget - overhead // self.frame_duration)
+        self._frame_tier = _tier(
+            self._frame_tier, rate, FRAME_DURATION_TIERS, TIER_MARGIN)
+        frame_duration = FRAME_DURATION_TIERS[self._frame_tier][0]
+        if budget is not None:
+            rate = max(
+                min(target, budget - overhead // frame_duration),
+                self.min_bitrate)
+
+        changed = False
+        encoder = self.encoder
+        if frame_duration != self.frame_duration:
+            self.frame_duration = frame_duration
+            changed = True
+
+        bitrate = int(rate)
+        if bitrate != self.bitrate and (
+                abs(bitrate - self.bitrate) >= self.bitrate * BITRATE_DEADBAND
+                or bitrate in (self.min_bitrate, self.max_bitrate)):
+            encoder.bitrate = self.bitrate = bitrate
+            self.writes += 1
+            changed = True
+
+        self._bandwidth_tier = _tier(
+            self._bandwidth_tier, self.bitrate, BANDWIDTH_TIERS, TIER_MARGIN)
+        max_bandwidth = BANDWIDTH_TIERS[self._bandwidth_tier][0]
+        if max_bandwidth != self.max_bandwidth:
+            encoder.max_bandwidth = self.max_bandwidth = max_bandwidth
+            self.writes += 1
+            changed = True
+
+        if self.loss is None:
+            return changed
+
+        percent = min(int(self.loss * 100 + 0.5), 100)
+        if percent != self.packet_loss_perc and (
+                abs(percent - self.packet_loss_perc) >= LOSS_PERC_DEADBAND
+                or percent == 0):
+            encoder.packet_loss_perc = self.packet_loss_perc = percent
+            self.writes += 1
+            changed = True
+
+        fec_on = FEC_ON_LOSS
+        if self.rtt is not None and self.rtt >= HIGH_RTT:
+            fec_on /= 2
+        if self.inband_fec:
+            inband_fec = self.loss >= FEC_OFF_LOSS
+        else:
+            inband_fec = self.loss >= fec_on
+        if inband_fec != self.inband_fec:
+            self.inband_fec = inband_fec
+            encoder.inband_fec = int(inband_fec)
+            self.writes += 1
+            changed = True
+        return changed
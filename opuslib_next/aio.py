@@ -0,0 +1,259 @@
+"""
+asyncio interface to the Opus encoder and decoder.
+
+Usage example:
+
+>>> import opuslib_next.aio
+>>> encoder = opuslib_next.aio.AsyncEncoder(48000, 2, 'audio')
+>>> packet = await encoder.encode(pcm, 960)
+>>> async for packet in opuslib_next.aio.encode_stream(encoder, source, 960):
+...     send(packet)
+
+Encoding and decoding run on an executor so that the event loop is never
+blocked by libopus. ctypes releases the GIL for the duration of the foreign
+call, so the loop keeps running while a frame is being processed. Calls on
+one object are serialized, as libopus states are not thread safe.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import typing
+
+import opuslib_next
+import opuslib_next.classes
+
+
+# Default number of results buffered ahead of the consumer of a stream
+DEFAULT_MAX_PENDING = 4
+
+_END = object()
+
+
+async def _run_locked(
+        lock: asyncio.Lock,
+        executor: typing.Optional[concurrent.futures.Executor],
+        func,
+        *args
+):
+    """
+    Runs `func` on `executor` while holding `lock`.
+
+    A worker thread cannot be interrupted inside libopus, so when the caller
+    is cancelled the lock is kept until the call has returned, before the
+    cancellation is propagated.
+    """
+    async with lock:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            executor, functools.partial(func, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            while not future.done():
+                try:
+                    await asyncio.wait((future,))
+                except asyncio.CancelledError:
+                    pass
+            if not future.cancelled():
+                # Retrieved so that a failure is not reported as unhandled
+                future.exception()
+            raise
+
+
+class AsyncEncoder(object):
+
+    """Awaitable wrapper around `opuslib_next.Encoder`."""
+
+    def __init__(
+            self,
+            fs: int,
+            channels: int,
+            application,
+            executor: typing.Optional[concurrent.futures.Executor] = None
+    ) -> None:
+        """
+        :param fs: Sample Rate.
+        :param channels: Number of channels.
+        :param application: Encoder application, as accepted by `Encoder`.
+        :param executor: Executor running the encoder. Defaults to the event
+            loop's default executor, which has a bounded number of threads.
+        """
+        self.encoder = opuslib_next.classes.Encoder(fs, channels, application)
+        self._channels = channels
+        self._executor = executor
+        self._lock = asyncio.Lock()
+
+    @property
+    def channels(self) -> int:
+        """Number of interleaved channels in the input."""
+        return self._channels
+
+    async def _run(self, func, *args):
+        return await _run_locked(self._lock, self._executor, func, *args)
+
+    async def encode(self, pcm_data: bytes, frame_size: int) -> bytes:
+        """
+        Encodes given PCM data as Opus.
+        """
+        return await self._run(self.encoder.encode, pcm_data, frame_size)
+
+    async def encode_float(self, pcm_data: bytes, frame_size: int) -> bytes:
+        """
+        Encodes given PCM data as Opus.
+        """
+        return await self._run(
+            self.encoder.encode_float, pcm_data, frame_size)
+
+
+class AsyncDecoder(object):
+
+    """Awaitable wrapper around `opuslib_next.Decoder`."""
+
+    def __init__(
+            self,
+            fs: int,
+            channels: int,
+            executor: typing.Optional[concurrent.futures.Executor] = None
+    ) -> None:
+        """
+        :param fs: Sample Rate.
+        :param channels: Number of channels.
+        :param executor: Executor running the decoder. Defaults to the event
+            loop's default executor, which has a bounded number of threads.
+        """
+        self.decoder = opuslib_next.classes.Decoder(fs, channels)
+        self._channels = channels
+        self._executor = executor
+        self._lock = asyncio.Lock()
+
+    @property
+    def channels(self) -> int:
+        """Number of interleaved channels in the output."""
+        return self._channels
+
+    async def _run(self, func, *args):
+        return await _run_locked(self._lock, self._executor, func, *args)
+
+    async def decode(
+            self,
+            opus_data: bytes,
+            frame_size: int,
+            decode_fec: bool = False
+    ) -> bytes:
+        """
+        Decodes given Opus data to PCM.
+        """
+        return await self._run(
+            self.decoder.decode, opus_data, frame_size, decode_fec)
+
+    async def decode_float(
+            self,
+            opus_data: bytes,
+            frame_size: int,
+            decode_fec: bool = False
+    ) -> bytes:
+        """
+        Decodes given Opus data to PCM.
+        """
+        return await self._run(
+            self.decoder.decode_float, opus_data, frame_size, decode_fec)
+
+
+async def _reframe(
+        source: typing.AsyncIterable[bytes],
+        frame_bytes: int,
+        pad_final: bool
+) -> typing.AsyncIterator[bytes]:
+    """Cuts an arbitrarily chunked byte source into whole frames."""
+    pending = bytearray()
+    async for chunk in source:
+        pending += chunk
+        offset = 0
+        while len(pending) - offset >= frame_bytes:
+            yield bytes(pending[offset:offset + frame_bytes])
+            offset += frame_bytes
+        del pending[:offset]
+
+    if pending and pad_final:
+        yield bytes(pending) + b'\x00' * (frame_bytes - len(pending))
+
+
+async def _pipeline(
+        source: typing.AsyncIterable,
+        process: typing.Callable[[typing.Any], typing.Awaitable],
+        max_pending: int
+) -> typing.AsyncIterator:
+    """
+    Runs `process` over `source` in a producer task feeding a bounded queue.
+
+    The producer is suspended while the queue is full, which propagates
+    backpressure to the source. Closing or cancelling the consumer cancels
+    the producer.
+    """
+    queue = asyncio.Queue(max_pending)
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put((await process(item), None))
+        except Exception as exc:  # pylint: disable=broad-except
+            await queue.put((_END, exc))
+        else:
+            await queue.put((_END, None))
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            result, error = await queue.get()
+            if result is _END:
+                if error is not None:
+                    raise error
+                return
+            yield result
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+
+async def encode_stream(
+        encoder: AsyncEncoder,
+        source: typing.AsyncIterable[bytes],
+        frame_size: int,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        pad_final: bool = True
+) -> typing.AsyncIterator[bytes]:
+    """
+    Encodes an async source of signed 16-bit PCM into Opus packets.
+
+    The source may yield chunks of any length; they are regrouped into frames
+    of `frame_size` samples per channel. A trailing partial frame is zero
+    padded unless `pad_final` is false.
+    """
+    frame_bytes = frame_size * encoder.channels * 2
+    frames = _reframe(source, frame_bytes, pad_final)
+    async for packet in _pipeline(
+            frames,
+            lambda frame: encoder.encode(frame, frame_size),
+            max_pending):
+        yield packet
+
+
+async def decode_stream(
+        decoder: AsyncDecoder,
+        source: typing.AsyncIterable[bytes],
+        frame_size: int,
+        max_pending: int = DEFAULT_MAX_PENDING
+) -> typing.AsyncIterator[bytes]:
+    """
+    Decodes an async source of Opus packets into signed 16-bit PCM.
+    """
+    async for pcm in _pipeline(
+            source,
+            lambda packet: decoder.decode(packet, frame_size),
+            max_pending):
+        yield pcm
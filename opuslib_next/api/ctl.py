@@ -94,6 +94,13 @@ get_gain = get(opuslib_next.GET_GAIN_REQUEST, ctypes.c_int)
 # Configures decoder gain adjustment
 set_gain = ctl_set(opuslib_next.SET_GAIN_REQUEST)
 
+# Gets the duration (in samples) of the last packet successfully decoded or
+# concealed
+get_last_packet_duration = get(
+    opuslib_next.GET_LAST_PACKET_DURATION_REQUEST,
+    ctypes.c_int
+)
+
 #
 # Encoder related CTLs
 #
@@ -184,6 +191,27 @@ set_dtx = ctl_set(opuslib_next.SET_DTX_REQUEST)
 # Gets encoder's configured use of discontinuous transmission
 get_dtx = get(opuslib_next.GET_DTX_REQUEST, ctypes.c_int)
 
+# Configures the encoder's use of variable duration frames
+set_expert_frame_duration = ctl_set(
+    opuslib_next.SET_EXPERT_FRAME_DURATION_REQUEST)
+
+# Gets the encoder's configured use of variable duration frames
+get_expert_frame_duration = get(
+    opuslib_next.GET_EXPERT_FRAME_DURATION_REQUEST,
+    ctypes.c_int
+)
+
+# If set to 1, disables almost all use of prediction, making frames almost
+# completely independent
+set_prediction_disabled = ctl_set(
+    opuslib_next.SET_PREDICTION_DISABLED_REQUEST)
+
+# Gets the encoder's configured prediction status
+get_prediction_disabled = get(
+    opuslib_next.GET_PREDICTION_DISABLED_REQUEST,
+    ctypes.c_int
+)
+
 #
 # Projection related CTLs
 #
@@ -154,6 +154,80 @@ def packet_get_samples_per_frame(
     return result
 
 
+libopus_packet_parse = opuslib_next.api.libopus.opus_packet_parse
+libopus_packet_parse.argtypes = (
+    ctypes.c_char_p,
+    ctypes.c_int32,
+    opuslib_next.api.c_ubyte_pointer,
+    ctypes.POINTER(ctypes.c_void_p),
+    opuslib_next.api.c_int16_pointer,
+    opuslib_next.api.c_int_pointer
+)
+libopus_packet_parse.restype = ctypes.c_int
+
+
+def packet_parse(
+        data: bytes
+) -> typing.Tuple[int, typing.Tuple[int, ...], typing.Tuple[int, ...], int]:
+    """
+    Parses an Opus packet into one or more frames.
+
+    Returns a tuple of the TOC byte, the offsets of the frames in `data`,
+    the sizes of the frames and the offset of the first frame.
+    """
+    data_pointer = ctypes.c_char_p(data)
+    toc = ctypes.c_ubyte()
+    frames = (ctypes.c_void_p * 48)()
+    sizes = (ctypes.c_int16 * 48)()
+    payload_offset = ctypes.c_int()
+
+    result = libopus_packet_parse(
+        data_pointer,
+        len(data),
+        ctypes.byref(toc),
+        frames,
+        sizes,
+        ctypes.byref(payload_offset)
+    )
+
+    if result < 0:
+        raise opuslib_next.exceptions.OpusError(result)
+
+    base = ctypes.cast(data_pointer, ctypes.c_void_p).value
+    return (
+        toc.value,
+        tuple(frames[i] - base for i in range(result)),
+        tuple(sizes[:result]),
+        payload_offset.value
+    )
+
+
+# Only exported from libopus 1.5 on
+libopus_packet_has_lbrr = getattr(
+    opuslib_next.api.libopus, 'opus_packet_has_lbrr', None)
+if libopus_packet_has_lbrr is not None:
+    libopus_packet_has_lbrr.argtypes = (ctypes.c_char_p, ctypes.c_int32)
+    libopus_packet_has_lbrr.restype = ctypes.c_int
+
+
+def packet_has_lbrr(data: bytes) -> bool:
+    """
+    Checks whether an Opus packet carries LBRR data, the in-band FEC for
+    the packet before it.
+
+    Raises `OpusError` with `UNIMPLEMENTED` on libopus older than 1.5.
+    """
+    if libopus_packet_has_lbrr is None:
+        raise opuslib_next.exceptions.OpusError(opuslib_next.UNIMPLEMENTED)
+
+    result = libopus_packet_has_lbrr(data, len(data))
+
+    if result < 0:
+        raise opuslib_next.exceptions.OpusError(result)
+
+    return bool(result)
+
+
 libopus_get_nb_samples = opuslib_next.api.libopus.opus_decoder_get_nb_samples
 libopus_get_nb_samples.argtypes = (
     DecoderPointer,
@@ -242,6 +316,41 @@ def decode(
     return array.array('h', pcm_pointer[:result * channels]).tobytes()
 
 
+def decode_into(
+        decoder_state: ctypes.Structure,
+        opus_data: typing.Optional[bytes],
+        length: int,
+        pcm_buffer,
+        frame_size: int,
+        decode_fec: bool,
+        channels: int = 2,
+        offset: int = 0
+) -> int:
+    """
+    Decodes an Opus Frame to signed 16-bit PCM written into the writable
+    buffer `pcm_buffer`, starting at byte `offset`.
+
+    `opus_data` may be None, with a `length` of 0, to run packet loss
+    concealment. Returns the number of samples decoded per channel.
+    """
+    pcm = (ctypes.c_int16 * (frame_size * channels)).from_buffer(
+        pcm_buffer, offset)
+
+    result = libopus_decode(
+        decoder_state,
+        opus_data,
+        length,
+        ctypes.cast(pcm, opuslib_next.api.c_int16_pointer),
+        frame_size,
+        int(decode_fec)
+    )
+
+    if result < 0:
+        raise opuslib_next.exceptions.OpusError(result)
+
+    return result
+
+
 libopus_decode_float = opuslib_next.api.libopus.opus_decode_float
 libopus_decode_float.argtypes = (
     DecoderPointer,
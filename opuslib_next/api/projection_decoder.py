@@ -144,6 +144,41 @@ def decode(
     return array.array('h', pcm_pointer[:result * channels]).tobytes()
 
 
+def decode_into(
+        decoder_state: ctypes.Structure,
+        opus_data: typing.Optional[bytes],
+        length: int,
+        pcm_buffer,
+        frame_size: int,
+        decode_fec: bool,
+        channels: int = 2,
+        offset: int = 0
+) -> int:
+    """
+    Decodes a projection Opus packet to signed 16-bit PCM written into the
+    writable buffer `pcm_buffer`, starting at byte `offset`.
+
+    `opus_data` may be None, with a `length` of 0, to run packet loss
+    concealment. Returns the number of samples decoded per channel.
+    """
+    pcm = (ctypes.c_int16 * (frame_size * channels)).from_buffer(
+        pcm_buffer, offset)
+
+    result = _libopus_decode()(
+        decoder_state,
+        opus_data,
+        length,
+        ctypes.cast(pcm, opuslib_next.api.c_int16_pointer),
+        frame_size,
+        int(decode_fec)
+    )
+
+    if result < 0:
+        raise opuslib_next.OpusError(result)
+
+    return result
+
+
 @functools.lru_cache(maxsize=None)
 def _libopus_decode_float():
     return _require_function(
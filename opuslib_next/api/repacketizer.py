@@ -0,0 +1,236 @@
+"""
+CTypes mapping between libopus repacketizer functions and Python.
+"""
+
+import ctypes
+import functools
+import typing
+
+import opuslib_next
+import opuslib_next.api
+
+
+class Repacketizer(ctypes.Structure):
+    """Opus repacketizer state.
+    This contains the frames added to the repacketizer.
+    """
+    pass
+
+
+RepacketizerPointer = ctypes.POINTER(Repacketizer)
+
+
+def _require_function(name, argtypes, restype):
+    try:
+        func = getattr(opuslib_next.api.libopus, name)
+    except AttributeError as exc:
+        raise opuslib_next.OpusError(opuslib_next.UNIMPLEMENTED) from exc
+
+    func.argtypes = argtypes
+    func.restype = restype
+    return func
+
+
+libopus_get_size = opuslib_next.api.libopus.opus_repacketizer_get_size
+libopus_get_size.argtypes = ()
+libopus_get_size.restype = ctypes.c_int
+libopus_get_size.__doc__ = 'Gets the size of an OpusRepacketizer structure'
+
+
+libopus_create = opuslib_next.api.libopus.opus_repacketizer_create
+libopus_create.argtypes = ()
+libopus_create.restype = RepacketizerPointer
+
+
+def create_state() -> ctypes.Structure:
+    """Allocates memory and initializes a new repacketizer."""
+    state = libopus_create()
+
+    if not state:
+        raise opuslib_next.exceptions.OpusError(opuslib_next.ALLOC_FAIL)
+
+    return state
+
+
+init = opuslib_next.api.libopus.opus_repacketizer_init
+init.argtypes = (RepacketizerPointer,)
+init.restype = RepacketizerPointer
+init.__doc__ = 'Re-initializes a previously allocated repacketizer state'
+
+
+libopus_cat = opuslib_next.api.libopus.opus_repacketizer_cat
+libopus_cat.argtypes = (RepacketizerPointer, ctypes.c_char_p, ctypes.c_int32)
+libopus_cat.restype = ctypes.c_int
+
+
+def cat(repacketizer_state: ctypes.Structure, data: bytes, length: int) -> None:
+    """
+    Adds a packet to the current repacketizer state.
+
+    libopus keeps a pointer to `data` instead of copying it, so the caller
+    must keep `data` alive until the repacketizer is re-initialized.
+    """
+    result = libopus_cat(repacketizer_state, data, length)
+
+    if result != opuslib_next.OK:
+        raise opuslib_next.exceptions.OpusError(result)
+
+
+libopus_out_range = opuslib_next.api.libopus.opus_repacketizer_out_range
+libopus_out_range.argtypes = (
+    RepacketizerPointer,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_char_p,
+    ctypes.c_int32
+)
+libopus_out_range.restype = ctypes.c_int32
+
+
+def out_range(
+        repacketizer_state: ctypes.Structure,
+        begin: int,
+        end: int,
+        data: ctypes.Array,
+        maxlen: int
+) -> int:
+    """
+    Writes a packet made of frames `begin` to `end` (exclusive) into `data`.
+
+    Returns the number of bytes written.
+    """
+    result = libopus_out_range(repacketizer_state, begin, end, data, maxlen)
+
+    if result < 0:
+        raise opuslib_next.exceptions.OpusError(result)
+
+    return result
+
+
+libopus_out = opuslib_next.api.libopus.opus_repacketizer_out
+libopus_out.argtypes = (RepacketizerPointer, ctypes.c_char_p, ctypes.c_int32)
+libopus_out.restype = ctypes.c_int32
+
+
+def out(
+        repacketizer_state: ctypes.Structure,
+        data: ctypes.Array,
+        maxlen: int
+) -> int:
+    """
+    Writes a packet made of all the frames added so far into `data`.
+
+    Returns the number of bytes written.
+    """
+    result = libopus_out(repacketizer_state, data, maxlen)
+
+    if result < 0:
+        raise opuslib_next.exceptions.OpusError(result)
+
+    return result
+
+
+libopus_get_nb_frames = \
+    opuslib_next.api.libopus.opus_repacketizer_get_nb_frames
+libopus_get_nb_frames.argtypes = (RepacketizerPointer,)
+libopus_get_nb_frames.restype = ctypes.c_int
+
+
+# FIXME: Remove typing.Any once we have a stub for ctypes
+def get_nb_frames(
+        repacketizer_state: ctypes.Structure
+) -> typing.Union[int, typing.Any]:
+    """Returns the total number of frames added so far."""
+    return libopus_get_nb_frames(repacketizer_state)
+
+
+destroy = opuslib_next.api.libopus.opus_repacketizer_destroy
+destroy.argtypes = (RepacketizerPointer,)
+destroy.restype = None
+destroy.__doc__ = 'Frees an OpusRepacketizer allocated by ' \
+    'opus_repacketizer_create()'
+
+
+libopus_packet_pad = opuslib_next.api.libopus.opus_packet_pad
+libopus_packet_pad.argtypes = (ctypes.c_char_p, ctypes.c_int32, ctypes.c_int32)
+libopus_packet_pad.restype = ctypes.c_int
+
+
+def packet_pad(data: ctypes.Array, length: int, new_len: int) -> None:
+    """
+    Pads the packet in the first `length` bytes of `data` to `new_len`
+    bytes, in place. `data` must hold at least `new_len` bytes.
+    """
+    result = libopus_packet_pad(data, length, new_len)
+
+    if result != opuslib_next.OK:
+        raise opuslib_next.exceptions.OpusError(result)
+
+
+libopus_packet_unpad = opuslib_next.api.libopus.opus_packet_unpad
+libopus_packet_unpad.argtypes = (ctypes.c_char_p, ctypes.c_int32)
+libopus_packet_unpad.restype = ctypes.c_int32
+
+
+def packet_unpad(data: ctypes.Array, length: int) -> int:
+    """
+    Removes all padding from the packet in the first `length` bytes of
+    `data`, in place. Returns the new length of the packet.
+    """
+    result = libopus_packet_unpad(data, length)
+
+    if result < 0:
+        raise opuslib_next.exceptions.OpusError(result)
+
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _libopus_multistream_packet_pad():
+    return _require_function(
+        'opus_multistream_packet_pad',
+        (ctypes.c_char_p, ctypes.c_int32, ctypes.c_int32, ctypes.c_int),
+        ctypes.c_int
+    )
+
+
+def multistream_packet_pad(
+        data: ctypes.Array,
+        length: int,
+        new_len: int,
+        nb_streams: int
+) -> None:
+    """
+    Pads a multistream packet to `new_len` bytes, in place.
+    """
+    result = _libopus_multistream_packet_pad()(
+        data, length, new_len, nb_streams)
+
+    if result != opuslib_next.OK:
+        raise opuslib_next.exceptions.OpusError(result)
+
+
+@functools.lru_cache(maxsize=None)
+def _libopus_multistream_packet_unpad():
+    return _require_function(
+        'opus_multistream_packet_unpad',
+        (ctypes.c_char_p, ctypes.c_int32, ctypes.c_int),
+        ctypes.c_int32
+    )
+
+
+def multistream_packet_unpad(
+        data: ctypes.Array,
+        length: int,
+        nb_streams: int
+) -> int:
+    """
+    Removes all padding from a multistream packet, in place. Returns the
+    new length of the packet.
+    """
+    result = _libopus_multistream_packet_unpad()(data, length, nb_streams)
+
+    if result < 0:
+        raise opuslib_next.exceptions.OpusError(result)
+
+    return result
@@ -1,5 +1,6 @@
 """High-level interface to a Opus decoder functions"""
 
+import ctypes
 import typing
 
 import opuslib_next
@@ -11,6 +12,17 @@ import opuslib_next.api.multistream_decoder
 import opuslib_next.api.multistream_encoder
 import opuslib_next.api.projection_decoder
 import opuslib_next.api.projection_encoder
+import opuslib_next.api.repacketizer
+
+
+def _conceal_size(decoder, frame_size: typing.Optional[int]) -> int:
+    """
+    Returns the frame size to conceal: `frame_size` if given, else the
+    duration of the last packet, or 20 ms before any packet was decoded.
+    """
+    if frame_size is not None:
+        return frame_size
+    return decoder.last_packet_duration or decoder._fs // 50
 
 
 class Decoder(object):
@@ -78,6 +90,55 @@ class Decoder(object):
             channels=self._channels
         )
 
+    # FIXME: Remove typing.Any once we have a stub for ctypes
+    def conceal(
+            self,
+            frame_size: typing.Optional[int] = None
+        ) -> typing.Union[bytes, typing.Any]:
+        """
+        Synthesizes PCM for a lost packet with packet loss concealment.
+
+        `frame_size` must be a multiple of 2.5 ms and defaults to
+        `last_packet_duration`, or to 20 ms before any packet was decoded.
+        """
+        frame_size = _conceal_size(self, frame_size)
+        return opuslib_next.api.decoder.decode(
+            self.decoder_state,
+            None,
+            0,
+            frame_size,
+            False,
+            channels=self._channels
+        )
+
+    def conceal_into(
+            self,
+            buffer,
+            frame_size: typing.Optional[int] = None,
+            offset: int = 0
+        ) -> int:
+        """
+        Writes concealed PCM into the writable `buffer` at byte `offset`.
+        Returns the number of samples written per channel. `frame_size`
+        defaults as in `conceal`.
+        """
+        frame_size = _conceal_size(self, frame_size)
+        return opuslib_next.api.decoder.decode_into(
+            self.decoder_state,
+            None,
+            0,
+            buffer,
+            frame_size,
+            False,
+            channels=self._channels,
+            offset=offset
+        )
+
+    @property
+    def channels(self) -> int:
+        """Number of channels of the decoded PCM."""
+        return self._channels
+
     # CTL interfaces
 
     _get_final_range = lambda self: opuslib_next.api.decoder.decoder_ctl(
@@ -127,6 +188,21 @@ class Decoder(object):
 
     gain = property(_get_gain, _set_gain)
 
+    _get_last_packet_duration = \
+        lambda self: opuslib_next.api.decoder.decoder_ctl(
+            self.decoder_state,
+            opuslib_next.api.ctl.get_last_packet_duration
+        )
+
+    last_packet_duration = property(_get_last_packet_duration)
+
+    _get_sample_rate = lambda self: opuslib_next.api.decoder.decoder_ctl(
+        self.decoder_state,
+        opuslib_next.api.ctl.get_sample_rate
+    )
+
+    sample_rate = property(_get_sample_rate)
+
 
 class Encoder(object):
 
@@ -319,6 +395,32 @@ class Encoder(object):
 
     dtx = property(_get_dtx, _set_dtx)
 
+    _get_expert_frame_duration = \
+        lambda self: opuslib_next.api.encoder.encoder_ctl(
+            self.encoder_state, opuslib_next.api.ctl.get_expert_frame_duration)
+
+    _set_expert_frame_duration = \
+        lambda self, x: opuslib_next.api.encoder.encoder_ctl(
+            self.encoder_state,
+            opuslib_next.api.ctl.set_expert_frame_duration,
+            x)
+
+    expert_frame_duration = property(
+        _get_expert_frame_duration, _set_expert_frame_duration)
+
+    _get_prediction_disabled = \
+        lambda self: opuslib_next.api.encoder.encoder_ctl(
+            self.encoder_state, opuslib_next.api.ctl.get_prediction_disabled)
+
+    _set_prediction_disabled = \
+        lambda self, x: opuslib_next.api.encoder.encoder_ctl(
+            self.encoder_state,
+            opuslib_next.api.ctl.set_prediction_disabled,
+            x)
+
+    prediction_disabled = property(
+        _get_prediction_disabled, _set_prediction_disabled)
+
 
 class MultiStreamDecoder(object):
 
@@ -400,6 +502,55 @@ class MultiStreamDecoder(object):
             channels=self._channels
         )
 
+    # FIXME: Remove typing.Any once we have a stub for ctypes
+    def conceal(
+            self,
+            frame_size: typing.Optional[int] = None
+        ) -> typing.Union[bytes, typing.Any]:
+        """
+        Synthesizes PCM for a lost packet with packet loss concealment.
+
+        `frame_size` must be a multiple of 2.5 ms and defaults to
+        `last_packet_duration`, or to 20 ms before any packet was decoded.
+        """
+        frame_size = _conceal_size(self, frame_size)
+        return opuslib_next.api.multistream_decoder.decode(
+            self.msdecoder_state,
+            None,
+            0,
+            frame_size,
+            False,
+            channels=self._channels
+        )
+
+    def conceal_into(
+            self,
+            buffer,
+            frame_size: typing.Optional[int] = None,
+            offset: int = 0
+        ) -> int:
+        """
+        Writes concealed PCM into the writable `buffer` at byte `offset`.
+        Returns the number of samples written per channel. `frame_size`
+        defaults as in `conceal`.
+        """
+        frame_size = _conceal_size(self, frame_size)
+        return opuslib_next.api.multistream_decoder.decode_into(
+            self.msdecoder_state,
+            None,
+            0,
+            buffer,
+            frame_size,
+            False,
+            channels=self._channels,
+            offset=offset
+        )
+
+    @property
+    def channels(self) -> int:
+        """Number of channels of the decoded PCM."""
+        return self._channels
+
     # CTL interfaces
 
     _get_final_range = \
@@ -438,6 +589,19 @@ class MultiStreamDecoder(object):
 
     gain = property(_get_gain, _set_gain)
 
+    _get_last_packet_duration = \
+        lambda self: opuslib_next.api.multistream_decoder.decoder_ctl(
+            self.msdecoder_state,
+            opuslib_next.api.ctl.get_last_packet_duration)
+
+    last_packet_duration = property(_get_last_packet_duration)
+
+    _get_sample_rate = \
+        lambda self: opuslib_next.api.multistream_decoder.decoder_ctl(
+            self.msdecoder_state, opuslib_next.api.ctl.get_sample_rate)
+
+    sample_rate = property(_get_sample_rate)
+
 
 class MultiStreamEncoder(object):
 
@@ -666,6 +830,33 @@ class MultiStreamEncoder(object):
 
     dtx = property(_get_dtx, _set_dtx)
 
+    _get_expert_frame_duration = \
+        lambda self: opuslib_next.api.multistream_encoder.encoder_ctl(
+            self.msencoder_state,
+            opuslib_next.api.ctl.get_expert_frame_duration)
+
+    _set_expert_frame_duration = \
+        lambda self, x: opuslib_next.api.multistream_encoder.encoder_ctl(
+            self.msencoder_state,
+            opuslib_next.api.ctl.set_expert_frame_duration,
+            x)
+
+    expert_frame_duration = property(
+        _get_expert_frame_duration, _set_expert_frame_duration)
+
+    _get_prediction_disabled = \
+        lambda self: opuslib_next.api.multistream_encoder.encoder_ctl(
+            self.msencoder_state, opuslib_next.api.ctl.get_prediction_disabled)
+
+    _set_prediction_disabled = \
+        lambda self, x: opuslib_next.api.multistream_encoder.encoder_ctl(
+            self.msencoder_state,
+            opuslib_next.api.ctl.set_prediction_disabled,
+            x)
+
+    prediction_disabled = property(
+        _get_prediction_disabled, _set_prediction_disabled)
+
 
 class ProjectionDecoder(object):
 
@@ -748,6 +939,50 @@ class ProjectionDecoder(object):
             channels=self._channels
         )
 
+    # FIXME: Remove typing.Any once we have a stub for ctypes
+    def conceal(
+            self,
+            frame_size: typing.Optional[int] = None
+        ) -> typing.Union[bytes, typing.Any]:
+        """
+        Synthesizes PCM for a lost packet with packet loss concealment.
+
+        `frame_size` must be a multiple of 2.5 ms and defaults to
+        `last_packet_duration`, or to 20 ms before any packet was decoded.
+        """
+        frame_size = _conceal_size(self, frame_size)
+        return opuslib_next.api.projection_decoder.decode(
+            self.projection_decoder_state,
+            None,
+            0,
+            frame_size,
+            False,
+            channels=self._channels
+        )
+
+    def conceal_into(
+            self,
+            buffer,
+            frame_size: typing.Optional[int] = None,
+            offset: int = 0
+        ) -> int:
+        """
+        Writes concealed PCM into the writable `buffer` at byte `offset`.
+        Returns the number of samples written per channel. `frame_size`
+        defaults as in `conceal`.
+        """
+        frame_size = _conceal_size(self, frame_size)
+        return opuslib_next.api.projection_decoder.decode_into(
+            self.projection_decoder_state,
+            None,
+            0,
+            buffer,
+            frame_size,
+            False,
+            channels=self._channels,
+            offset=offset
+        )
+
     @property
     def streams(self) -> int:
         """Number of streams decoded from the input."""
@@ -758,6 +993,11 @@ class ProjectionDecoder(object):
         """Number of coupled streams decoded from the input."""
         return self._coupled_streams
 
+    @property
+    def channels(self) -> int:
+        """Number of channels of the decoded PCM."""
+        return self._channels
+
     # CTL interfaces
 
     _get_final_range = \
@@ -800,6 +1040,20 @@ class ProjectionDecoder(object):
 
     gain = property(_get_gain, _set_gain)
 
+    _get_last_packet_duration = \
+        lambda self: opuslib_next.api.projection_decoder.decoder_ctl(
+            self.projection_decoder_state,
+            opuslib_next.api.ctl.get_last_packet_duration)
+
+    last_packet_duration = property(_get_last_packet_duration)
+
+    _get_sample_rate = \
+        lambda self: opuslib_next.api.projection_decoder.decoder_ctl(
+            self.projection_decoder_state,
+            opuslib_next.api.ctl.get_sample_rate)
+
+    sample_rate = property(_get_sample_rate)
+
 
 class ProjectionEncoder(object):
 
@@ -1073,6 +1327,34 @@ class ProjectionEncoder(object):
 
     dtx = property(_get_dtx, _set_dtx)
 
+    _get_expert_frame_duration = \
+        lambda self: opuslib_next.api.projection_encoder.encoder_ctl(
+            self.projection_encoder_state,
+            opuslib_next.api.ctl.get_expert_frame_duration)
+
+    _set_expert_frame_duration = \
+        lambda self, x: opuslib_next.api.projection_encoder.encoder_ctl(
+            self.projection_encoder_state,
+            opuslib_next.api.ctl.set_expert_frame_duration,
+            x)
+
+    expert_frame_duration = property(
+        _get_expert_frame_duration, _set_expert_frame_duration)
+
+    _get_prediction_disabled = \
+        lambda self: opuslib_next.api.projection_encoder.encoder_ctl(
+            self.projection_encoder_state,
+            opuslib_next.api.ctl.get_prediction_disabled)
+
+    _set_prediction_disabled = \
+        lambda self, x: opuslib_next.api.projection_encoder.encoder_ctl(
+            self.projection_encoder_state,
+            opuslib_next.api.ctl.set_prediction_disabled,
+            x)
+
+    prediction_disabled = property(
+        _get_prediction_disabled, _set_prediction_disabled)
+
     _get_demixing_matrix_gain = \
         lambda self: opuslib_next.api.projection_encoder.encoder_ctl(
             self.projection_encoder_state,
@@ -1086,3 +1368,90 @@ class ProjectionEncoder(object):
             opuslib_next.api.ctl.get_demixing_matrix_size)
 
     demixing_matrix_size = property(_get_demixing_matrix_size)
+
+
+class Repacketizer(object):
+
+    """High-Level Repacketizer Object.
+
+    Merges packets into longer packets and splits multi-frame packets into
+    shorter ones without decoding. One repacketizer state and one output
+    buffer are reused for every operation.
+    """
+
+    # Output size that is always sufficient for a 48 frame packet
+    MAX_PACKET_SIZE = 1277 * 48
+
+    def __init__(self) -> None:
+        self._packets = []
+        self._buffer = (ctypes.c_char * self.MAX_PACKET_SIZE)()
+        self.repacketizer_state = \
+            opuslib_next.api.repacketizer.create_state()
+
+    def __del__(self) -> None:
+        if hasattr(self, 'repacketizer_state'):
+            # Destroying state only if __init__ completed successfully
+            opuslib_next.api.repacketizer.destroy(self.repacketizer_state)
+
+    def reset(self) -> None:
+        """
+        Discards the frames added so far.
+        """
+        opuslib_next.api.repacketizer.init(self.repacketizer_state)
+        self._packets.clear()
+
+    def cat(self, packet: bytes) -> None:
+        """
+        Adds a packet. All packets must share the TOC configuration of the
+        first one and together last at most 120 ms.
+        """
+        if not isinstance(packet, bytes):
+            packet = bytes(packet)
+        opuslib_next.api.repacketizer.cat(
+            self.repacketizer_state, packet, len(packet))
+        # libopus keeps pointers into the packet until the next reset
+        self._packets.append(packet)
+
+    @property
+    def nb_frames(self) -> int:
+        """Number of frames added since the last reset."""
+        return opuslib_next.api.repacketizer.get_nb_frames(
+            self.repacketizer_state)
+
+    def out(self) -> bytes:
+        """
+        Returns a packet made of all the frames added since the last reset.
+        """
+        length = opuslib_next.api.repacketizer.out(
+            self.repacketizer_state, self._buffer, self.MAX_PACKET_SIZE)
+        return ctypes.string_at(self._buffer, length)
+
+    def out_range(self, begin: int, end: int) -> bytes:
+        """
+        Returns a packet made of frames `begin` to `end` (exclusive).
+        """
+        length = opuslib_next.api.repacketizer.out_range(
+            self.repacketizer_state, begin, end, self._buffer,
+            self.MAX_PACKET_SIZE)
+        return ctypes.string_at(self._buffer, length)
+
+    def merge(self, packets: typing.Iterable[bytes]) -> bytes:
+        """
+        Merges consecutive packets, e.g. three 20 ms packets into one 60 ms
+        packet.
+        """
+        self.reset()
+        for packet in packets:
+            self.cat(packet)
+        return self.out()
+
+    def split(self, packet: bytes) -> typing.List[bytes]:
+        """
+        Splits a multi-frame packet into single-frame packets.
+        """
+        self.reset()
+        self.cat(packet)
+        return [
+            self.out_range(index, index + 1)
+            for index in range(self.nb_frames)
+        ]
@@ -94,6 +94,17 @@ BANDWIDTH_WIDEBAND = 1103
 BANDWIDTH_SUPERWIDEBAND = 1104
 BANDWIDTH_FULLBAND = 1105
 
+FRAMESIZE_ARG = 5000
+FRAMESIZE_2_5_MS = 5001
+FRAMESIZE_5_MS = 5002
+FRAMESIZE_10_MS = 5003
+FRAMESIZE_20_MS = 5004
+FRAMESIZE_40_MS = 5005
+FRAMESIZE_60_MS = 5006
+FRAMESIZE_80_MS = 5007
+FRAMESIZE_100_MS = 5008
+FRAMESIZE_120_MS = 5009
+
 APPLICATION_TYPES_MAP = {
     'voip': APPLICATION_VOIP,
     'audio': APPLICATION_AUDIO,
@@ -0,0 +1,129 @@
+"""
+Discontinuous transmission (DTX) on top of the Opus encoder.
+
+Usage example:
+
+>>> import opuslib_next.dtx
+>>> import opuslib_next.rtp
+>>> encoder = opuslib_next.Encoder(48000, 1, opuslib_next.APPLICATION_VOIP)
+>>> stream = opuslib_next.dtx.DtxEncoder(encoder)
+>>> payloader = opuslib_next.rtp.Payloader()
+>>> for pcm in frames:
+...     datagram = stream.payload(pcm, 960, payloader)
+...     if datagram is not None:
+...         send(datagram)
+
+During silence a DTX encoder emits packets of one or two bytes, with a
+regular update frame every 400 ms. `DtxEncoder` sends the first DTX packet
+of each run, so that receivers can tell silence from loss, and suppresses
+the rest, or sends one per `keepalive` period. Suppressed frames still
+advance the stream position, which shows up as a timestamp gap in RTP, and
+the packet ending the gap carries the marker bit.
+
+`opuslib_next.jitter.JitterBuffer` plays comfort noise, synthesized by
+packet loss concealment, over the gaps following a DTX packet.
+"""
+
+import typing
+
+import opuslib_next
+import opuslib_next.packet
+
+
+class DtxEncoder(object):
+
+    """
+    Encodes with DTX and filters out the silence packets not worth sending.
+
+    Positions and durations are in samples at 48 kHz.
+    """
+
+    def __init__(
+            self,
+            encoder,
+            keepalive: typing.Optional[int] = None
+    ) -> None:
+        """
+        :param encoder: Single-stream encoder, DTX is enabled on it.
+        :param keepalive: Longest time without sending a packet during
+            silence. DTX packets are only sent at the start of a run if
+            omitted.
+        """
+        if keepalive is not None and keepalive <= 0:
+            raise ValueError('`keepalive` must be positive')
+        encoder.dtx = True
+        self.encoder = encoder
+        self.keepalive = keepalive
+        self._scale = 48000 // encoder._fs
+
+        # Stream position of the next frame and of the last packet returned
+        self.position = 0
+        self.timestamp = None
+        self._in_dtx = False
+        self._unsent = 0
+
+        self.sent = 0
+        self.suppressed = 0
+        self.suppressed_samples = 0
+
+    def encode(
+            self,
+            pcm_data: bytes,
+            frame_size: int
+    ) -> typing.Optional[bytes]:
+        """Encodes a frame, returns None if its packet should not be sent."""
+        return self._filter(
+            self.encoder.encode(pcm_data, frame_size), frame_size)
+
+    def encode_float(
+            self,
+            pcm_data: bytes,
+            frame_size: int
+    ) -> typing.Optional[bytes]:
+        """Encodes a float frame, returns None if it should not be sent."""
+        return self._filter(
+            self.encoder.encode_float(pcm_data, frame_size), frame_size)
+
+    def payload(
+            self,
+            pcm_data: bytes,
+            frame_size: int,
+            payloader
+    ) -> typing.Optional[bytearray]:
+        """
+        Encodes a frame into an RTP datagram of `payloader`, an
+        `opuslib_next.rtp.Payloader`. Returns None if the packet is
+        suppressed, in which case the RTP timestamp skips over the frame.
+        """
+        packet = self.encode(pcm_data, frame_size)
+        samples = frame_size * self._scale
+        if packet is None:
+            payloader.advance(samples)
+            return None
+        return payloader.payload(packet, samples)
+
+    def _filter(
+            self,
+            packet: bytes,
+            frame_size: int
+    ) -> typing.Optional[bytes]:
+        samples = frame_size * self._scale
+        position = self.position
+        self.position = position + samples
+
+        if len(packet) <= opuslib_next.packet.DTX_MAX_BYTES:
+            keepalive = self.keepalive
+            if self._in_dtx and (
+                    keepalive is None or self._unsent + samples < keepalive):
+                self._unsent += samples
+                self.suppressed += 1
+                self.suppressed_samples += samples
+                return None
+            self._in_dtx = True
+        else:
+            self._in_dtx = False
+
+        self._unsent = 0
+        self.timestamp = position
+        self.sent += 1
+        return packet
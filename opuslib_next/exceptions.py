@@ -15,7 +15,8 @@ class OpusError(Exception):
 
     def __init__(self, code: int) -> None:
         self.code = code
-        super().__init__()
+        # Keeping `code` in `args` lets the error cross process boundaries
+        super().__init__(code)
 
     # FIXME: Remove typing.Any once we have a stub for ctypes
     def __str__(self) -> typing.Union[str, typing.Any]:
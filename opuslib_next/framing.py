@@ -0,0 +1,228 @@
+"""
+Encoding of arbitrary-length PCM chunks with a variable frame duration.
+
+Usage example:
+
+>>> import opuslib_next.framing
+>>> encoder = opuslib_next.Encoder(48000, 1, opuslib_next.APPLICATION_AUDIO)
+>>> stream = opuslib_next.framing.VariableFrameEncoder(
+...     encoder, overhead_budget=4000)
+>>> for chunk in chunks:
+...     for packet in stream.encode(chunk):
+...         send(packet)
+>>> stream.max_latency = 480  # Interactive from now on, 10 ms frames
+>>> packets = stream.flush()
+
+The frame duration is the shortest one whose per-packet headers stay within
+`overhead_budget` bits per second, capped at `max_latency`. Both can change
+between calls, so one encoder serves archival paths with 120 ms frames and
+interactive paths with 2.5 ms frames. The duration is enforced in libopus
+with the expert frame duration CTL, which is only written when it changes.
+Input is buffered until a whole frame is available.
+"""
+
+import typing
+
+import opuslib_next
+import opuslib_next.adapt
+
+
+# Frame durations in samples at 48 kHz, with their expert frame duration
+FRAME_DURATIONS = (
+    (120, opuslib_next.FRAMESIZE_2_5_MS),
+    (240, opuslib_next.FRAMESIZE_5_MS),
+    (480, opuslib_next.FRAMESIZE_10_MS),
+    (960, opuslib_next.FRAMESIZE_20_MS),
+    (1920, opuslib_next.FRAMESIZE_40_MS),
+    (2880, opuslib_next.FRAMESIZE_60_MS),
+    (3840, opuslib_next.FRAMESIZE_80_MS),
+    (4800, opuslib_next.FRAMESIZE_100_MS),
+    (5760, opuslib_next.FRAMESIZE_120_MS),
+)
+
+# Frame duration with neither a latency target nor an overhead budget
+DEFAULT_FRAME_DURATION = 960
+
+
+class VariableFrameEncoder(object):
+
+    """
+    Buffers PCM chunks of any length and encodes them in frames of the
+    duration picked from the latency target and overhead budget.
+
+    Durations are in samples at 48 kHz.
+    """
+
+    def __init__(
+            self,
+            encoder,
+            max_latency: typing.Optional[int] = None,
+            overhead_budget: typing.Optional[float] = None,
+            packet_overhead: int = opuslib_next.adapt.DEFAULT_PACKET_OVERHEAD
+    ) -> None:
+        """
+        :param encoder: Encoder of any of the encoder classes.
+        :param max_latency: Longest frame duration allowed.
+        :param overhead_budget: Largest bitrate spent on packet headers, in
+            bits per second.
+        :param packet_overhead: Header bytes sent along with each packet.
+        """
+        if packet_overhead < 0:
+            raise ValueError('`packet_overhead` must not be negative')
+        self.encoder = encoder
+        self._fs = encoder._fs
+        self._channels = encoder._channels
+        self._packet_overhead = packet_overhead
+        self._max_latency = None
+        self._overhead_budget = None
+        self.max_latency = max_latency
+        self.overhead_budget = overhead_budget
+
+        self._pending = bytearray()
+        self._sample_size = None
+        self._expert = None
+
+        # Stream position of the next packet
+        self.position = 0
+
+    def __repr__(self) -> str:
+        return '{}(frame_duration={}, position={}, pending={})'.format(
+            type(self).__name__, self.frame_duration, self.position,
+            self.pending)
+
+    @property
+    def max_latency(self) -> typing.Optional[int]:
+        """Longest frame duration allowed, or None."""
+        return self._max_latency
+
+    @max_latency.setter
+    def max_latency(self, value: typing.Optional[int]) -> None:
+        if value is not None and value < FRAME_DURATIONS[0][0]:
+            raise ValueError(
+                '`max_latency` must be at least {} samples'.format(
+                    FRAME_DURATIONS[0][0]))
+        self._max_latency = value
+        self._select()
+
+    @property
+    def overhead_budget(self) -> typing.Optional[float]:
+        """Largest header bitrate, in bits per second, or None."""
+        return self._overhead_budget
+
+    @overhead_budget.setter
+    def overhead_budget(self, value: typing.Optional[float]) -> None:
+        if value is not None and value <= 0:
+            raise ValueError('`overhead_budget` must be positive')
+        self._overhead_budget = value
+        self._select()
+
+    @property
+    def frame_size(self) -> int:
+        """Frame size encoded, in samples at the encoder's rate."""
+        return self.frame_duration * self._fs // 48000
+
+    @property
+    def pending(self) -> int:
+        """Buffered samples per channel, at the encoder's rate."""
+        if not self._sample_size:
+            return 0
+        return len(self._pending) // (self._sample_size * self._channels)
+
+    def _select(self) -> None:
+        """Picks the frame duration for the current settings."""
+        budget = self._overhead_budget
+        latency = self._max_latency
+        if budget is not None:
+            needed = self._packet_overhead * 8 * 48000 / budget
+            index = next(
+                (index for index, (duration, _) in enumerate(FRAME_DURATIONS)
+                 if duration >= needed),
+                len(FRAME_DURATIONS) - 1)
+        elif latency is not None:
+            index = len(FRAME_DURATIONS) - 1
+        else:
+            index = [duration for duration, _ in FRAME_DURATIONS].index(
+                DEFAULT_FRAME_DURATION)
+        while latency is not None and FRAME_DURATIONS[index][0] > latency:
+            index -= 1
+        self.frame_duration, self._frame_expert = FRAME_DURATIONS[index]
+
+    def _set_expert(self, expert: int) -> None:
+        if expert != self._expert:
+            self.encoder.expert_frame_duration = self._expert = expert
+
+    def _encode(
+            self,
+            pcm_data: bytes,
+            sample_size: int,
+            encode: typing.Callable[[bytes, int], bytes]
+    ) -> typing.List[bytes]:
+        pending = self._pending
+        if pending and sample_size != self._sample_size:
+            raise ValueError('Cannot mix 16-bit and float PCM in one frame')
+        self._sample_size = sample_size
+        pending += pcm_data
+
+        frame_size = self.frame_size
+        frame_bytes = frame_size * self._channels * sample_size
+        if len(pending) < frame_bytes:
+            return []
+        self._set_expert(self._frame_expert)
+
+        packets = []
+        view = memoryview(pending)
+        offset = 0
+        try:
+            while offset + frame_bytes <= len(pending):
+                packets.append(
+                    encode(bytes(view[offset:offset + frame_bytes]),
+                           frame_size))
+                offset += frame_bytes
+        finally:
+            view.release()
+            del pending[:offset]
+            self.position += len(packets) * self.frame_duration
+        return packets
+
+    def encode(self, pcm_data: bytes) -> typing.List[bytes]:
+        """
+        Buffers interleaved 16-bit PCM and returns the packets of all the
+        whole frames available.
+        """
+        return self._encode(pcm_data, 2, self.encoder.encode)
+
+    def encode_float(self, pcm_data: bytes) -> typing.List[bytes]:
+        """
+        Buffers interleaved float PCM and returns the packets of all the
+        whole frames available.
+        """
+        return self._encode(pcm_data, 4, self.encoder.encode_float)
+
+    def flush(self) -> typing.List[bytes]:
+        """
+        Encodes the buffered samples in frames of the current duration, the
+        remainder padded with silence to the shortest frame duration holding
+        it.
+        """
+        if not self.pending:
+            return []
+        sample_size = self._sample_size
+        encode = self.encoder.encode if sample_size == 2 else \
+            self.encoder.encode_float
+        packets = self._encode(b'', sample_size, encode)
+        samples = self.pending
+        if not samples:
+            return packets
+
+        duration, expert = next(
+            (duration, expert) for duration, expert in FRAME_DURATIONS
+            if duration * self._fs // 48000 >= samples)
+        frame_size = duration * self._fs // 48000
+        frame_bytes = frame_size * self._channels * sample_size
+        pcm_data = bytes(self._pending).ljust(frame_bytes, b'\0')
+
+        self._set_expert(expert)
+        packets.append(encode(pcm_data, frame_size))
+        del self._pending[:]
+        self.position += duration
+        return packets
@@ -0,0 +1,198 @@
+"""
+Encode and decode jobs on a pool of sub-interpreters.
+
+Usage example:
+
+>>> import opuslib_next.interpreters
+>>> with opuslib_next.interpreters.InterpreterExecutor(4) as executor:
+...     packets = executor.encode(segments, 48000, 2, 'audio', 960)
+
+Python 3.14 provides `concurrent.futures.InterpreterPoolExecutor`, where
+every worker is a sub-interpreter with its own GIL. `opuslib_next` keeps no
+state shared between interpreters: every interpreter imports the package on
+its own, loads libopus once through its own `ctypes.CDLL` and configures its
+own function prototypes, and codec states never leave the interpreter that
+created them.
+
+Jobs are stateless: each segment is processed by a fresh encoder or decoder.
+PCM is handed to the workers through `SharedMemory` blocks, so only the block
+name and offsets are passed to the interpreters.
+"""
+
+import concurrent.futures
+import multiprocessing.shared_memory
+import typing
+
+import opuslib_next
+import opuslib_next.classes
+
+
+def _attach(name: str) -> multiprocessing.shared_memory.SharedMemory:
+    try:
+        # The creating interpreter owns the block and unlinks it
+        return multiprocessing.shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        return multiprocessing.shared_memory.SharedMemory(name)
+
+
+def _encode_job(
+        shm_name: str,
+        offset: int,
+        length: int,
+        fs: int,
+        channels: int,
+        application: int,
+        frame_size: int,
+        ctls: typing.Tuple[typing.Tuple[str, int], ...]
+) -> typing.List[bytes]:
+    """Encodes the PCM segment at `offset` of a shared memory block."""
+    encoder = opuslib_next.classes.Encoder(fs, channels, application)
+    for name, value in ctls:
+        setattr(encoder, name, value)
+
+    frame_bytes = frame_size * channels * 2
+    shm = _attach(shm_name)
+    try:
+        packets = []
+        for start in range(offset, offset + length, frame_bytes):
+            frame = bytes(shm.buf[start:min(start + frame_bytes,
+                                            offset + length)])
+            if len(frame) < frame_bytes:
+                frame += b'\x00' * (frame_bytes - len(frame))
+            packets.append(encoder.encode(frame, frame_size))
+        return packets
+    finally:
+        shm.close()
+
+
+def _decode_job(
+        shm_name: str,
+        offset: int,
+        packets: typing.Sequence[bytes],
+        fs: int,
+        channels: int,
+        frame_size: int
+) -> int:
+    """
+    Decodes `packets` into a shared memory block starting at `offset`.
+
+    Returns the number of bytes written.
+    """
+    decoder = opuslib_next.classes.Decoder(fs, channels)
+    shm = _attach(shm_name)
+    try:
+        position = offset
+        for packet in packets:
+            pcm = decoder.decode(packet, frame_size)
+            shm.buf[position:position + len(pcm)] = pcm
+            position += len(pcm)
+        return position - offset
+    finally:
+        shm.close()
+
+
+class InterpreterExecutor(object):
+
+    """Runs encode and decode jobs across sub-interpreters."""
+
+    def __init__(
+            self,
+            max_workers: typing.Optional[int] = None,
+            executor: typing.Optional[concurrent.futures.Executor] = None
+    ) -> None:
+        """
+        :param max_workers: Number of interpreters in the pool.
+        :param executor: Executor to run the jobs on instead of an
+            `InterpreterPoolExecutor`, for example on Python < 3.14.
+        """
+        if executor is None:
+            pool_class = getattr(
+                concurrent.futures, 'InterpreterPoolExecutor', None)
+            if pool_class is None:
+                raise RuntimeError(
+                    'InterpreterPoolExecutor requires Python 3.14 or newer')
+            executor = pool_class(max_workers)
+        self._executor = executor
+
+    def __enter__(self) -> 'InterpreterExecutor':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shuts down the underlying executor."""
+        self._executor.shutdown(wait)
+
+    def encode(
+            self,
+            segments: typing.Sequence[bytes],
+            fs: int,
+            channels: int,
+            application,
+            frame_size: int,
+            **ctls: int
+    ) -> typing.List[typing.List[bytes]]:
+        """
+        Encodes independent segments of signed 16-bit PCM in parallel.
+
+        Returns the packets of every segment, in segment order. A trailing
+        partial frame of a segment is zero padded.
+        """
+        if application in opuslib_next.APPLICATION_TYPES_MAP:
+            application = opuslib_next.APPLICATION_TYPES_MAP[application]
+
+        total = sum(len(segment) for segment in segments)
+        if not total:
+            return [[] for _ in segments]
+
+        shm = multiprocessing.shared_memory.SharedMemory(
+            create=True, size=total)
+        try:
+            futures = []
+            offset = 0
+            for segment in segments:
+                shm.buf[offset:offset + len(segment)] = segment
+                futures.append(self._executor.submit(
+                    _encode_job, shm.name, offset, len(segment), fs,
+                    channels, application, frame_size, tuple(ctls.items())))
+                offset += len(segment)
+            return [future.result() for future in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def decode(
+            self,
+            segments: typing.Sequence[typing.Sequence[bytes]],
+            fs: int,
+            channels: int,
+            frame_size: int
+    ) -> typing.List[bytes]:
+        """
+        Decodes independent packet sequences in parallel.
+
+        Returns the signed 16-bit PCM of every sequence, in sequence order.
+        """
+        sizes = [len(packets) * frame_size * channels * 2
+                 for packets in segments]
+        if not sum(sizes):
+            return [b'' for _ in segments]
+
+        shm = multiprocessing.shared_memory.SharedMemory(
+            create=True, size=sum(sizes))
+        try:
+            futures = []
+            offset = 0
+            for packets, size in zip(segments, sizes):
+                futures.append((offset, self._executor.submit(
+                    _decode_job, shm.name, offset, tuple(packets), fs,
+                    channels, frame_size)))
+                offset += size
+            return [
+                bytes(shm.buf[offset:offset + future.result()])
+                for offset, future in futures
+            ]
+        finally:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,419 @@
+"""
+Adaptive jitter buffer driving an Opus decoder.
+
+Usage example:
+
+>>> import opuslib_next.jitter
+>>> decoder = opuslib_next.Decoder(48000, 2)
+>>> buffer = opuslib_next.jitter.JitterBuffer(decoder)
+>>> for packet in depayloader.depayload_batch(datagrams):
+...     buffer.put_rtp(packet)
+>>> pcm = buffer.get()
+
+`get` is called once per playout tick and returns the PCM for the next
+stretch of the stream, of the duration of the packet played or of one
+concealment unit. Time is counted in samples at 48 kHz, the RTP clock of
+Opus, and advances with the audio returned by `get`, so the buffer needs
+no wall clock.
+
+The target delay is a quantile of the transit times of recent packets,
+measured against that playout clock. The delay grows by playing concealed
+frames without advancing in the stream, when a packet is due but missing
+or the buffer runs short of the target, and shrinks by dropping packets
+when it runs deeper. Both happen a packet earlier on DTX packets, and
+silence between DTX packets is shortened rather than dropping speech.
+Frames played to grow the delay are counted in `expanded` only.
+
+Gaps in the stream are told apart from silence by the extended RTP
+sequence numbers passed to `put_rtp` or `put`. Missing sequence numbers
+are taken to be the packets just before the next one received, the rest
+of the gap is silence. Without sequence numbers, a gap is silence when it
+follows a DTX packet, except for the frame just before a speech packet
+carrying FEC.
+
+A lost packet is recovered from the in-band FEC of the following one when
+that packet is already buffered and libopus finds FEC in it, and concealed
+otherwise. Long concealment bursts fade to silence, after which the decoder
+is no longer called. Silence is filled with comfort noise from concealment,
+without fading.
+"""
+
+import array
+import collections
+import heapq
+import typing
+
+import opuslib_next
+import opuslib_next.api.decoder
+import opuslib_next.packet
+
+
+# Default concealment unit and smallest delay, in samples at 48 kHz
+DEFAULT_FRAME_SIZE = 960
+
+DEFAULT_MIN_DELAY = 960
+
+DEFAULT_MAX_DELAY = 9600
+
+# Number of recent transit times the target delay is computed from
+DEFAULT_WINDOW = 100
+
+# Fraction of recent packets that should arrive before their playout time
+DEFAULT_QUANTILE = 0.95
+
+# Concealed audio after which output fades out, and length of the fade
+DEFAULT_FADE_AFTER = 5760
+
+DEFAULT_FADE_LENGTH = 4800
+
+# The target delay is recomputed after this many packets
+_UPDATE_INTERVAL = 8
+
+# Smallest duration libopus can conceal, in samples at 48 kHz
+_MIN_CONCEAL = 120
+
+
+def _unwrap(timestamp: int, reference: int) -> int:
+    """Unwraps a 32-bit RTP timestamp to the one closest to `reference`."""
+    return reference + (
+        (timestamp - reference + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+def _has_fec(packet: bytes) -> bool:
+    """Whether `packet` carries FEC, assumed when libopus cannot tell."""
+    try:
+        return opuslib_next.api.decoder.packet_has_lbrr(packet)
+    except opuslib_next.OpusError as exc:
+        return exc.code == opuslib_next.UNIMPLEMENTED
+
+
+class JitterBuffer(object):
+
+    """
+    Reorders Opus packets by timestamp and plays them out through a decoder.
+
+    Durations are in samples at 48 kHz. Output is 16-bit interleaved PCM at
+    the decoder's sample rate. Frames concealed to add delay are counted in
+    `expanded` only, `concealed` and `comfort_noise` count gaps in the
+    stream.
+    """
+
+    def __init__(
+            self,
+            decoder,
+            frame_size: int = DEFAULT_FRAME_SIZE,
+            min_delay: int = DEFAULT_MIN_DELAY,
+            max_delay: int = DEFAULT_MAX_DELAY,
+            window: int = DEFAULT_WINDOW,
+            quantile: float = DEFAULT_QUANTILE,
+            fade_after: int = DEFAULT_FADE_AFTER,
+            fade_length: int = DEFAULT_FADE_LENGTH
+    ) -> None:
+        """
+        :param decoder: Decoder of the stream, of any of the decoder classes.
+        :param frame_size: Concealment unit until a packet has been played.
+        :param min_delay: Smallest delay kept over the fastest recent packet.
+        :param max_delay: Largest delay kept over the fastest recent packet.
+        :param window: Number of recent packets the delay adapts to.
+        :param quantile: Fraction of these that should arrive in time.
+        :param fade_after: Concealed duration before the output fades out.
+        :param fade_length: Duration of the fade to silence.
+        """
+        if frame_size % _MIN_CONCEAL or not \
+                0 < frame_size <= opuslib_next.packet.MAX_PACKET_SAMPLES:
+            raise ValueError(
+                '`frame_size` must be a multiple of 2.5 ms up to 120 ms')
+        if not 0 <= min_delay <= max_delay:
+            raise ValueError('`min_delay` must be between 0 and `max_delay`')
+        if not 0 < quantile <= 1:
+            raise ValueError('`quantile` must be in (0, 1]')
+        self.decoder = decoder
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.quantile = quantile
+        self.fade_after = fade_after
+        self.fade_length = max(fade_length, 1)
+
+        self._channels = decoder.channels
+        self._scale = 48000 // decoder.sample_rate
+        self._frame_size = frame_size
+        self._transits = collections.deque(maxlen=max(window, 1))
+        self._heap = []
+        self._packets = {}
+
+        # Playout clock, position in the stream and target clock offset
+        self._clock = 0
+        self._next = None
+        self._target = None
+        self._pending_updates = 0
+        self._burst = 0
+        self._playing = False
+        self._in_dtx = False
+        # Sequence number of the last packet played or dropped
+        self._sequence = None
+
+        self.received = 0
+        self.invalid = 0
+        self.late = 0
+        self.duplicates = 0
+        self.lost = 0
+        self.recovered = 0
+        self.concealed = 0
+        self.comfort_noise = 0
+        self.expanded = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._packets)
+
+    @property
+    def position(self) -> typing.Optional[int]:
+        """Unwrapped timestamp of the next sample to play, if started."""
+        return self._next
+
+    @property
+    def delay(self) -> int:
+        """Current delay over the fastest recent packet."""
+        if self._next is None:
+            return 0
+        return self._clock - self._next - min(self._transits)
+
+    @property
+    def target_delay(self) -> int:
+        """Delay over the fastest recent packet the buffer adapts to."""
+        if self._target is None:
+            return self.min_delay
+        return self._target - min(self._transits)
+
+    def put(
+            self,
+            packet,
+            timestamp: int,
+            sequence: typing.Optional[int] = None
+    ) -> bool:
+        """
+        Adds a packet with its RTP timestamp and, to tell losses from
+        silence, its extended RTP sequence number. Returns False if the
+        packet is invalid, a duplicate, or arrived after its playout time.
+        """
+        try:
+            samples = opuslib_next.packet.get_nb_samples(packet)
+        except (opuslib_next.OpusError, IndexError):
+            samples = 0
+        if not 0 < samples <= opuslib_next.packet.MAX_PACKET_SAMPLES:
+            self.invalid += 1
+            return False
+
+        if self._next is None:
+            timestamp &= 0xFFFFFFFF
+        else:
+            timestamp = _unwrap(timestamp, self._next)
+            if timestamp < self._next:
+                self.late += 1
+                self._add_transit(self._clock - timestamp)
+                return False
+        if timestamp in self._packets:
+            self.duplicates += 1
+            return False
+
+        # Copy, as payloads are often views of reused receive buffers
+        self._packets[timestamp] = (bytes(packet), samples, sequence)
+        heapq.heappush(self._heap, timestamp)
+        self.received += 1
+
+        transit = self._clock - timestamp
+        if self._next is None:
+            self._target = transit + self.min_delay
+            self._next = timestamp - self.min_delay
+            self._transits.append(transit)
+        else:
+            self._add_transit(transit)
+        return True
+
+    def put_rtp(self, packet) -> bool:
+        """Adds an `opuslib_next.rtp.RtpPacket`."""
+        return self.put(
+            packet.payload, packet.timestamp, packet.extended_sequence)
+
+    def get(self) -> bytes:
+        """Returns the PCM of the next playout tick."""
+        if self._next is None:
+            return self._silence(self._frame_size)
+
+        heap = self._heap
+        packets = self._packets
+        position = self._next
+        offset = self._clock - position
+        excess = offset - self._target
+
+        if heap and heap[0] == position:
+            packet, samples, sequence = packets[position]
+            # Adjust the delay by whole packets, more readily across DTX
+            threshold = samples \
+                if len(packet) <= opuslib_next.packet.DTX_MAX_BYTES \
+                else 2 * samples
+            if excess >= threshold and len(heap) > 1:
+                # Running too deep: skip this packet to catch up
+                self._pop()
+                self.dropped += 1
+                self._sequence = sequence
+                self._next = position + samples
+                return self.get()
+            if -excess >= threshold and self._playing:
+                # Running too shallow: play a concealed frame first
+                return self._expand(samples)
+            self._pop()
+            self._frame_size = samples
+            self._sequence = sequence
+            self._in_dtx = len(packet) <= opuslib_next.packet.DTX_MAX_BYTES
+            return self._play(
+                self.decoder.decode(packet, samples // self._scale), samples)
+
+        if heap:
+            gap = heap[0] - position
+            if gap < _MIN_CONCEAL and (
+                    offset >= self._target or not self._playing):
+                # Less than libopus can produce, fall in step with the stream
+                self._next = heap[0]
+                return self.get()
+
+        samples = self._frame_size
+        if heap:
+            gap -= gap % _MIN_CONCEAL
+        if not self._playing:
+            # Lead-in before the first packet
+            if heap:
+                samples = min(gap, samples)
+            self._clock += samples
+            self._next = position + samples
+            return self._silence(samples)
+        if offset < self._target:
+            # Missing in time: play a concealed frame to add delay
+            return self._expand(samples)
+
+        if heap:
+            following, duration, sequence = packets[heap[0]]
+            lost = self._is_loss(following, duration, sequence, gap)
+            self._in_dtx = not lost
+            if lost:
+                self.lost += 1
+                if gap <= duration and _has_fec(following):
+                    return self._recover(following, gap)
+            elif excess >= _MIN_CONCEAL:
+                # Running too deep: shorten the silence
+                self._next = position + min(
+                    gap, excess - excess % _MIN_CONCEAL)
+                return self.get()
+            samples = min(gap, samples)
+        self._next = position + samples
+        return self._conceal(samples)
+
+    def reset(self) -> None:
+        """Empties the buffer and resets the decoder."""
+        self._heap = []
+        self._packets = {}
+        self._transits.clear()
+        self._next = None
+        self._target = None
+        self._burst = 0
+        self._playing = False
+        self._in_dtx = False
+        self._sequence = None
+        self.decoder.reset_state()
+
+    def _add_transit(self, transit: int) -> None:
+        transits = self._transits
+        transits.append(transit)
+        self._pending_updates += 1
+        if self._pending_updates < _UPDATE_INTERVAL and \
+                transit <= self._target:
+            return
+
+        self._pending_updates = 0
+        ordered = sorted(transits)
+        fastest = ordered[0]
+        quantile = ordered[int(self.quantile * (len(ordered) - 1))]
+        self._target = fastest + min(
+            max(quantile - fastest, self.min_delay), self.max_delay)
+
+    def _is_loss(
+            self,
+            following: bytes,
+            duration: int,
+            sequence: typing.Optional[int],
+            gap: int
+    ) -> bool:
+        """Whether the next `gap` samples were lost rather than silent."""
+        if sequence is not None and self._sequence is not None:
+            # The missing packets are taken to end the gap
+            return gap <= (sequence - self._sequence - 1) * duration
+        if not self._in_dtx:
+            return True
+        # FEC in a speech packet shows that the frame before it was speech
+        return gap <= duration and \
+            len(following) > opuslib_next.packet.DTX_MAX_BYTES and \
+            _has_fec(following)
+
+    def _pop(self) -> None:
+        del self._packets[heapq.heappop(self._heap)]
+
+    def _play(self, pcm: bytes, samples: int) -> bytes:
+        self._clock += samples
+        self._next += samples
+        self._burst = 0
+        self._playing = True
+        return pcm
+
+    def _recover(self, packet: bytes, samples: int) -> bytes:
+        self.recovered += 1
+        return self._play(
+            self.decoder.decode(packet, samples // self._scale, True), samples)
+
+    def _expand(self, samples: int) -> bytes:
+        self.expanded += 1
+        return self._conceal(samples, False)
+
+    def _conceal(self, samples: int, loss: bool = True) -> bytes:
+        self._clock += samples
+        if self._in_dtx:
+            if loss:
+                self.comfort_noise += 1
+            return self.decoder.conceal(samples // self._scale)
+
+        # Faded out ticks still fill a gap and count as concealed
+        if loss:
+            self.concealed += 1
+        burst = self._burst
+        self._burst = burst + samples
+        fade_end = self.fade_after + self.fade_length
+        if burst >= fade_end:
+            return self._silence(samples)
+
+        pcm = self.decoder.conceal(samples // self._scale)
+        if burst + samples > self.fade_after:
+            pcm = self._fade(
+                pcm,
+                self._gain(burst, fade_end),
+                self._gain(burst + samples, fade_end))
+        return pcm
+
+    def _gain(self, burst: int, fade_end: int) -> float:
+        return min(max((fade_end - burst) / self.fade_length, 0.0), 1.0)
+
+    def _fade(self, pcm: bytes, start: float, end: float) -> bytes:
+        """Applies a linear gain ramp from `start` to `end`."""
+        samples = array.array('h', pcm)
+        channels = self._channels
+        count = len(samples) // channels
+        if not count:
+            return pcm
+        step = (end - start) / count
+        for frame in range(count):
+            gain = start + step * frame
+            base = frame * channels
+            for index in range(base, base + channels):
+                samples[index] = int(samples[index] * gain)
+        return samples.tobytes()
+
+    def _silence(self, samples: int) -> bytes:
+        return bytes(2 * self._channels * (samples // self._scale))
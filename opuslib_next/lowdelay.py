@@ -0,0 +1,230 @@
+"""
+Ultra-low-latency encoding, its algorithmic delay and a timing probe.
+
+Usage example:
+
+>>> import opuslib_next.lowdelay
+>>> encoder = opuslib_next.lowdelay.create_encoder(48000, 1)
+>>> decoder = opuslib_next.Decoder(48000, 1)
+>>> opuslib_next.lowdelay.algorithmic_delay(encoder).milliseconds
+7.5
+>>> encode_probe = opuslib_next.lowdelay.LatencyProbe()
+>>> decode_probe = opuslib_next.lowdelay.LatencyProbe()
+>>> for pcm in frames:
+...     packet = encode_probe.measure(encoder.encode, pcm, 240)
+...     output = decode_probe.measure(decoder.decode, packet, 240)
+>>> encode_probe.percentile(0.99), encode_probe.baseline().percentile(0.99)
+
+The low-latency profile uses the restricted low-delay application, which
+runs CELT alone with a 2.5 ms lookahead, frames of 2.5 or 5 ms, and
+prediction disabled so that each frame decodes on its own.
+
+The encoder's lookahead already covers the delay of both ends of the codec,
+decoding adds only whatever playout buffering sits behind it. Delays are in
+samples at 48 kHz.
+
+A probe keeps its samples in a preallocated ring buffer and reads the clock
+twice per sampled call, so it allocates nothing on the hot path. The
+baseline times an empty call the same way, which bounds the latency and
+jitter the probe itself adds.
+"""
+
+import array
+import time
+import typing
+
+import opuslib_next
+import opuslib_next.framing
+
+
+# Frame durations of the low-latency profile, with their expert frame
+# duration
+FRAME_DURATIONS = {
+    duration: expert
+    for duration, expert in opuslib_next.framing.FRAME_DURATIONS
+    if duration <= 240
+}
+
+DEFAULT_FRAME_DURATION = 240
+
+# Samples kept by a probe
+DEFAULT_PROBE_SIZE = 4096
+
+_EXPERT_DURATIONS = {
+    expert: duration
+    for duration, expert in opuslib_next.framing.FRAME_DURATIONS
+}
+
+_now = time.perf_counter_ns
+
+
+def create_encoder(
+        fs: int,
+        channels: int,
+        frame_duration: int = DEFAULT_FRAME_DURATION,
+        prediction_disabled: bool = True
+) -> opuslib_next.Encoder:
+    """
+    Returns an encoder of the low-latency profile.
+
+    :param frame_duration: 120 or 240, for 2.5 or 5 ms frames.
+    :param prediction_disabled: Whether frames are coded independently.
+    """
+    if frame_duration not in FRAME_DURATIONS:
+        raise ValueError('`frame_duration` must be 120 or 240')
+    encoder = opuslib_next.Encoder(
+        fs, channels, opuslib_next.APPLICATION_RESTRICTED_LOWDELAY)
+    encoder.expert_frame_duration = FRAME_DURATIONS[frame_duration]
+    encoder.prediction_disabled = int(prediction_disabled)
+    return encoder
+
+
+class LatencyBudget(object):
+
+    """Algorithmic delay of an encoder, decoder pair."""
+
+    __slots__ = ('lookahead', 'frame', 'decoder')
+
+    def __init__(self, lookahead: int, frame: int, decoder: int = 0) -> None:
+        """
+        :param lookahead: Delay of the codec, both ends included.
+        :param frame: Frame duration, the wait to fill a frame.
+        :param decoder: Playout buffering after the decoder.
+        """
+        self.lookahead = lookahead
+        self.frame = frame
+        self.decoder = decoder
+
+    def __repr__(self) -> str:
+        return '{}(lookahead={}, frame={}, decoder={}, total={})'.format(
+            type(self).__name__, self.lookahead, self.frame, self.decoder,
+            self.total)
+
+    @property
+    def total(self) -> int:
+        """Total algorithmic delay."""
+        return self.lookahead + self.frame + self.decoder
+
+    @property
+    def milliseconds(self) -> float:
+        """Total algorithmic delay, in milliseconds."""
+        return self.total / 48.0
+
+
+def algorithmic_delay(
+        encoder,
+        frame_duration: typing.Optional[int] = None,
+        decoder_delay: int = 0
+) -> LatencyBudget:
+    """
+    Returns the algorithmic delay of `encoder`, of any of the encoder
+    classes.
+
+    :param frame_duration: Frame duration, read from the expert frame
+        duration of the encoder if omitted.
+    :param decoder_delay: Playout buffering after the decoder, such as the
+        `delay` of a jitter buffer.
+    """
+    if frame_duration is None:
+        expert = encoder.expert_frame_duration
+        if expert not in _EXPERT_DURATIONS:
+            raise ValueError(
+                '`frame_duration` is needed unless the encoder has an '
+                'expert frame duration')
+        frame_duration = _EXPERT_DURATIONS[expert]
+    lookahead = encoder.lookahead * 48000 // encoder._fs
+    return LatencyBudget(lookahead, frame_duration, decoder_delay)
+
+
+class LatencyProbe(object):
+
+    """
+    Times calls in wall-clock nanoseconds, sampling one call in `every`.
+
+    The last `size` samples are kept.
+    """
+
+    __slots__ = ('every', 'count', '_calls', '_samples')
+
+    def __init__(self, size: int = DEFAULT_PROBE_SIZE, every: int = 1) -> None:
+        """
+        :param size: Number of samples kept.
+        :param every: Sampling interval, in calls.
+        """
+        if size < 1 or every < 1:
+            raise ValueError('`size` and `every` must be positive')
+        self.every = every
+        # Samples taken so far, including those overwritten
+        self.count = 0
+        self._calls = 0
+        self._samples = array.array('q', bytes(8 * size))
+
+    def __repr__(self) -> str:
+        return '{}(count={}, every={})'.format(
+            type(self).__name__, self.count, self.every)
+
+    def __len__(self) -> int:
+        return min(self.count, len(self._samples))
+
+    def measure(self, func: typing.Callable, *args) -> typing.Any:
+        """Calls `func` with `args` and returns its result."""
+        calls = self._calls
+        self._calls = calls + 1
+        if calls % self.every:
+            return func(*args)
+        start = _now()
+        result = func(*args)
+        elapsed = _now() - start
+        samples = self._samples
+        samples[self.count % len(samples)] = elapsed
+        self.count += 1
+        return result
+
+    def reset(self) -> None:
+        """Discards the samples."""
+        self.count = 0
+        self._calls = 0
+
+    @property
+    def samples(self) -> typing.List[int]:
+        """Kept samples, oldest first."""
+        samples = self._samples
+        if self.count <= len(samples):
+            return samples[:self.count].tolist()
+        split = self.count % len(samples)
+        return (samples[split:] + samples[:split]).tolist()
+
+    def percentile(self, fraction: float) -> int:
+        """Returns the sample below which `fraction` of them lie."""
+        if not 0 <= fraction <= 1:
+            raise ValueError('`fraction` must be between 0 and 1')
+        ordered = sorted(self._samples[:len(self)])
+        if not ordered:
+            raise ValueError('No samples taken')
+        return ordered[int(fraction * (len(ordered) - 1))]
+
+    @property
+    def mean(self) -> float:
+        """Mean of the kept samples."""
+        count = len(self)
+        return sum(self._samples[:count]) / count if count else 0.0
+
+    @property
+    def jitter(self) -> int:
+        """Spread between the 99th percentile and the median."""
+        return self.percentile(0.99) - self.percentile(0.5)
+
+    def baseline(self, calls: typing.Optional[int] = None) -> 'LatencyProbe':
+        """
+        Returns a probe of the same size that timed `calls` empty calls,
+        all the samples it keeps by default.
+        """
+        probe = type(self)(len(self._samples))
+        noop = _noop
+        for _ in range(len(self._samples) if calls is None else calls):
+            probe.measure(noop)
+        return probe
+
+
+def _noop() -> None:
+    pass
@@ -0,0 +1,1120 @@
+"""
+Ogg Opus (RFC 7845) file support.
+
+Usage example:
+
+>>> import opuslib_next
+>>> import opuslib_next.ogg
+>>> encoder = opuslib_next.Encoder(48000, 2, 'audio')
+>>> with open('out.opus', 'wb') as fileobj:
+...     with opuslib_next.ogg.OggOpusWriter(fileobj, encoder=encoder) as ogg:
+...         for pcm in frames:
+...             ogg.write_packet(encoder.encode(pcm, 960))
+>>> with opuslib_next.ogg.OggOpusReader('out.opus') as ogg:
+...     decoder = ogg.decoder()
+...     for packet, granule in ogg:
+...         pcm = decoder.decode(bytes(packet), 960)
+...     index = opuslib_next.ogg.SeekIndex.build(ogg)
+...     for pcm in ogg.decode_from(48000 * 60, index):
+...         play(pcm)
+
+Granule positions are computed from the TOC byte of each packet. Pages are
+closed once they hold `max_page_duration` samples or `max_page_size`
+bytes, which trades latency against per-page overhead, and are written to
+the file object in batches of `buffer_size` bytes. The reader maps the
+file into memory and hands out packets as views of the mapping.
+"""
+
+import array
+import bisect
+import mmap
+import os
+import random
+import struct
+import sys
+import typing
+import zlib
+
+import opuslib_next
+import opuslib_next.api.info
+import opuslib_next.classes
+import opuslib_next.packet
+
+
+OGG_CAPTURE_PATTERN = b'OggS'
+
+# Page header type flags
+HEADER_CONTINUED = 0x01
+HEADER_BOS = 0x02
+HEADER_EOS = 0x04
+
+MAX_PAGE_SEGMENTS = 255
+
+# Largest payload of a single Ogg page
+MAX_PAGE_BODY = MAX_PAGE_SEGMENTS * 255
+
+# Granule position of pages on which no packet completes
+NO_GRANULE = -1
+
+# Default page flushing policy: one second or 4 KiB, whichever comes first
+DEFAULT_MAX_PAGE_DURATION = 48000
+DEFAULT_MAX_PAGE_SIZE = 4096
+
+DEFAULT_BUFFER_SIZE = 65536
+
+# libopus lookahead at 48 kHz, used when no encoder is given
+DEFAULT_PRE_SKIP = 312
+
+# Page checksum verification modes of `OggOpusReader`
+VERIFY_NONE = 'none'
+VERIFY_PAGE = 'page'
+VERIFY_BULK = 'bulk'
+
+# Pages checksummed per `page_checksums` call in bulk verification
+_VERIFY_CHUNK_PAGES = 16384
+
+# Decoder pre-roll after a seek, 80 ms at 48 kHz (RFC 7845, section 4.6)
+SEEK_PREROLL = 3840
+
+_PAGE_HEADER = struct.Struct('<4sBBqIIIB')
+_INDEX_HEADER = struct.Struct('<8sIIQ')
+_CRC_OFFSET = 22
+
+_LACING_FULL = b'\xff' * MAX_PAGE_SEGMENTS
+
+# Bytes with their bits in reverse order
+_REVERSED = bytes(
+    int('{:08b}'.format(index)[::-1], 2) for index in range(256))
+
+
+def _reverse32(value: int) -> int:
+    reversed_ = _REVERSED
+    return (
+        reversed_[value & 0xFF] << 24 | reversed_[(value >> 8) & 0xFF] << 16 |
+        reversed_[(value >> 16) & 0xFF] << 8 | reversed_[value >> 24])
+
+
+def crc32(data, crc: int = 0) -> int:
+    """
+    Computes the Ogg page checksum of `data`.
+
+    Ogg uses the non-reflected CRC-32 with polynomial 0x04C11DB7 and no
+    final XOR. This is the bit mirror image of the reflected CRC-32 of
+    `zlib.crc32`, so `data` is bit-reversed with `bytes.translate` and
+    checksummed by zlib, both running in C.
+    """
+    if isinstance(data, memoryview) and data.format != 'B':
+        data = data.cast('B')
+    crc = zlib.crc32(
+        bytes(data).translate(_REVERSED), _reverse32(crc) ^ 0xFFFFFFFF)
+    return _reverse32(crc ^ 0xFFFFFFFF)
+
+
+def _page_checksum(data, offset: int, end: int) -> int:
+    # The checksum field itself counts as zero
+    page = bytearray(data[offset:end])
+    page[_CRC_OFFSET:_CRC_OFFSET + 4] = b'\x00\x00\x00\x00'
+    crc = zlib.crc32(page.translate(_REVERSED), 0xFFFFFFFF)
+    return _reverse32(crc ^ 0xFFFFFFFF)
+
+
+def page_checksums(
+        data,
+        offsets: typing.Sequence[int],
+        sizes: typing.Sequence[int]
+) -> array.array:
+    """
+    Computes the checksums of many Ogg pages stored in `data` at once.
+
+    Page ``i`` occupies ``data[offsets[i]:offsets[i] + sizes[i]]``; its
+    checksum field is treated as zero. Returns an ``array('I')``.
+
+    Each page is checksummed by zlib in C.
+    """
+    data = memoryview(data)
+    if data.format != 'B':
+        data = data.cast('B')
+    return array.array('I', [
+        _page_checksum(data, offset, offset + size)
+        for offset, size in zip(offsets, sizes)])
+
+
+class OpusHead(object):
+
+    """Ogg Opus identification header (RFC 7845, section 5.1)."""
+
+    __slots__ = (
+        'version',
+        'channels',
+        'pre_skip',
+        'input_sample_rate',
+        'output_gain',
+        'mapping_family',
+        'streams',
+        'coupled_streams',
+        'mapping',
+    )
+
+    MAGIC = b'OpusHead'
+
+    def __init__(
+            self,
+            channels: int,
+            pre_skip: int = DEFAULT_PRE_SKIP,
+            input_sample_rate: int = 48000,
+            output_gain: int = 0,
+            mapping_family: int = 0,
+            streams: typing.Optional[int] = None,
+            coupled_streams: typing.Optional[int] = None,
+            mapping: typing.Optional[typing.Sequence[int]] = None,
+            version: int = 1
+    ) -> None:
+        """
+        :param channels: Number of output channels.
+        :param pre_skip: Samples at 48 kHz to discard from the decoder output.
+        :param input_sample_rate: Sample rate of the original input.
+        :param output_gain: Gain in Q7.8 dB to apply to the decoder output.
+        :param mapping_family: Channel mapping family.
+        :param streams: Number of streams, for mapping families other than 0.
+        :param coupled_streams: Number of coupled streams.
+        :param mapping: Channel mapping table.
+        """
+        if mapping_family == 0:
+            if channels not in (1, 2):
+                raise ValueError(
+                    'mapping family 0 supports 1 or 2 channels only')
+            streams = 1
+            coupled_streams = channels - 1
+            mapping = tuple(range(channels))
+        elif streams is None or coupled_streams is None or mapping is None:
+            raise ValueError(
+                'mapping family {} requires `streams`, `coupled_streams` '
+                'and `mapping`'.format(mapping_family))
+        elif len(mapping) != channels:
+            raise ValueError('`mapping` must have one entry per channel')
+
+        self.version = version
+        self.channels = channels
+        self.pre_skip = pre_skip
+        self.input_sample_rate = input_sample_rate
+        self.output_gain = output_gain
+        self.mapping_family = mapping_family
+        self.streams = streams
+        self.coupled_streams = coupled_streams
+        self.mapping = tuple(mapping)
+
+    @classmethod
+    def from_bytes(cls, packet) -> 'OpusHead':
+        """Parses an OpusHead packet."""
+        packet = bytes(packet)
+        if len(packet) < 19 or not packet.startswith(cls.MAGIC):
+            raise ValueError('not an OpusHead packet')
+
+        (version, channels, pre_skip, input_sample_rate, output_gain,
+         mapping_family) = struct.unpack_from('<BBHIhB', packet, 8)
+        if version >> 4:
+            raise ValueError(
+                'unsupported OpusHead version {}'.format(version))
+
+        streams = coupled_streams = mapping = None
+        if mapping_family != 0:
+            if len(packet) < 21 + channels:
+                raise ValueError('truncated OpusHead channel mapping')
+            streams = packet[19]
+            coupled_streams = packet[20]
+            mapping = packet[21:21 + channels]
+
+        return cls(
+            channels, pre_skip, input_sample_rate, output_gain,
+            mapping_family, streams, coupled_streams, mapping, version)
+
+    def to_bytes(self) -> bytes:
+        """Serializes the header packet."""
+        header = self.MAGIC + struct.pack(
+            '<BBHIhB', self.version, self.channels, self.pre_skip,
+            self.input_sample_rate, self.output_gain, self.mapping_family)
+        if self.mapping_family != 0:
+            header += bytes(
+                (self.streams, self.coupled_streams) + self.mapping)
+        return header
+
+    def __repr__(self) -> str:
+        return (
+            '{}(channels={}, pre_skip={}, input_sample_rate={}, '
+            'output_gain={}, mapping_family={}, streams={}, '
+            'coupled_streams={}, mapping={})'.format(
+                type(self).__name__, self.channels, self.pre_skip,
+                self.input_sample_rate, self.output_gain,
+                self.mapping_family, self.streams, self.coupled_streams,
+                self.mapping)
+        )
+
+
+def opus_head(
+        channels: typing.Optional[int] = None,
+        encoder=None,
+        pre_skip: typing.Optional[int] = None,
+        input_sample_rate: typing.Optional[int] = None,
+        output_gain: int = 0,
+        mapping_family: typing.Optional[int] = None,
+        streams: typing.Optional[int] = None,
+        coupled_streams: typing.Optional[int] = None,
+        mapping: typing.Optional[typing.Sequence[int]] = None
+) -> OpusHead:
+    """
+    Builds the `OpusHead` of a stream produced by `encoder`.
+
+    The channel layout, input sample rate and pre-skip (the encoder's
+    lookahead) are taken from `encoder` unless given explicitly. The mapping
+    family defaults to 0 for a single stream and 1 (or 255 beyond 8
+    channels) otherwise.
+    """
+    if encoder is not None:
+        fs = encoder._fs
+        if channels is None:
+            channels = encoder._channels
+        if input_sample_rate is None:
+            input_sample_rate = fs
+        if pre_skip is None:
+            pre_skip = encoder.lookahead * 48000 // fs
+        if streams is None:
+            streams = getattr(encoder, '_streams', None)
+            coupled_streams = getattr(encoder, '_coupled_streams', None)
+            mapping = getattr(encoder, '_mapping', None)
+
+    if channels is None:
+        raise ValueError('either `channels` or `encoder` is required')
+
+    if mapping_family is None:
+        if streams is None or (
+                streams == 1 and channels <= 2 and mapping is not None and
+                tuple(mapping) == tuple(range(channels))):
+            mapping_family = 0
+        else:
+            mapping_family = 1 if channels <= 8 else 255
+
+    return OpusHead(
+        channels,
+        DEFAULT_PRE_SKIP if pre_skip is None else pre_skip,
+        48000 if input_sample_rate is None else input_sample_rate,
+        output_gain,
+        mapping_family,
+        streams,
+        coupled_streams,
+        mapping,
+    )
+
+
+def opus_tags(
+        vendor: str,
+        tags: typing.Union[
+            typing.Mapping[str, str],
+            typing.Iterable[typing.Tuple[str, str]],
+            None
+        ] = None
+) -> bytes:
+    """Serializes an OpusTags comment header (RFC 7845, section 5.2)."""
+    if tags is None:
+        tags = ()
+    elif hasattr(tags, 'items'):
+        tags = tags.items()
+
+    comments = [
+        '{}={}'.format(key, value).encode('utf-8') for key, value in tags]
+    vendor_bytes = vendor.encode('utf-8')
+
+    packet = bytearray(b'OpusTags')
+    packet += struct.pack('<I', len(vendor_bytes))
+    packet += vendor_bytes
+    packet += struct.pack('<I', len(comments))
+    for comment in comments:
+        packet += struct.pack('<I', len(comment))
+        packet += comment
+    return bytes(packet)
+
+
+def parse_opus_tags(
+        packet
+) -> typing.Tuple[str, typing.List[typing.Tuple[str, str]]]:
+    """
+    Parses an OpusTags packet into the vendor string and a list of
+    (key, value) comments.
+    """
+    packet = bytes(packet)
+    if not packet.startswith(b'OpusTags'):
+        raise ValueError('not an OpusTags packet')
+
+    try:
+        (length,) = struct.unpack_from('<I', packet, 8)
+        position = 12 + length
+        vendor = packet[12:position].decode('utf-8', 'replace')
+        (count,) = struct.unpack_from('<I', packet, position)
+        position += 4
+        comments = []
+        for _ in range(count):
+            (length,) = struct.unpack_from('<I', packet, position)
+            position += 4
+            comment = packet[position:position + length]
+            position += length
+            key, _, value = comment.decode('utf-8', 'replace').partition('=')
+            comments.append((key, value))
+    except struct.error as exc:
+        raise ValueError('truncated OpusTags packet') from exc
+
+    return vendor, comments
+
+
+def _default_vendor() -> str:
+    return 'opuslib_next ({})'.format(
+        opuslib_next.api.info.get_version_string().decode('utf-8'))
+
+
+class OggOpusWriter(object):
+
+    """Muxes Opus packets into an Ogg Opus stream."""
+
+    def __init__(
+            self,
+            fileobj: typing.BinaryIO,
+            channels: typing.Optional[int] = None,
+            encoder=None,
+            pre_skip: typing.Optional[int] = None,
+            input_sample_rate: typing.Optional[int] = None,
+            output_gain: int = 0,
+            mapping_family: typing.Optional[int] = None,
+            streams: typing.Optional[int] = None,
+            coupled_streams: typing.Optional[int] = None,
+            mapping: typing.Optional[typing.Sequence[int]] = None,
+            tags=None,
+            vendor: typing.Optional[str] = None,
+            serial: typing.Optional[int] = None,
+            max_page_duration: int = DEFAULT_MAX_PAGE_DURATION,
+            max_page_size: int = DEFAULT_MAX_PAGE_SIZE,
+            buffer_size: int = DEFAULT_BUFFER_SIZE
+    ) -> None:
+        """
+        :param fileobj: Binary file object the stream is written to.
+        :param channels: Number of channels. Taken from `encoder` if omitted.
+        :param encoder: `Encoder` or `MultiStreamEncoder` producing the
+            packets. Used for the channel layout, input sample rate and
+            pre-skip (its lookahead) unless those are given explicitly.
+        :param pre_skip: Samples at 48 kHz to discard at the beginning.
+        :param mapping_family: Channel mapping family. Defaults to 0 for a
+            single stream and 1 (or 255 beyond 8 channels) otherwise.
+        :param tags: Comments, as a mapping or (key, value) pairs.
+        :param serial: Ogg stream serial number, random if omitted.
+        :param max_page_duration: Samples at 48 kHz after which a page is
+            closed.
+        :param max_page_size: Payload bytes after which a page is closed.
+        :param buffer_size: Number of bytes buffered before writing to
+            `fileobj`.
+        """
+        if not 0 < max_page_size <= MAX_PAGE_BODY:
+            raise ValueError(
+                '`max_page_size` must be between 1 and {}'.format(
+                    MAX_PAGE_BODY))
+
+        self.head = opus_head(
+            channels, encoder, pre_skip, input_sample_rate, output_gain,
+            mapping_family, streams, coupled_streams, mapping)
+        self.serial = random.getrandbits(32) if serial is None else serial
+
+        self._fileobj = fileobj
+        self._max_page_duration = max_page_duration
+        self._max_page_size = max_page_size
+        self._buffer_size = buffer_size
+        self._out = bytearray()
+        self._lacing = bytearray()
+        self._body = bytearray()
+        self._sequence = 0
+        self._granule = 0
+        self._page_granule = NO_GRANULE
+        self._page_start = 0
+        self._page_ready = False
+        self._continued = False
+        self._closed = False
+
+        self._append(self.head.to_bytes())
+        self._flush_page(HEADER_BOS)
+        self._append(opus_tags(
+            _default_vendor() if vendor is None else vendor, tags))
+        self._flush_page()
+
+    def __enter__(self) -> 'OggOpusWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def pre_skip(self) -> int:
+        """Samples at 48 kHz the decoder discards at the beginning."""
+        return self.head.pre_skip
+
+    @property
+    def granule_position(self) -> int:
+        """Granule position after the last packet written."""
+        return self._granule
+
+    @property
+    def page_count(self) -> int:
+        """Number of pages emitted so far, including the headers."""
+        return self._sequence
+
+    def write_packet(self, packet, samples: typing.Optional[int] = None) -> None:
+        """
+        Appends one packet to the stream.
+
+        :param samples: Duration of the packet in samples at 48 kHz. Read
+            from the TOC byte if omitted.
+        """
+        if self._closed:
+            raise ValueError('write to a closed OggOpusWriter')
+        if samples is None:
+            samples = opuslib_next.packet.get_nb_samples(packet)
+
+        if self._page_ready or (
+                self._body and
+                len(self._body) + len(packet) > self._max_page_size):
+            self._flush_page()
+
+        self._granule += samples
+        self._append(packet)
+        self._page_ready = (
+            len(self._body) >= self._max_page_size or
+            self._granule - self._page_start >= self._max_page_duration
+        )
+
+    def write_packets(self, packets: typing.Iterable) -> None:
+        """Appends every packet of `packets` to the stream."""
+        for packet in packets:
+            self.write_packet(packet)
+
+    def flush(self) -> None:
+        """
+        Closes the current page and writes all buffered pages.
+
+        The end of the stream can no longer be trimmed into the flushed
+        packets, as end trimming applies to the last page only.
+        """
+        if self._lacing:
+            self._flush_page()
+        self._write_out()
+        flush = getattr(self._fileobj, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def close(self, samples: typing.Optional[int] = None) -> None:
+        """
+        Writes the last page, flagged as end of stream.
+
+        :param samples: Number of valid samples at 48 kHz in the stream,
+            excluding pre-skip. Trims the end padding of the last packet.
+            Only packets written since the last page was emitted can be
+            trimmed, as granule positions never decrease.
+            The file object is not closed.
+        """
+        if self._closed:
+            return
+
+        if samples is not None:
+            end = self.head.pre_skip + samples
+            if end > self._granule:
+                raise ValueError(
+                    '`samples` exceeds the duration of the written packets')
+            if end < self._granule and end < self._page_start:
+                raise ValueError(
+                    '`samples` ends before the last emitted page, which '
+                    'can no longer be trimmed')
+            self._granule = end
+        self._page_granule = self._granule
+        self._flush_page(HEADER_EOS)
+        self._closed = True
+        self._write_out()
+        flush = getattr(self._fileobj, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def _append(self, packet) -> None:
+        size = len(packet)
+        lacing = self._lacing
+        body = self._body
+        offset = 0
+        while True:
+            room = MAX_PAGE_SEGMENTS - len(lacing)
+            full = (size - offset) // 255
+            if full < room:
+                break
+            # The packet continues on the next page
+            lacing += _LACING_FULL[:room]
+            body += packet[offset:offset + 255 * room]
+            offset += 255 * room
+            self._flush_page()
+            self._continued = True
+
+        lacing += _LACING_FULL[:full]
+        lacing.append((size - offset) % 255)
+        body += packet[offset:] if offset else packet
+        self._page_granule = self._granule
+
+    def _flush_page(self, flags: int = 0) -> None:
+        if self._continued:
+            flags |= HEADER_CONTINUED
+
+        out = self._out
+        start = len(out)
+        out += _PAGE_HEADER.pack(
+            OGG_CAPTURE_PATTERN, 0, flags, self._page_granule, self.serial,
+            self._sequence, 0, len(self._lacing))
+        out += self._lacing
+        out += self._body
+        with memoryview(out) as view:
+            crc = crc32(view[start:])
+        struct.pack_into('<I', out, start + _CRC_OFFSET, crc)
+
+        self._sequence += 1
+        if self._page_granule != NO_GRANULE:
+            self._page_start = self._page_granule
+        self._page_granule = NO_GRANULE
+        self._page_ready = False
+        self._continued = False
+        self._lacing.clear()
+        self._body.clear()
+
+        if len(out) >= self._buffer_size:
+            self._write_out()
+
+    def _write_out(self) -> None:
+        if self._out:
+            self._fileobj.write(self._out)
+            self._out.clear()
+
+
+class OggPage(object):
+
+    """
+    One Ogg page. `lacing` and `body` are memoryviews into the source
+    buffer.
+    """
+
+    __slots__ = (
+        'offset',
+        'flags',
+        'granule',
+        'serial',
+        'sequence',
+        'checksum',
+        'lacing',
+        'body',
+    )
+
+    def __init__(
+            self,
+            offset: int,
+            flags: int,
+            granule: int,
+            serial: int,
+            sequence: int,
+            checksum: int,
+            lacing: memoryview,
+            body: memoryview
+    ) -> None:
+        self.offset = offset
+        self.flags = flags
+        self.granule = granule
+        self.serial = serial
+        self.sequence = sequence
+        self.checksum = checksum
+        self.lacing = lacing
+        self.body = body
+
+    @property
+    def size(self) -> int:
+        """Size of the page in bytes, header included."""
+        return _PAGE_HEADER.size + len(self.lacing) + len(self.body)
+
+    def __repr__(self) -> str:
+        return (
+            '{}(offset={}, flags={}, granule={}, serial={}, sequence={}, '
+            'size={})'.format(
+                type(self).__name__, self.offset, self.flags, self.granule,
+                self.serial, self.sequence, self.size)
+        )
+
+
+def _packet_samples(packet) -> int:
+    try:
+        return opuslib_next.packet.get_nb_samples(packet)
+    except opuslib_next.OpusError:
+        return 0
+
+
+class OggOpusReader(object):
+
+    """
+    Memory-mapped Ogg Opus demuxer.
+
+    Pages are located with `struct.unpack_from` on the mapping and packets
+    that fit in one page are returned as memoryview slices of it, so no
+    payload is copied. Only packets spanning several pages are joined into
+    new `bytes`. Views stay valid until `close` is called.
+    """
+
+    def __init__(
+            self,
+            path: typing.Union[str, os.PathLike],
+            serial: typing.Optional[int] = None,
+            verify: str = VERIFY_NONE
+    ) -> None:
+        """
+        :param path: Path of the Ogg Opus file.
+        :param serial: Serial number of the logical stream to read. Defaults
+            to the first Opus stream in the file.
+        :param verify: Page checksum verification: `VERIFY_NONE` for trusted
+            files, `VERIFY_PAGE` to check every page as it is read or
+            `VERIFY_BULK` to check the whole file up front. Pages failing
+            the check are skipped, like libogg does, and their offsets
+            collected in `corrupt_pages`.
+        """
+        if verify not in (VERIFY_NONE, VERIFY_PAGE, VERIFY_BULK):
+            raise ValueError(
+                '`verify` must be in {!r}, {!r} or {!r}'.format(
+                    VERIFY_NONE, VERIFY_PAGE, VERIFY_BULK))
+
+        with open(path, 'rb') as fileobj:
+            self._mmap = mmap.mmap(
+                fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._verify = verify
+        self.corrupt_pages = set()
+
+        try:
+            if verify == VERIFY_BULK:
+                self._verify_bulk()
+            self._read_headers(serial)
+        except BaseException:
+            self.close()
+            raise
+
+    def _read_headers(self, serial: typing.Optional[int]) -> None:
+        head = None
+        for page in self.pages():
+            if serial is None and page.flags & HEADER_BOS and \
+                    bytes(page.body[:8]) == OpusHead.MAGIC:
+                serial = page.serial
+            if page.serial == serial:
+                head = page
+                break
+        if head is None:
+            raise ValueError('no Opus stream found')
+
+        self.serial = serial
+        packets = []
+        for page, completed in self._page_packets(head.offset):
+            packets.extend(completed)
+            if len(packets) >= 2:
+                # Audio data starts on the page following the comment header
+                self._data_offset = page.offset + page.size
+                break
+        else:
+            raise ValueError('truncated Ogg Opus headers')
+
+        self.head = OpusHead.from_bytes(packets[0])
+        self.vendor, self.tags = parse_opus_tags(packets[1])
+
+    def __enter__(self) -> 'OggOpusReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> typing.Iterator[typing.Tuple[memoryview, int]]:
+        return self.packets()
+
+    def close(self) -> None:
+        """
+        Unmaps the file. Packet views handed out must be released first,
+        otherwise the mapping is only freed once they are garbage collected.
+        """
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+
+    @property
+    def pre_skip(self) -> int:
+        """Samples at 48 kHz to discard from the decoder output."""
+        return self.head.pre_skip
+
+    @property
+    def channels(self) -> int:
+        """Number of output channels."""
+        return self.head.channels
+
+    def decoder(self, fs: int = 48000):
+        """
+        Creates a decoder matching the stream's channel mapping: a `Decoder`
+        for mapping family 0 and a `MultiStreamDecoder` otherwise.
+        """
+        head = self.head
+        if head.mapping_family == 0:
+            return opuslib_next.classes.Decoder(fs, head.channels)
+        return opuslib_next.classes.MultiStreamDecoder(
+            fs, head.channels, head.streams, head.coupled_streams,
+            head.mapping)
+
+    def pages(self, offset: int = 0) -> typing.Iterator[OggPage]:
+        """
+        Yields the pages of all logical streams from byte `offset` on.
+        Garbage between pages and pages failing verification are skipped;
+        a truncated last page ends the iteration.
+        """
+        return self._scan(offset, self._verify)
+
+    def _scan(self, offset: int, verify: str) -> typing.Iterator[OggPage]:
+        view = self._view
+        find = self._mmap.find
+        size = len(view)
+        unpack = _PAGE_HEADER.unpack_from
+        header_size = _PAGE_HEADER.size
+        corrupt = self.corrupt_pages
+        while offset + header_size <= size:
+            (capture, version, flags, granule, serial, sequence, checksum,
+             segments) = unpack(view, offset)
+            if capture != OGG_CAPTURE_PATTERN or version != 0:
+                offset = find(OGG_CAPTURE_PATTERN, offset + 1)
+                if offset < 0:
+                    return
+                continue
+
+            body_start = offset + header_size + segments
+            lacing = view[offset + header_size:body_start]
+            end = body_start + sum(lacing)
+            if end > size:
+                return
+
+            if verify == VERIFY_PAGE and \
+                    _page_checksum(view, offset, end) != checksum:
+                corrupt.add(offset)
+            if verify != VERIFY_NONE and offset in corrupt:
+                # Resynchronize, the lacing values may be damaged as well
+                offset = find(OGG_CAPTURE_PATTERN, offset + 1)
+                if offset < 0:
+                    return
+                continue
+
+            yield OggPage(
+                offset, flags, granule, serial, sequence, checksum, lacing,
+                view[body_start:end])
+            offset = end
+
+    def _verify_bulk(self) -> None:
+        offset = 0
+        while True:
+            offsets = []
+            sizes = []
+            checksums = []
+            for page in self._scan(offset, VERIFY_NONE):
+                offsets.append(page.offset)
+                sizes.append(page.size)
+                checksums.append(page.checksum)
+                if len(offsets) == _VERIFY_CHUNK_PAGES:
+                    break
+            if not offsets:
+                return
+
+            computed = page_checksums(self._view, offsets, sizes)
+            for index, checksum in enumerate(checksums):
+                if computed[index] != checksum:
+                    # Later pages are checked again after resynchronizing
+                    self.corrupt_pages.add(offsets[index])
+                    offset = self._mmap.find(
+                        OGG_CAPTURE_PATTERN, offsets[index] + 1)
+                    if offset < 0:
+                        return
+                    break
+            else:
+                offset = offsets[-1] + sizes[-1]
+
+    def _page_packets(
+            self,
+            offset: int
+    ) -> typing.Iterator[typing.Tuple[OggPage, typing.List]]:
+        serial = self.serial
+        pending = None
+        sequence = None
+        for page in self.pages(offset):
+            if page.serial != serial:
+                continue
+            if page.sequence != sequence:
+                # A page was lost, the packet it continued cannot be completed
+                pending = None
+            sequence = (page.sequence + 1) & 0xFFFFFFFF
+
+            completed = []
+            body = page.body
+            start = position = 0
+            if not page.flags & HEADER_CONTINUED:
+                pending = None
+            elif pending is None:
+                # Skip the tail of a packet whose start was not seen
+                start = -1
+
+            for value in page.lacing:
+                position += value
+                if value == 255:
+                    continue
+                if start < 0:
+                    start = position
+                    continue
+                if pending is not None:
+                    pending.append(body[start:position])
+                    completed.append(b''.join(pending))
+                    pending = None
+                else:
+                    completed.append(body[start:position])
+                start = position
+
+            if start >= 0 and start < position:
+                if pending is None:
+                    pending = []
+                pending.append(body[start:position])
+
+            yield page, completed
+
+            if page.flags & HEADER_EOS:
+                return
+
+    def packets(
+            self,
+            offset: typing.Optional[int] = None
+    ) -> typing.Iterator[typing.Tuple[memoryview, int]]:
+        """
+        Yields ``(packet, granule)`` for every audio packet, where `granule`
+        is the granule position at the end of the packet. Subtract `pre_skip`
+        to get the position in the decoded output.
+
+        :param offset: Byte offset of the page to start at. Defaults to the
+            first audio page.
+        """
+        if offset is None:
+            offset = self._data_offset
+        # Packets of the first audio page start at granule 0, even when
+        # it is also the last page and ends trimmed (RFC 7845)
+        previous = 0 if offset == self._data_offset else None
+        for page, completed in self._page_packets(offset):
+            if not completed:
+                continue
+            granules = [0] * len(completed)
+            if page.flags & HEADER_EOS and previous is not None:
+                # The last page may end before its packets do (end trimming)
+                granule = previous
+                for index, packet in enumerate(completed):
+                    granule += _packet_samples(packet)
+                    granules[index] = min(granule, page.granule)
+            else:
+                granule = page.granule
+                for index in range(len(completed) - 1, -1, -1):
+                    granules[index] = granule
+                    granule -= _packet_samples(completed[index])
+            previous = page.granule
+            yield from zip(completed, granules)
+
+    def batches(
+            self,
+            max_packets: int = 1024,
+            offset: typing.Optional[int] = None
+    ) -> typing.Iterator[
+            typing.Tuple[opuslib_next.packet.PacketBatch, array.array]]:
+        """
+        Yields ``(batch, granules)`` pairs of up to `max_packets` audio
+        packets, packed into a `PacketBatch` with an ``array('q')`` of the
+        granule position at the end of each packet.
+        """
+        packets = []
+        granules = array.array('q')
+        for packet, granule in self.packets(offset):
+            packets.append(packet)
+            granules.append(granule)
+            if len(packets) >= max_packets:
+                yield opuslib_next.packet.PacketBatch.from_packets(
+                    packets), granules
+                packets = []
+                granules = array.array('q')
+        if packets:
+            yield opuslib_next.packet.PacketBatch.from_packets(
+                packets), granules
+
+    def seek(
+            self,
+            sample: int,
+            index: typing.Optional['SeekIndex'] = None
+    ) -> typing.Tuple[int, int]:
+        """
+        Finds where decoding must start to output PCM position `sample`
+        (at 48 kHz, pre-skip excluded), including `SEEK_PREROLL` samples of
+        decoder pre-roll.
+
+        Returns the byte offset of the page to pass to `packets` and the
+        granule position at the start of that page. Without an `index` the
+        file is scanned.
+        """
+        if index is None:
+            index = SeekIndex.build(self)
+        elif index.serial != self.serial or \
+                index.file_size != len(self._view):
+            raise ValueError('seek index does not match this stream')
+        return index.lookup(
+            max(sample + self.head.pre_skip - SEEK_PREROLL, 0))
+
+    def decode_from(
+            self,
+            sample: int,
+            index: typing.Optional['SeekIndex'] = None,
+            decoder=None,
+            fs: int = 48000
+    ) -> typing.Iterator[bytes]:
+        """
+        Yields 16-bit PCM at the sample rate `fs` starting exactly at PCM
+        position `sample` (at 48 kHz, pre-skip excluded).
+
+        Decoding starts 80 ms early and the pre-roll output is discarded,
+        as RFC 7845 requires after a seek. `decoder` is reset before use;
+        a matching one is created if omitted.
+        """
+        offset, position = self.seek(sample, index)
+        target = sample + self.head.pre_skip
+        if decoder is None:
+            decoder = self.decoder(fs)
+        else:
+            decoder.reset_state()
+
+        scale = 48000 // fs
+        frame_bytes = 2 * self.head.channels
+        for packet, granule in self.packets(offset):
+            pcm = decoder.decode(
+                bytes(packet),
+                opuslib_next.packet.MAX_PACKET_SAMPLES // scale)
+            end = position + len(pcm) // frame_bytes * scale
+            begin = max(position, target)
+            stop = min(end, granule)
+            if stop > begin:
+                yield pcm[
+                    (begin - position) // scale * frame_bytes:
+                    (stop - position) // scale * frame_bytes]
+            position = end
+
+
+class SeekIndex(object):
+
+    """
+    Granule position to page offset index of one Ogg Opus stream.
+
+    Entry ``i`` records a page starting with a new packet at byte
+    ``offsets[i]`` and the granule position ``granules[i]`` at its start.
+    """
+
+    __slots__ = ('serial', 'file_size', 'granules', 'offsets')
+
+    MAGIC = b'OpusIdx1'
+
+    def __init__(
+            self,
+            serial: int,
+            file_size: int,
+            granules: array.array,
+            offsets: array.array
+    ) -> None:
+        self.serial = serial
+        self.file_size = file_size
+        self.granules = granules
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, reader: OggOpusReader, interval: int = 0) -> 'SeekIndex':
+        """
+        Scans `reader` once and records the pages decoding can start at.
+
+        :param interval: Minimum distance between entries in samples at
+            48 kHz. 0 records every page.
+        """
+        granules = array.array('q')
+        offsets = array.array('Q')
+        last = None
+        for page, completed in reader._page_packets(reader._data_offset):
+            start = last
+            if start is None:
+                if page.granule == NO_GRANULE:
+                    continue
+                # An end-trimmed first page still starts at 0
+                start = 0 if page.flags & HEADER_EOS else page.granule - sum(
+                    _packet_samples(packet) for packet in completed)
+            if not page.flags & HEADER_CONTINUED and (
+                    not granules or start - granules[-1] >= interval):
+                granules.append(start)
+                offsets.append(page.offset)
+            if page.granule != NO_GRANULE:
+                last = page.granule
+        return cls(reader.serial, len(reader._view), granules, offsets)
+
+    def __len__(self) -> int:
+        return len(self.granules)
+
+    def lookup(self, granule: int) -> typing.Tuple[int, int]:
+        """
+        Returns ``(offset, granule)`` of the last entry starting at or before
+        `granule`, or of the first entry.
+        """
+        if not self.granules:
+            raise ValueError('empty seek index')
+        index = max(bisect.bisect_right(self.granules, granule) - 1, 0)
+        return self.offsets[index], self.granules[index]
+
+    def to_bytes(self) -> bytes:
+        """Serializes the index, little-endian."""
+        granules = self.granules
+        offsets = self.offsets
+        if sys.byteorder != 'little':
+            granules = array.array('q', granules)
+            offsets = array.array('Q', offsets)
+            granules.byteswap()
+            offsets.byteswap()
+        return _INDEX_HEADER.pack(
+            self.MAGIC, self.serial, len(granules), self.file_size) + \
+            granules.tobytes() + offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data) -> 'SeekIndex':
+        """Parses an index serialized by `to_bytes`."""
+        try:
+            magic, serial, count, file_size = _INDEX_HEADER.unpack_from(data)
+        except struct.error as exc:
+            raise ValueError('truncated seek index') from exc
+        if magic != cls.MAGIC:
+            raise ValueError('not a seek index')
+        start = _INDEX_HEADER.size
+        if len(data) != start + 16 * count:
+            raise ValueError('truncated seek index')
+
+        granules = array.array('q')
+        offsets = array.array('Q')
+        granules.frombytes(data[start:start + 8 * count])
+        offsets.frombytes(data[start + 8 * count:])
+        if sys.byteorder != 'little':
+            granules.byteswap()
+            offsets.byteswap()
+        return cls(serial, file_size, granules, offsets)
+
+    def save(self, path: typing.Union[str, os.PathLike]) -> None:
+        """Writes the index to a sidecar file."""
+        with open(path, 'wb') as fileobj:
+            fileobj.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: typing.Union[str, os.PathLike]) -> 'SeekIndex':
+        """Reads an index written by `save`."""
+        with open(path, 'rb') as fileobj:
+            return cls.from_bytes(fileobj.read())
@@ -0,0 +1,955 @@
+"""
+Pure-Python inspection of Opus packets.
+
+Usage example:
+
+>>> import opuslib_next.packet
+>>> info = opuslib_next.packet.parse_toc(packet)
+>>> info.mode == opuslib_next.packet.MODE_CELT_ONLY
+>>> info.samples
+960
+
+Packet properties are answered from the TOC byte (RFC 6716, section 3.1)
+by lookups in precomputed 256-entry tables, without calling into libopus.
+"""
+
+import array
+import ctypes
+import typing
+
+import opuslib_next
+import opuslib_next.api.repacketizer
+import opuslib_next.constants
+
+
+# Coding modes, values match the libopus internal MODE_* definitions
+MODE_SILK_ONLY = 1000
+MODE_HYBRID = 1001
+MODE_CELT_ONLY = 1002
+
+# Maximum duration of an Opus packet, in samples at 48 kHz
+MAX_PACKET_SAMPLES = 5760
+
+# Packets of at most this many bytes are DTX frames
+DTX_MAX_BYTES = 2
+
+
+def _config_table():
+    """Returns (mode, bandwidth, samples per frame at 48 kHz) per config."""
+    silk = (480, 960, 1920, 2880)
+    hybrid = (480, 960)
+    celt = (120, 240, 480, 960)
+    configs = []
+    for bandwidth in (
+            opuslib_next.constants.BANDWIDTH_NARROWBAND,
+            opuslib_next.constants.BANDWIDTH_MEDIUMBAND,
+            opuslib_next.constants.BANDWIDTH_WIDEBAND):
+        configs.extend((MODE_SILK_ONLY, bandwidth, size) for size in silk)
+    for bandwidth in (
+            opuslib_next.constants.BANDWIDTH_SUPERWIDEBAND,
+            opuslib_next.constants.BANDWIDTH_FULLBAND):
+        configs.extend((MODE_HYBRID, bandwidth, size) for size in hybrid)
+    for bandwidth in (
+            opuslib_next.constants.BANDWIDTH_NARROWBAND,
+            opuslib_next.constants.BANDWIDTH_WIDEBAND,
+            opuslib_next.constants.BANDWIDTH_SUPERWIDEBAND,
+            opuslib_next.constants.BANDWIDTH_FULLBAND):
+        configs.extend((MODE_CELT_ONLY, bandwidth, size) for size in celt)
+    return configs
+
+
+_CONFIGS = _config_table()
+
+# Tables indexed by the TOC byte
+TOC_MODE = tuple(_CONFIGS[toc >> 3][0] for toc in range(256))
+TOC_BANDWIDTH = tuple(_CONFIGS[toc >> 3][1] for toc in range(256))
+TOC_SAMPLES_PER_FRAME = tuple(_CONFIGS[toc >> 3][2] for toc in range(256))
+TOC_STEREO = tuple(bool(toc & 0x4) for toc in range(256))
+TOC_CODE = tuple(toc & 0x3 for toc in range(256))
+# Frame count for codes 0-2, 0 for code 3 where it is read from byte 1
+TOC_FRAME_COUNT = tuple((1, 2, 2, 0)[toc & 0x3] for toc in range(256))
+# Samples at 48 kHz for codes 0-2, 0 for code 3
+TOC_PACKET_SAMPLES = tuple(
+    TOC_SAMPLES_PER_FRAME[toc] * TOC_FRAME_COUNT[toc] for toc in range(256))
+
+del _CONFIGS
+
+
+class PacketInfo(object):
+
+    """Properties of an Opus packet derived from its TOC byte."""
+
+    __slots__ = (
+        'toc',
+        'mode',
+        'bandwidth',
+        'stereo',
+        'code',
+        'frame_count',
+        'samples_per_frame',
+        'samples',
+    )
+
+    def __init__(
+            self,
+            toc: int,
+            mode: int,
+            bandwidth: int,
+            stereo: bool,
+            code: int,
+            frame_count: int,
+            samples_per_frame: int,
+            samples: int
+    ) -> None:
+        self.toc = toc
+        self.mode = mode
+        self.bandwidth = bandwidth
+        self.stereo = stereo
+        self.code = code
+        self.frame_count = frame_count
+        self.samples_per_frame = samples_per_frame
+        self.samples = samples
+
+    @property
+    def config(self) -> int:
+        """TOC configuration number (0-31)."""
+        return self.toc >> 3
+
+    @property
+    def channels(self) -> int:
+        """Number of coded channels (1 or 2)."""
+        return 2 if self.stereo else 1
+
+    @property
+    def frame_duration(self) -> float:
+        """Duration of one frame in milliseconds."""
+        return TOC_SAMPLES_PER_FRAME[self.toc] / 48.0
+
+    def __repr__(self) -> str:
+        return (
+            '{}(toc={}, mode={}, bandwidth={}, stereo={}, code={}, '
+            'frame_count={}, samples_per_frame={}, samples={})'.format(
+                type(self).__name__, self.toc, self.mode, self.bandwidth,
+                self.stereo, self.code, self.frame_count,
+                self.samples_per_frame, self.samples)
+        )
+
+
+def get_frame_count(packet: bytes) -> int:
+    """Gets the number of frames in an Opus packet."""
+    if not packet:
+        raise opuslib_next.OpusError(opuslib_next.BAD_ARG)
+
+    frame_count = TOC_FRAME_COUNT[packet[0]]
+    if not frame_count:
+        if len(packet) < 2:
+            raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+        frame_count = packet[1] & 0x3F
+    return frame_count
+
+
+def get_nb_samples(packet: bytes, fs: int = 48000) -> int:
+    """Gets the number of samples of an Opus packet at the sample rate `fs`."""
+    samples = get_frame_count(packet) * TOC_SAMPLES_PER_FRAME[packet[0]]
+    if fs != 48000:
+        samples = samples * fs // 48000
+    return samples
+
+
+def parse_toc(packet: bytes, fs: int = 48000) -> PacketInfo:
+    """
+    Parses the TOC byte (and frame count byte) of an Opus packet.
+
+    Sample counts are given at the sample rate `fs`. Raises `OpusError` with
+    `INVALID_PACKET` when the frame count is invalid or the packet is longer
+    than 120 ms.
+    """
+    if not packet:
+        raise opuslib_next.OpusError(opuslib_next.BAD_ARG)
+
+    toc = packet[0]
+    frame_count = TOC_FRAME_COUNT[toc]
+    if not frame_count:
+        if len(packet) < 2:
+            raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+        frame_count = packet[1] & 0x3F
+
+    samples_per_frame = TOC_SAMPLES_PER_FRAME[toc]
+    samples = frame_count * samples_per_frame
+    if not frame_count or samples > MAX_PACKET_SAMPLES:
+        raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+
+    if fs != 48000:
+        samples_per_frame = samples_per_frame * fs // 48000
+        samples = samples * fs // 48000
+
+    return PacketInfo(
+        toc,
+        TOC_MODE[toc],
+        TOC_BANDWIDTH[toc],
+        TOC_STEREO[toc],
+        TOC_CODE[toc],
+        frame_count,
+        samples_per_frame,
+        samples,
+    )
+
+
+# Largest size of a single Opus frame in bytes
+MAX_FRAME_BYTES = 1275
+
+# Largest number of frames in a packet
+MAX_FRAMES = 48
+
+
+class ParsedPacket(object):
+
+    """Frame layout of an Opus packet."""
+
+    __slots__ = (
+        'info',
+        'frames',
+        'frame_offsets',
+        'payload_offset',
+        'padding',
+        'length',
+    )
+
+    def __init__(
+            self,
+            info: PacketInfo,
+            frames: typing.Tuple[memoryview, ...],
+            frame_offsets: typing.Tuple[int, ...],
+            payload_offset: int,
+            padding: int,
+            length: int
+    ) -> None:
+        self.info = info
+        self.frames = frames
+        self.frame_offsets = frame_offsets
+        self.payload_offset = payload_offset
+        self.padding = padding
+        self.length = length
+
+    @property
+    def toc(self) -> int:
+        """The TOC byte of the packet."""
+        return self.info.toc
+
+    @property
+    def frame_sizes(self) -> typing.Tuple[int, ...]:
+        """Sizes of the frames in bytes."""
+        return tuple(len(frame) for frame in self.frames)
+
+    def __repr__(self) -> str:
+        return '{}(toc={}, frame_sizes={}, payload_offset={}, padding={})' \
+            .format(type(self).__name__, self.info.toc, self.frame_sizes,
+                    self.payload_offset, self.padding)
+
+
+def _invalid():
+    return opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+
+
+def _parse_size(data, position: int, end: int) -> typing.Tuple[int, int]:
+    """Reads a 1 or 2 byte frame length, returns (size, bytes used)."""
+    if position >= end:
+        raise _invalid()
+    first = data[position]
+    if first < 252:
+        return first, 1
+    if position + 1 >= end:
+        raise _invalid()
+    return 4 * data[position + 1] + first, 2
+
+
+def _parse(data: memoryview, self_delimited: bool, fs: int) -> ParsedPacket:
+    """Frame parser following `opus_packet_parse_impl` of libopus."""
+    end = len(data)
+    if not end:
+        raise _invalid()
+
+    toc = data[0]
+    position = 1
+    samples_per_frame = TOC_SAMPLES_PER_FRAME[toc]
+    code = toc & 0x3
+    padding = 0
+    cbr = False
+    sizes = []
+    last_size = end - position
+
+    if code == 0:
+        count = 1
+    elif code == 1:
+        count = 2
+        cbr = True
+        if not self_delimited:
+            if last_size & 1:
+                raise _invalid()
+            last_size //= 2
+            sizes.append(last_size)
+    elif code == 2:
+        count = 2
+        size, used = _parse_size(data, position, end)
+        position += used
+        if size > end - position:
+            raise _invalid()
+        sizes.append(size)
+        last_size = end - position - size
+    else:
+        if position >= end:
+            raise _invalid()
+        header = data[position]
+        position += 1
+        count = header & 0x3F
+        if not count or samples_per_frame * count > MAX_PACKET_SAMPLES:
+            raise _invalid()
+        if header & 0x40:
+            while True:
+                if position >= end:
+                    raise _invalid()
+                value = data[position]
+                position += 1
+                padding += 254 if value == 255 else value
+                if value != 255:
+                    break
+            end -= padding
+            if end < position:
+                raise _invalid()
+        cbr = not header & 0x80
+        last_size = end - position
+        if not cbr:
+            for _ in range(count - 1):
+                size, used = _parse_size(data, position, end)
+                position += used
+                if size > end - position:
+                    raise _invalid()
+                sizes.append(size)
+                last_size -= used + size
+            if last_size < 0:
+                raise _invalid()
+        elif not self_delimited:
+            last_size //= count
+            if last_size * count != end - position:
+                raise _invalid()
+            sizes.extend([last_size] * (count - 1))
+
+    if self_delimited:
+        size, used = _parse_size(data, position, end)
+        position += used
+        if size > end - position:
+            raise _invalid()
+        if cbr:
+            if size * count > end - position:
+                raise _invalid()
+            sizes = [size] * count
+        else:
+            if used + size > last_size:
+                raise _invalid()
+            sizes.append(size)
+    else:
+        if last_size > MAX_FRAME_BYTES:
+            raise _invalid()
+        sizes.append(last_size)
+
+    payload_offset = position
+    offsets = []
+    frames = []
+    for size in sizes:
+        offsets.append(position)
+        frames.append(data[position:position + size])
+        position += size
+
+    samples = count * samples_per_frame
+    if fs != 48000:
+        samples_per_frame = samples_per_frame * fs // 48000
+        samples = samples * fs // 48000
+
+    info = PacketInfo(
+        toc, TOC_MODE[toc], TOC_BANDWIDTH[toc], TOC_STEREO[toc], code,
+        count, samples_per_frame, samples)
+    return ParsedPacket(
+        info, tuple(frames), tuple(offsets), payload_offset, padding,
+        position + padding)
+
+
+def parse(packet, fs: int = 48000, self_delimited: bool = False) -> ParsedPacket:
+    """
+    Parses an Opus packet into its frames (RFC 6716, section 3.2).
+
+    The frames are memoryview slices of `packet`; nothing is copied. With
+    `self_delimited` the packet uses the self-delimiting framing of RFC 6716
+    appendix B and may be followed by more data; `length` of the result is
+    the number of bytes it occupies. Raises `OpusError` with
+    `INVALID_PACKET` for malformed packets.
+    """
+    data = memoryview(packet)
+    if data.format != 'B':
+        data = data.cast('B')
+    return _parse(data, self_delimited, fs)
+
+
+class PacketBatch(object):
+
+    """
+    A sequence of packets stored back to back in one buffer.
+
+    `offsets` holds ``len(batch) + 1`` boundaries; packet ``i`` occupies
+    ``data[offsets[i]:offsets[i + 1]]``. Indexing returns memoryview slices.
+    """
+
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self, data, offsets: typing.Sequence[int]) -> None:
+        """
+        :param data: Buffer holding the packets.
+        :param offsets: Packet boundaries, starting at the first packet.
+        """
+        if not len(offsets):
+            raise ValueError('`offsets` must hold at least one boundary')
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_packets(cls, packets: typing.Iterable[bytes]) -> 'PacketBatch':
+        """Packs `packets` into a new batch."""
+        data = bytearray()
+        offsets = array.array('Q', [0])
+        for packet in packets:
+            data += packet
+            offsets.append(len(data))
+        return cls(data, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> memoryview:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('packet index out of range')
+        return memoryview(self.data)[
+            self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self) -> typing.Iterator[memoryview]:
+        view = memoryview(self.data)
+        offsets = self.offsets
+        for index in range(len(offsets) - 1):
+            yield view[offsets[index]:offsets[index + 1]]
+
+    @property
+    def sizes(self) -> typing.List[int]:
+        """Sizes of the packets in bytes."""
+        offsets = self.offsets
+        return [offsets[i + 1] - offsets[i] for i in range(len(offsets) - 1)]
+
+
+def parse_batch(batch: PacketBatch, fs: int = 48000) -> typing.List[ParsedPacket]:
+    """Parses every packet of a `PacketBatch`."""
+    data = memoryview(batch.data)
+    if data.format != 'B':
+        data = data.cast('B')
+    offsets = batch.offsets
+    return [
+        _parse(data[offsets[i]:offsets[i + 1]], False, fs)
+        for i in range(len(offsets) - 1)
+    ]
+
+
+def _pad_view(buffer, offset: int, length: int, new_len: int, streams) -> None:
+    view = (ctypes.c_char * new_len).from_buffer(buffer, offset)
+    if streams is None:
+        opuslib_next.api.repacketizer.packet_pad(view, length, new_len)
+    else:
+        opuslib_next.api.repacketizer.multistream_packet_pad(
+            view, length, new_len, streams)
+
+
+def _unpad_view(buffer, offset: int, length: int, streams) -> int:
+    view = (ctypes.c_char * length).from_buffer(buffer, offset)
+    if streams is None:
+        return opuslib_next.api.repacketizer.packet_unpad(view, length)
+    return opuslib_next.api.repacketizer.multistream_packet_unpad(
+        view, length, streams)
+
+
+def _pad(packet, new_len: int, streams) -> bytes:
+    if new_len < len(packet):
+        raise opuslib_next.OpusError(opuslib_next.BAD_ARG)
+    buffer = bytearray(new_len)
+    buffer[:len(packet)] = packet
+    _pad_view(buffer, 0, len(packet), new_len, streams)
+    return bytes(buffer)
+
+
+def _unpad(packet, streams) -> bytes:
+    buffer = bytearray(packet)
+    length = _unpad_view(buffer, 0, len(buffer), streams)
+    return bytes(buffer[:length])
+
+
+def pad(packet, new_len: int) -> bytes:
+    """
+    Pads an Opus packet to exactly `new_len` bytes.
+
+    The padding is part of the packet syntax and is ignored by decoders.
+    """
+    return _pad(packet, new_len, None)
+
+
+def unpad(packet) -> bytes:
+    """Removes all padding from an Opus packet."""
+    return _unpad(packet, None)
+
+
+def pad_into(
+        buffer: bytearray,
+        length: int,
+        new_len: typing.Optional[int] = None
+) -> None:
+    """
+    Pads the packet in the first `length` bytes of `buffer` in place.
+
+    The packet is padded to `new_len` bytes, by default to the size of
+    `buffer`.
+    """
+    if new_len is None:
+        new_len = len(buffer)
+    if new_len > len(buffer) or length > new_len:
+        raise opuslib_next.OpusError(opuslib_next.BAD_ARG)
+    _pad_view(buffer, 0, length, new_len, None)
+
+
+def unpad_into(buffer: bytearray, length: typing.Optional[int] = None) -> int:
+    """
+    Removes the padding of the packet in the first `length` bytes of
+    `buffer` in place. Returns the new packet length.
+    """
+    if length is None:
+        length = len(buffer)
+    return _unpad_view(buffer, 0, length, None)
+
+
+def multistream_pad(packet, new_len: int, streams: int) -> bytes:
+    """Pads a multistream packet of `streams` streams to `new_len` bytes."""
+    return _pad(packet, new_len, streams)
+
+
+def multistream_unpad(packet, streams: int) -> bytes:
+    """Removes all padding from a multistream packet."""
+    return _unpad(packet, streams)
+
+
+def multistream_pad_into(
+        buffer: bytearray,
+        length: int,
+        streams: int,
+        new_len: typing.Optional[int] = None
+) -> None:
+    """In-place variant of `multistream_pad`, see `pad_into`."""
+    if new_len is None:
+        new_len = len(buffer)
+    if new_len > len(buffer) or length > new_len:
+        raise opuslib_next.OpusError(opuslib_next.BAD_ARG)
+    _pad_view(buffer, 0, length, new_len, streams)
+
+
+def multistream_unpad_into(
+        buffer: bytearray,
+        streams: int,
+        length: typing.Optional[int] = None
+) -> int:
+    """In-place variant of `multistream_unpad`, see `unpad_into`."""
+    if length is None:
+        length = len(buffer)
+    return _unpad_view(buffer, 0, length, streams)
+
+
+def pad_batch(
+        batch: PacketBatch,
+        new_len: int,
+        streams: typing.Optional[int] = None
+) -> PacketBatch:
+    """
+    Pads every packet of a batch to `new_len` bytes.
+
+    Pass `streams` for multistream packets. The result is one new buffer of
+    ``len(batch) * new_len`` bytes.
+    """
+    count = len(batch)
+    data = bytearray(count * new_len)
+    offsets = batch.offsets
+    source = memoryview(batch.data)
+    for index in range(count):
+        start = offsets[index]
+        length = offsets[index + 1] - start
+        if length > new_len:
+            raise opuslib_next.OpusError(opuslib_next.BAD_ARG)
+        position = index * new_len
+        data[position:position + length] = source[start:start + length]
+        _pad_view(data, position, length, new_len, streams)
+
+    return PacketBatch(
+        data, array.array('Q', range(0, (count + 1) * new_len, new_len)))
+
+
+def unpad_batch(
+        batch: PacketBatch,
+        streams: typing.Optional[int] = None
+) -> PacketBatch:
+    """
+    Removes the padding from every packet of a batch.
+
+    Pass `streams` for multistream packets. The packets are compacted into
+    one new buffer.
+    """
+    offsets = batch.offsets
+    base = offsets[0]
+    data = bytearray(memoryview(batch.data)[base:offsets[-1]])
+    result = array.array('Q', [0])
+    position = 0
+    for index in range(len(offsets) - 1):
+        start = offsets[index] - base
+        length = _unpad_view(
+            data, start, offsets[index + 1] - offsets[index], streams)
+        if start != position:
+            ctypes.memmove(
+                (ctypes.c_char * length).from_buffer(data, position),
+                (ctypes.c_char * length).from_buffer(data, start),
+                length)
+        position += length
+        result.append(position)
+
+    del data[position:]
+    return PacketBatch(data, result)
+
+
+def _sample_positions_numpy(numpy, data, offsets, fs: int):
+    buffer = numpy.frombuffer(data, dtype=numpy.uint8)
+    bounds = numpy.asarray(offsets, dtype=numpy.int64)
+    starts = bounds[:-1]
+    lengths = numpy.diff(bounds)
+    if (lengths < 1).any():
+        raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+
+    tocs = buffer[starts]
+    samples = numpy.asarray(TOC_PACKET_SAMPLES, dtype=numpy.uint64)[tocs]
+    code3 = (tocs & 0x3) == 3
+    if code3.any():
+        if (lengths[code3] < 2).any():
+            raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+        counts = (buffer[starts[code3] + 1] & 0x3F).astype(numpy.uint64)
+        spf = numpy.asarray(TOC_SAMPLES_PER_FRAME, dtype=numpy.uint64)
+        samples[code3] = spf[tocs[code3]] * counts
+
+    if ((samples == 0) | (samples > MAX_PACKET_SAMPLES)).any():
+        raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+    if fs != 48000:
+        samples = samples * fs // 48000
+
+    positions = numpy.zeros(len(samples) + 1, dtype=numpy.uint64)
+    numpy.cumsum(samples, out=positions[1:])
+    return positions
+
+
+def sample_positions(
+        data,
+        offsets: typing.Optional[typing.Sequence[int]] = None,
+        fs: int = 48000,
+        use_numpy: typing.Optional[bool] = None
+):
+    """
+    Returns the cumulative sample position of every packet boundary.
+
+    `data` and `offsets` describe packets stored back to back as in a
+    `PacketBatch`, which may also be passed alone. Entry ``i`` of the result
+    is the number of samples (at `fs`) before packet ``i``; the last entry is
+    the total duration. Durations come from TOC table lookups only.
+
+    The result is an ``array('Q')``, or a NumPy ``uint64`` array when NumPy
+    is used. By default NumPy is used when it is installed. Raises
+    `OpusError` with `INVALID_PACKET` for empty or malformed packets.
+    """
+    if offsets is None:
+        data, offsets = data.data, data.offsets
+
+    numpy = None
+    if use_numpy is not False:
+        try:
+            import numpy
+        except ImportError:
+            if use_numpy:
+                raise
+    if numpy is not None:
+        return _sample_positions_numpy(numpy, data, offsets, fs)
+
+    data = memoryview(data)
+    if data.format != 'B':
+        data = data.cast('B')
+    packet_samples = TOC_PACKET_SAMPLES
+    samples_per_frame = TOC_SAMPLES_PER_FRAME
+    positions = array.array('Q', [0])
+    append = positions.append
+    total = 0
+    start = offsets[0]
+    for end in offsets[1:]:
+        if end <= start:
+            raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+        toc = data[start]
+        samples = packet_samples[toc]
+        if not samples:
+            if end - start < 2:
+                raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+            samples = samples_per_frame[toc] * (data[start + 1] & 0x3F)
+            if not samples or samples > MAX_PACKET_SAMPLES:
+                raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+        total += samples
+        append(total)
+        start = end
+
+    if fs != 48000:
+        for index in range(len(positions)):
+            positions[index] = positions[index] * fs // 48000
+    return positions
+
+
+def _encode_size(size: int) -> bytes:
+    """Encodes a frame length as in RFC 6716, section 3.2.1."""
+    if size < 252:
+        return bytes((size,))
+    first = 252 + ((size - 252) & 0x3)
+    return bytes((first, (size - first) >> 2))
+
+
+def parse_multistream(
+        packet,
+        streams: int,
+        fs: int = 48000
+) -> typing.List[ParsedPacket]:
+    """
+    Parses every stream of a multistream packet.
+
+    All streams but the last use the self-delimiting framing of RFC 6716
+    appendix B. The frames of the results are memoryview slices of
+    `packet`; nothing is copied. Frame offsets are relative to the start of
+    each stream's sub-packet.
+    """
+    data = memoryview(packet)
+    if data.format != 'B':
+        data = data.cast('B')
+
+    parsed = []
+    for stream in range(streams):
+        result = _parse(data, stream < streams - 1, fs)
+        parsed.append(result)
+        data = data[result.length:]
+    return parsed
+
+
+def split_multistream(
+        packet,
+        streams: int,
+        select: typing.Optional[typing.Iterable[int]] = None
+) -> typing.List[bytes]:
+    """
+    Splits a multistream packet into standalone per-stream Opus packets.
+
+    Each result can be decoded by a plain `Decoder`. `select` limits the
+    output to the given stream indices, e.g. ``(0,)`` for only the first
+    coupled pair. Only the self-delimiting length field is dropped, so each
+    stream is copied exactly once.
+    """
+    data = memoryview(packet)
+    if data.format != 'B':
+        data = data.cast('B')
+    wanted = set(range(streams) if select is None else select)
+
+    result = []
+    position = 0
+    for stream in range(streams):
+        self_delimited = stream < streams - 1
+        part = data[position:]
+        parsed = _parse(part, self_delimited, 48000)
+        if stream in wanted:
+            if self_delimited:
+                # Cut the length field in front of the frame data
+                size_length = len(_encode_size(len(parsed.frames[-1])))
+                cut = parsed.payload_offset - size_length
+                result.append(b''.join((
+                    part[:cut],
+                    part[parsed.payload_offset:parsed.length])))
+            else:
+                result.append(bytes(part[:parsed.length]))
+        position += parsed.length
+    return result
+
+
+def assemble_multistream(packets: typing.Sequence[bytes]) -> bytes:
+    """
+    Combines standalone per-stream packets into one multistream packet.
+
+    This is the inverse of `split_multistream`: every packet but the last is
+    converted to the self-delimiting framing.
+    """
+    pieces = []
+    last = len(packets) - 1
+    for index, packet in enumerate(packets):
+        data = memoryview(packet)
+        if data.format != 'B':
+            data = data.cast('B')
+        if index == last:
+            pieces.append(data)
+            continue
+        parsed = _parse(data, False, 48000)
+        pieces.append(data[:parsed.payload_offset])
+        pieces.append(_encode_size(len(parsed.frames[-1])))
+        pieces.append(data[parsed.payload_offset:])
+    return b''.join(pieces)
+
+
+# Validation results, numbered after the rules of RFC 6716, section 3.4
+VALID = 0
+# [R1] Packets are at least one byte
+INVALID_EMPTY = 1
+# [R2] No implicit frame length is larger than 1275 bytes
+INVALID_FRAME_LENGTH = 2
+# [R3] Code 1 packets have an odd total length
+INVALID_CODE1_LENGTH = 3
+# [R4] Code 2 packets hold a valid first frame length that fits the packet
+INVALID_CODE2_LENGTH = 4
+# [R5] Code 3 packets hold at least one frame and at most 120 ms
+INVALID_FRAME_COUNT = 5
+# [R6] CBR code 3 padding fits and the rest divides into the frame count
+INVALID_CBR_LENGTH = 6
+# [R7] VBR code 3 headers, frame lengths and padding fit in the packet
+INVALID_VBR_LENGTH = 7
+
+VALIDATION_REASONS = (
+    'valid',
+    'empty packet',
+    'frame longer than 1275 bytes',
+    'code 1 packet with an even length',
+    'code 2 frame length does not fit the packet',
+    'code 3 frame count is zero or exceeds 120 ms',
+    'code 3 CBR length or padding does not fit the packet',
+    'code 3 VBR lengths or padding do not fit the packet',
+)
+
+
+def _validate(data, start: int, end: int) -> int:
+    """Checks the packet in ``data[start:end]`` without raising."""
+    if end <= start:
+        return INVALID_EMPTY
+
+    toc = data[start]
+    code = toc & 0x3
+    position = start + 1
+
+    if code == 0:
+        if end - position > MAX_FRAME_BYTES:
+            return INVALID_FRAME_LENGTH
+        return VALID
+
+    if code == 1:
+        if (end - position) & 1:
+            return INVALID_CODE1_LENGTH
+        if (end - position) >> 1 > MAX_FRAME_BYTES:
+            return INVALID_FRAME_LENGTH
+        return VALID
+
+    if code == 2:
+        if position >= end:
+            return INVALID_CODE2_LENGTH
+        size = data[position]
+        position += 1
+        if size >= 252:
+            if position >= end:
+                return INVALID_CODE2_LENGTH
+            size += 4 * data[position]
+            position += 1
+        if size > end - position:
+            return INVALID_CODE2_LENGTH
+        if end - position - size > MAX_FRAME_BYTES:
+            return INVALID_FRAME_LENGTH
+        return VALID
+
+    if position >= end:
+        return INVALID_FRAME_COUNT
+    header = data[position]
+    position += 1
+    count = header & 0x3F
+    if not count or TOC_SAMPLES_PER_FRAME[toc] * count > MAX_PACKET_SAMPLES:
+        return INVALID_FRAME_COUNT
+
+    reason = INVALID_VBR_LENGTH if header & 0x80 else INVALID_CBR_LENGTH
+    if header & 0x40:
+        while True:
+            if position >= end:
+                return reason
+            value = data[position]
+            position += 1
+            end -= 254 if value == 255 else value
+            if value != 255:
+                break
+        if end < position:
+            return reason
+
+    if reason == INVALID_CBR_LENGTH:
+        remaining = end - position
+        if remaining % count:
+            return INVALID_CBR_LENGTH
+        if remaining // count > MAX_FRAME_BYTES:
+            return INVALID_FRAME_LENGTH
+        return VALID
+
+    last = end - position
+    for _ in range(count - 1):
+        if position >= end:
+            return INVALID_VBR_LENGTH
+        size = data[position]
+        position += 1
+        used = 1
+        if size >= 252:
+            if position >= end:
+                return INVALID_VBR_LENGTH
+            size += 4 * data[position]
+            position += 1
+            used = 2
+        if size > end - position:
+            return INVALID_VBR_LENGTH
+        last -= used + size
+    if last < 0:
+        return INVALID_VBR_LENGTH
+    if last > MAX_FRAME_BYTES:
+        return INVALID_FRAME_LENGTH
+    return VALID
+
+
+def validate(packet) -> int:
+    """
+    Checks an Opus packet against the structure rules of RFC 6716,
+    section 3.4, without raising.
+
+    Returns `VALID` (0) or the number of the first violated rule, one of the
+    `INVALID_*` constants; `VALIDATION_REASONS` holds a description for each
+    value. A valid packet is accepted by the libopus packet parser, so
+    malformed input can be dropped before it reaches the decoder.
+    """
+    return _validate(packet, 0, len(packet))
+
+
+def validate_batch(batch: PacketBatch) -> array.array:
+    """
+    Validates every packet of a `PacketBatch`.
+
+    Returns an ``array('B')`` with one `validate` result per packet.
+    """
+    data = memoryview(batch.data)
+    if data.format != 'B':
+        data = data.cast('B')
+    offsets = batch.offsets
+    check = _validate
+    return array.array('B', [
+        check(data, offsets[index], offsets[index + 1])
+        for index in range(len(offsets) - 1)
+    ])
@@ -0,0 +1,216 @@
+"""
+Parallel chunked encoding of long PCM buffers.
+
+Usage example:
+
+>>> import opuslib_next.parallel
+>>> encoder = opuslib_next.parallel.ChunkedEncoder(48000, 2, 'audio')
+>>> packets = encoder.encode(pcm)
+
+The input is cut into chunks on the global frame grid and every chunk is
+encoded by a fresh encoder in a worker process. A chunk encoder starts
+`preroll_frames` frames before its chunk so that the encoder lookahead is
+filled with real signal and the adaptive state has settled; the packets of
+the pre-roll are dropped. Chunks are submitted lazily with a bounded number
+in flight, so only those chunks are copied for the workers. Because the
+kept packets sit on the same frame grid as a serial encode, the spliced
+stream has exactly the packet count and sample timing of a single `Encoder`
+run and can be decoded by one `Decoder`.
+"""
+
+import collections
+import concurrent.futures
+import math
+import os
+import typing
+
+import opuslib_next
+import opuslib_next.classes
+
+
+# Frames encoded on top of the lookahead before packets are kept
+DEFAULT_WARMUP_FRAMES = 8
+
+# Frames per chunk (one minute of 20 ms frames)
+DEFAULT_CHUNK_FRAMES = 3000
+
+# Chunks in flight per worker, keeping the workers busy while bounding the
+# memory held by submitted chunks
+IN_FLIGHT_PER_WORKER = 2
+
+_SAMPLE_WIDTH = {False: 2, True: 4}
+
+
+def _encode_chunk(
+        fs: int,
+        channels: int,
+        application: int,
+        frame_size: int,
+        ctls: typing.Tuple[typing.Tuple[str, int], ...],
+        use_float: bool,
+        pcm: typing.Union[bytes, memoryview],
+        skip_frames: int
+) -> typing.List[bytes]:
+    """Encodes one chunk, dropping the first `skip_frames` packets."""
+    encoder = opuslib_next.classes.Encoder(fs, channels, application)
+    for name, value in ctls:
+        setattr(encoder, name, value)
+
+    encode = encoder.encode_float if use_float else encoder.encode
+    frame_bytes = frame_size * channels * _SAMPLE_WIDTH[use_float]
+
+    packets = []
+    view = memoryview(pcm)
+    for index, offset in enumerate(range(0, len(pcm), frame_bytes)):
+        frame = bytes(view[offset:offset + frame_bytes])
+        if len(frame) < frame_bytes:
+            # The final partial frame is zero padded
+            frame += b'\x00' * (frame_bytes - len(frame))
+        packet = encode(frame, frame_size)
+        if index >= skip_frames:
+            packets.append(packet)
+
+    return packets
+
+
+class ChunkedEncoder(object):
+
+    """Encodes long PCM buffers in parallel chunks on a process pool."""
+
+    def __init__(
+            self,
+            fs: int,
+            channels: int,
+            application,
+            frame_size: int = 960,
+            chunk_frames: int = DEFAULT_CHUNK_FRAMES,
+            preroll_frames: typing.Optional[int] = None,
+            max_workers: typing.Optional[int] = None,
+            executor: typing.Optional[concurrent.futures.Executor] = None,
+            **ctls: int
+    ) -> None:
+        """
+        :param fs: Sample Rate.
+        :param channels: Number of channels.
+        :param application: Encoder application, as accepted by `Encoder`.
+        :param frame_size: Samples per channel in each frame.
+        :param chunk_frames: Frames encoded per worker task.
+        :param preroll_frames: Overlap encoded and dropped before each chunk.
+            Defaults to the encoder lookahead rounded up to whole frames plus
+            `DEFAULT_WARMUP_FRAMES`.
+        :param max_workers: Size of the process pool created per call.
+        :param executor: Executor to use instead of a private process pool.
+        :param ctls: Encoder properties applied to every chunk encoder,
+            for example ``bitrate=64000`` or ``complexity=10``.
+        """
+        if chunk_frames < 1:
+            raise ValueError('`chunk_frames` must be positive')
+
+        # Validates the configuration and resolves the application name
+        probe = opuslib_next.classes.Encoder(fs, channels, application)
+        for name, value in ctls.items():
+            setattr(probe, name, value)
+
+        self._fs = fs
+        self._channels = channels
+        self._application = probe._application
+        self._frame_size = frame_size
+        self._chunk_frames = chunk_frames
+        self._ctls = tuple(ctls.items())
+        self._lookahead = probe.lookahead
+        self._max_workers = max_workers
+        self._executor = executor
+
+        if preroll_frames is None:
+            preroll_frames = math.ceil(self._lookahead / frame_size) + \
+                DEFAULT_WARMUP_FRAMES
+        elif preroll_frames * frame_size < self._lookahead:
+            raise ValueError(
+                '`preroll_frames` must cover the encoder lookahead of '
+                '{} samples'.format(self._lookahead))
+        self._preroll_frames = preroll_frames
+
+    @property
+    def lookahead(self) -> int:
+        """Encoder lookahead in samples, as reported by libopus."""
+        return self._lookahead
+
+    @property
+    def preroll_frames(self) -> int:
+        """Frames of overlap encoded and dropped in front of each chunk."""
+        return self._preroll_frames
+
+    def encode(self, pcm_data: bytes) -> typing.List[bytes]:
+        """
+        Encodes interleaved signed 16-bit PCM into a list of Opus packets.
+        """
+        return self._encode(pcm_data, False)
+
+    def encode_float(self, pcm_data: bytes) -> typing.List[bytes]:
+        """
+        Encodes interleaved floating point PCM into a list of Opus packets.
+        """
+        return self._encode(pcm_data, True)
+
+    def _tasks(self, pcm_data: bytes, use_float: bool):
+        """Yields (view of the chunk and its pre-roll, frames to skip)."""
+        frame_bytes = \
+            self._frame_size * self._channels * _SAMPLE_WIDTH[use_float]
+        total_frames = math.ceil(len(pcm_data) / frame_bytes)
+        view = memoryview(pcm_data)
+
+        for first in range(0, total_frames, self._chunk_frames):
+            start = max(0, first - self._preroll_frames)
+            end = min(first + self._chunk_frames, total_frames)
+            yield view[start * frame_bytes:end * frame_bytes], first - start
+
+    def _encode(self, pcm_data: bytes, use_float: bool) -> typing.List[bytes]:
+        if not pcm_data:
+            return []
+
+        frame_bytes = \
+            self._frame_size * self._channels * _SAMPLE_WIDTH[use_float]
+        count = math.ceil(
+            math.ceil(len(pcm_data) / frame_bytes) / self._chunk_frames)
+        max_workers = min(self._max_workers or os.cpu_count() or 1, count)
+
+        if self._executor is not None:
+            return self._submit(self._executor, pcm_data, use_float,
+                                max_workers)
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+            return self._submit(executor, pcm_data, use_float, max_workers)
+
+    def _submit(
+            self,
+            executor: concurrent.futures.Executor,
+            pcm_data: bytes,
+            use_float: bool,
+            max_workers: int
+    ) -> typing.List[bytes]:
+        """Runs the chunks on `executor` and splices the packets in order."""
+        # Memoryviews cannot be pickled, chunks are copied for processes
+        copy = isinstance(executor, concurrent.futures.ProcessPoolExecutor)
+        limit = max_workers * IN_FLIGHT_PER_WORKER
+        pending = collections.deque()
+        packets = []
+        try:
+            for pcm, skip in self._tasks(pcm_data, use_float):
+                if len(pending) >= limit:
+                    packets.extend(pending.popleft().result())
+                pending.append(executor.submit(
+                    _encode_chunk,
+                    self._fs,
+                    self._channels,
+                    self._application,
+                    self._frame_size,
+                    self._ctls,
+                    use_float,
+                    bytes(pcm) if copy else pcm,
+                    skip
+                ))
+            while pending:
+                packets.extend(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+        return packets
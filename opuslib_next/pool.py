@@ -0,0 +1,447 @@
+"""
+Multiprocess codec pool with sticky stream sharding.
+
+Usage example:
+
+>>> import opuslib_next.pool
+>>> with opuslib_next.pool.ShardedPool(workers=4) as pool:
+...     pool.open_encoder('call-1', 48000, 1, 'voip', bitrate=24000)
+...     packet = pool.encode('call-1', pcm, 960)
+
+Each worker process owns long-lived encoders and decoders for the streams
+routed to it by a consistent hash ring, so codec state stays in one process
+for the life of a stream. Payloads travel through a `SharedMemory` block per
+worker that is split into fixed-size slots; only small control tuples go
+through the worker pipe. Every slot has an input and an output area and one
+slot is held by each in-flight request.
+
+The pool object itself is not thread safe.
+"""
+
+import bisect
+import collections
+import ctypes
+import hashlib
+import multiprocessing
+import multiprocessing.shared_memory
+import time
+import typing
+
+import opuslib_next
+import opuslib_next.classes
+
+
+DEFAULT_SLOTS = 32
+DEFAULT_SLOT_SIZE = 64 * 1024
+DEFAULT_VNODES = 64
+
+
+class WorkerError(Exception):
+
+    """A pool worker died or failed to process a request."""
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing(object):
+
+    """Consistent hash ring mapping stream IDs to worker indices."""
+
+    def __init__(self, nodes: int, vnodes: int = DEFAULT_VNODES) -> None:
+        points = sorted(
+            (_hash('{}:{}'.format(node, vnode)), node)
+            for node in range(nodes)
+            for vnode in range(vnodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def lookup(self, stream_id: typing.Hashable) -> int:
+        """Returns the worker index owning `stream_id`."""
+        index = bisect.bisect(self._keys, _hash(repr(stream_id)))
+        return self._nodes[index % len(self._nodes)]
+
+
+def _worker_main(conn, shm_name: str, slot_size: int) -> None:
+    """Worker process loop."""
+    shm = multiprocessing.shared_memory.SharedMemory(shm_name)
+    buf = shm.buf
+    codecs = {}
+    stats = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'busy_seconds': 0.0}
+
+    def view(slot, nbytes):
+        # Zero-copy ctypes view of a slot's input area
+        return (ctypes.c_char * nbytes).from_buffer(buf, slot * 2 * slot_size)
+
+    def store(slot, data):
+        offset = (slot * 2 + 1) * slot_size
+        if len(data) > slot_size:
+            raise ValueError('Result does not fit in a pool slot')
+        buf[offset:offset + len(data)] = data
+        return len(data)
+
+    try:
+        while True:
+            message = conn.recv()
+            command = message[0]
+            if command == 'stop':
+                break
+
+            started = time.perf_counter()
+            try:
+                if command == 'encode':
+                    _, stream_id, slot, nbytes, frame_size = message
+                    output = codecs[stream_id].encode(
+                        view(slot, nbytes), frame_size)
+                    result = store(slot, output)
+                    stats['bytes_in'] += nbytes
+                    stats['bytes_out'] += result
+                elif command == 'decode':
+                    _, stream_id, slot, nbytes, frame_size, fec = message
+                    output = codecs[stream_id].decode(
+                        view(slot, nbytes), frame_size, fec)
+                    result = store(slot, output)
+                    stats['bytes_in'] += nbytes
+                    stats['bytes_out'] += result
+                elif command == 'open_encoder':
+                    _, stream_id, args, ctls = message
+                    encoder = opuslib_next.classes.Encoder(*args)
+                    for name, value in ctls.items():
+                        setattr(encoder, name, value)
+                    codecs[stream_id] = encoder
+                    result = None
+                elif command == 'open_decoder':
+                    _, stream_id, args, ctls = message
+                    decoder = opuslib_next.classes.Decoder(*args)
+                    for name, value in ctls.items():
+                        setattr(decoder, name, value)
+                    codecs[stream_id] = decoder
+                    result = None
+                elif command == 'ctl':
+                    _, stream_id, name, value = message
+                    setattr(codecs[stream_id], name, value)
+                    result = None
+                elif command == 'close':
+                    codecs.pop(message[1], None)
+                    result = None
+                elif command == 'stats':
+                    result = dict(stats, streams=len(codecs))
+                else:
+                    raise ValueError('Unknown command {!r}'.format(command))
+            except Exception as exc:  # pylint: disable=broad-except
+                conn.send((False, exc))
+            else:
+                conn.send((True, result))
+
+            stats['requests'] += 1
+            stats['busy_seconds'] += time.perf_counter() - started
+    finally:
+        del buf
+        shm.close()
+
+
+class _Worker(object):
+
+    """Parent-side handle of one worker process."""
+
+    def __init__(self, context, slots: int, slot_size: int) -> None:
+        self.slot_size = slot_size
+        self.shm = multiprocessing.shared_memory.SharedMemory(
+            create=True, size=slots * 2 * slot_size)
+        self.free = collections.deque(range(slots))
+        self.pending = collections.deque()
+        self.restarts = 0
+        self._context = context
+        self.start()
+
+    def start(self) -> None:
+        self.conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.shm.name, self.slot_size),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.release_pending()
+
+    def release_pending(self) -> None:
+        """Drops the pending replies and frees their slots."""
+        self.free.extend(slot for _, slot in self.pending if slot is not None)
+        self.pending.clear()
+
+    def send(self, message, slot=None, tag=None) -> None:
+        try:
+            self.conn.send(message)
+        except (BrokenPipeError, EOFError, OSError) as exc:
+            raise WorkerError('Worker process is not running') from exc
+        self.pending.append((tag, slot))
+
+    def receive(self):
+        """Returns the oldest pending reply as `(tag, slot, ok, value)`."""
+        tag, slot = self.pending[0]
+        try:
+            ok, value = self.conn.recv()
+        except (EOFError, OSError) as exc:
+            raise WorkerError('Worker process died') from exc
+        self.pending.popleft()
+        return tag, slot, ok, value
+
+    def write(self, slot: int, data: bytes) -> int:
+        if len(data) > self.slot_size:
+            raise ValueError(
+                'Payload of {} bytes exceeds the slot size of {} bytes'.format(
+                    len(data), self.slot_size))
+        offset = slot * 2 * self.slot_size
+        self.shm.buf[offset:offset + len(data)] = data
+        return len(data)
+
+    def read(self, slot: int, nbytes: int) -> bytes:
+        offset = (slot * 2 + 1) * self.slot_size
+        return bytes(self.shm.buf[offset:offset + nbytes])
+
+    def stop(self) -> None:
+        if self.process.is_alive():
+            try:
+                self.conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+    def release(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ShardedPool(object):
+
+    """Pool of worker processes owning codec state for a shard of streams."""
+
+    def __init__(
+            self,
+            workers: int = 2,
+            slots: int = DEFAULT_SLOTS,
+            slot_size: int = DEFAULT_SLOT_SIZE,
+            vnodes: int = DEFAULT_VNODES,
+            mp_context=None
+    ) -> None:
+        """
+        :param workers: Number of worker processes.
+        :param slots: In-flight requests per worker.
+        :param slot_size: Bytes reserved for one request payload and for one
+            result.
+        :param vnodes: Virtual nodes per worker on the hash ring.
+        :param mp_context: `multiprocessing` context used to start workers.
+        """
+        if workers < 1:
+            raise ValueError('`workers` must be positive')
+
+        context = mp_context or multiprocessing.get_context()
+        self._ring = HashRing(workers, vnodes)
+        self._streams = {}
+        self._workers = []
+        try:
+            for _ in range(workers):
+                self._workers.append(_Worker(context, slots, slot_size))
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> 'ShardedPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stops the workers and releases the shared memory."""
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+            worker.release()
+
+    def worker_for(self, stream_id: typing.Hashable) -> int:
+        """Returns the index of the worker owning `stream_id`."""
+        return self._ring.lookup(stream_id)
+
+    def _call(self, stream_id, message):
+        worker = self._workers[self.worker_for(stream_id)]
+        self._drain(worker)
+        worker.send(message)
+        _, _, ok, value = worker.receive()
+        if not ok:
+            raise value
+        return value
+
+    def _drain(self, worker: _Worker) -> None:
+        while worker.pending:
+            _, slot, _, _ = worker.receive()
+            if slot is not None:
+                worker.free.append(slot)
+
+    def _open(self, kind, stream_id, args, ctls) -> None:
+        self._call(stream_id, (kind, stream_id, args, ctls))
+        self._streams[stream_id] = (kind, args, dict(ctls))
+
+    def open_encoder(
+            self,
+            stream_id: typing.Hashable,
+            fs: int,
+            channels: int,
+            application,
+            **ctls: int
+    ) -> None:
+        """Creates an encoder for `stream_id` on its worker."""
+        self._open('open_encoder', stream_id, (fs, channels, application), ctls)
+
+    def open_decoder(
+            self,
+            stream_id: typing.Hashable,
+            fs: int,
+            channels: int,
+            **ctls: int
+    ) -> None:
+        """Creates a decoder for `stream_id` on its worker."""
+        self._open('open_decoder', stream_id, (fs, channels), ctls)
+
+    def set_ctl(self, stream_id: typing.Hashable, name: str, value) -> None:
+        """Sets a codec property, remembered for worker restarts."""
+        self._call(stream_id, ('ctl', stream_id, name, value))
+        self._streams[stream_id][2][name] = value
+
+    def close_stream(self, stream_id: typing.Hashable) -> None:
+        """Destroys the codec state of `stream_id`."""
+        self._call(stream_id, ('close', stream_id))
+        del self._streams[stream_id]
+
+    def encode(
+            self,
+            stream_id: typing.Hashable,
+            pcm_data: bytes,
+            frame_size: int
+    ) -> bytes:
+        """Encodes one frame on the encoder of `stream_id`."""
+        return self.process([(stream_id, pcm_data, frame_size)])[0]
+
+    def decode(
+            self,
+            stream_id: typing.Hashable,
+            opus_data: bytes,
+            frame_size: int,
+            decode_fec: bool = False
+    ) -> bytes:
+        """Decodes one packet on the decoder of `stream_id`."""
+        return self.process(
+            [(stream_id, opus_data, frame_size, decode_fec)])[0]
+
+    def process(self, requests: typing.Iterable[tuple]) -> typing.List[bytes]:
+        """
+        Runs a batch of encode and decode requests across all workers.
+
+        Each request is `(stream_id, data, frame_size)`, or
+        `(stream_id, data, frame_size, decode_fec)` for decoders; the kind of
+        request follows the codec opened for the stream. Requests for
+        different workers run in parallel, requests for one stream run in
+        order. Results are returned in request order.
+        """
+        results = []
+        errors = []
+
+        def collect(worker):
+            index, slot, ok, value = worker.receive()
+            worker.free.append(slot)
+            if ok:
+                results[index] = worker.read(slot, value)
+            else:
+                errors.append(value)
+
+        try:
+            for index, request in enumerate(requests):
+                stream_id, data, frame_size = request[:3]
+                kind = self._streams[stream_id][0]
+                worker = self._workers[self.worker_for(stream_id)]
+                if not worker.free:
+                    collect(worker)
+                slot = worker.free.popleft()
+                results.append(None)
+                try:
+                    nbytes = worker.write(slot, data)
+                    if kind == 'open_encoder':
+                        message = (
+                            'encode', stream_id, slot, nbytes, frame_size)
+                    else:
+                        decode_fec = len(request) > 3 and bool(request[3])
+                        message = (
+                            'decode', stream_id, slot, nbytes, frame_size,
+                            decode_fec)
+                    worker.send(message, slot, index)
+                except (ValueError, WorkerError):
+                    worker.free.append(slot)
+                    raise
+        finally:
+            failure = None
+            for worker in self._workers:
+                try:
+                    while worker.pending:
+                        collect(worker)
+                except WorkerError as exc:
+                    # The replies died with the worker, free their slots
+                    worker.release_pending()
+                    failure = failure or exc
+            if failure is not None:
+                raise failure
+
+        if errors:
+            raise errors[0]
+        return results
+
+    def restart(self, index: int) -> None:
+        """
+        Restarts worker `index` and rebuilds the codecs of its streams.
+
+        The rebuilt codecs start from a fresh state with the configuration
+        and properties last set through the pool.
+        """
+        worker = self._workers[index]
+        worker.stop()
+        worker.restarts += 1
+        worker.start()
+        for stream_id, (kind, args, ctls) in self._streams.items():
+            if self.worker_for(stream_id) == index:
+                worker.send((kind, stream_id, args, ctls))
+                _, _, ok, value = worker.receive()
+                if not ok:
+                    raise value
+
+    def check_workers(self) -> typing.List[int]:
+        """Restarts dead workers and returns their indices."""
+        dead = [
+            index for index, worker in enumerate(self._workers)
+            if not worker.process.is_alive()
+        ]
+        for index in dead:
+            self.restart(index)
+        return dead
+
+    def stats(self) -> typing.List[dict]:
+        """
+        Returns per-worker load metrics.
+
+        Each entry holds the request count, payload bytes in and out, time
+        spent processing, the number of streams and the restart count.
+        """
+        stats = []
+        for worker in self._workers:
+            self._drain(worker)
+            worker.send(('stats',))
+            _, _, _, value = worker.receive()
+            value['restarts'] = worker.restarts
+            stats.append(value)
+        return stats
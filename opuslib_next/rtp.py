@@ -0,0 +1,405 @@
+"""
+RTP payload format for Opus (RFC 7587).
+
+Usage example:
+
+>>> import opuslib_next.rtp
+>>> payloader = opuslib_next.rtp.Payloader(ssrc=0x1234)
+>>> datagram = payloader.payload(encoder.encode(pcm, 960))
+>>> depayloader = opuslib_next.rtp.Depayloader()
+>>> packet = depayloader.depayload(datagram)
+>>> packet.timestamp, bytes(packet.payload)
+
+Timestamps use the 48 kHz RTP clock mandated for Opus and advance by the
+duration read from each packet's TOC byte. The marker bit is set on the
+first packet after a run of DTX packets or a gap skipped with `advance`,
+i.e. at the start of a talkspurt.
+`payload_batch` builds many datagrams into one `PacketBatch`, with NumPy
+filling in all headers at once when it is installed.
+"""
+
+import array
+import random
+import struct
+import typing
+
+import opuslib_next
+import opuslib_next.packet
+
+
+RTP_VERSION = 2
+
+HEADER_SIZE = 12
+
+# RTP clock rate of Opus, whatever the sample rate of the audio
+CLOCK_RATE = 48000
+
+# Dynamic payload type commonly negotiated for Opus
+DEFAULT_PAYLOAD_TYPE = 111
+
+# Smallest batch for which `payload_batch` uses NumPy by default
+NUMPY_MIN_PACKETS = 128
+
+_HEADER = struct.Struct('>BBHII')
+
+
+class Payloader(object):
+
+    """Turns Opus packets of one stream into RTP datagrams."""
+
+    def __init__(
+            self,
+            ssrc: typing.Optional[int] = None,
+            payload_type: int = DEFAULT_PAYLOAD_TYPE,
+            sequence: typing.Optional[int] = None,
+            timestamp: typing.Optional[int] = None
+    ) -> None:
+        """
+        :param ssrc: Synchronization source identifier, random if omitted.
+        :param payload_type: RTP payload type (0-127).
+        :param sequence: First sequence number, random if omitted.
+        :param timestamp: First timestamp, random if omitted.
+        """
+        if not 0 <= payload_type <= 127:
+            raise ValueError('`payload_type` must be between 0 and 127')
+        self.ssrc = random.getrandbits(32) if ssrc is None else ssrc
+        self.payload_type = payload_type
+        self.sequence = \
+            random.getrandbits(16) if sequence is None else sequence
+        self.timestamp = \
+            random.getrandbits(32) if timestamp is None else timestamp
+        self._in_dtx = False
+
+    def payload_into(
+            self,
+            packet,
+            buffer: bytearray,
+            offset: int = 0,
+            samples: typing.Optional[int] = None
+    ) -> int:
+        """
+        Writes the datagram carrying `packet` into `buffer` at `offset`.
+        Returns its size.
+
+        :param samples: Duration of the packet at 48 kHz. Read from the TOC
+            byte if omitted.
+        """
+        length = len(packet)
+        if samples is None:
+            samples = opuslib_next.packet.get_nb_samples(packet)
+
+        dtx = length <= opuslib_next.packet.DTX_MAX_BYTES
+        marker = 0x80 if self._in_dtx and not dtx else 0
+        self._in_dtx = dtx
+
+        _HEADER.pack_into(
+            buffer, offset, 0x80, marker | self.payload_type,
+            self.sequence, self.timestamp, self.ssrc)
+        end = offset + HEADER_SIZE + length
+        buffer[offset + HEADER_SIZE:end] = packet
+
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        self.timestamp = (self.timestamp + samples) & 0xFFFFFFFF
+        return end - offset
+
+    def payload(
+            self,
+            packet,
+            samples: typing.Optional[int] = None
+    ) -> bytearray:
+        """Returns the datagram carrying `packet`."""
+        datagram = bytearray(HEADER_SIZE + len(packet))
+        self.payload_into(packet, datagram, 0, samples)
+        return datagram
+
+    def advance(self, samples: int) -> None:
+        """
+        Skips the timestamp over `samples` at 48 kHz that are not sent, such
+        as suppressed DTX frames. The next packet carries the marker bit.
+        """
+        self.timestamp = (self.timestamp + samples) & 0xFFFFFFFF
+        self._in_dtx = True
+
+    def payload_batch(
+            self,
+            packets,
+            use_numpy: typing.Optional[bool] = None
+    ) -> opuslib_next.packet.PacketBatch:
+        """
+        Packs the datagrams of many packets back to back into one
+        `PacketBatch`, ready for ``sendmmsg``-style output.
+
+        `packets` is a `PacketBatch` or an iterable of packets. By default
+        NumPy is used when it is installed and there are at least
+        `NUMPY_MIN_PACKETS` packets.
+        """
+        if not isinstance(packets, opuslib_next.packet.PacketBatch):
+            packets = opuslib_next.packet.PacketBatch.from_packets(packets)
+
+        numpy = None
+        if use_numpy or (
+                use_numpy is None and len(packets) >= NUMPY_MIN_PACKETS):
+            try:
+                import numpy
+            except ImportError:
+                if use_numpy:
+                    raise
+        if numpy is not None and len(packets):
+            return self._payload_batch_numpy(numpy, packets)
+
+        view = memoryview(packets.data)
+        if view.format != 'B':
+            view = view.cast('B')
+        offsets = packets.offsets
+        data = bytearray(
+            offsets[-1] - offsets[0] + HEADER_SIZE * (len(offsets) - 1))
+        result = array.array('Q', [0])
+        append = result.append
+        pack_into = _HEADER.pack_into
+        packet_samples = opuslib_next.packet.TOC_PACKET_SAMPLES
+        samples_per_frame = opuslib_next.packet.TOC_SAMPLES_PER_FRAME
+        payload_type = self.payload_type
+        ssrc = self.ssrc
+        sequence = self.sequence
+        timestamp = self.timestamp
+        in_dtx = self._in_dtx
+        position = 0
+        start = offsets[0]
+        for end in offsets[1:]:
+            length = end - start
+            if not length:
+                raise opuslib_next.OpusError(opuslib_next.BAD_ARG)
+            toc = view[start]
+            samples = packet_samples[toc]
+            if not samples:
+                # Code 3 packets carry their frame count in a second byte
+                if length < 2:
+                    raise opuslib_next.OpusError(
+                        opuslib_next.INVALID_PACKET)
+                samples = samples_per_frame[toc] * (view[start + 1] & 0x3F)
+
+            dtx = length <= opuslib_next.packet.DTX_MAX_BYTES
+            pack_into(
+                data, position, 0x80,
+                0x80 | payload_type if in_dtx and not dtx else payload_type,
+                sequence, timestamp, ssrc)
+            position += HEADER_SIZE
+            data[position:position + length] = view[start:end]
+            position += length
+            append(position)
+
+            in_dtx = dtx
+            sequence = (sequence + 1) & 0xFFFF
+            timestamp = (timestamp + samples) & 0xFFFFFFFF
+            start = end
+
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self._in_dtx = in_dtx
+        return opuslib_next.packet.PacketBatch(data, result)
+
+    def _payload_batch_numpy(
+            self,
+            numpy,
+            packets: opuslib_next.packet.PacketBatch
+    ) -> opuslib_next.packet.PacketBatch:
+        bounds = numpy.asarray(packets.offsets, dtype=numpy.int64)
+        lengths = numpy.diff(bounds)
+        count = len(lengths)
+        source = numpy.frombuffer(packets.data, dtype=numpy.uint8)
+
+        # Durations are read as `get_nb_samples` does in `payload`
+        if not lengths.all():
+            raise opuslib_next.OpusError(opuslib_next.BAD_ARG)
+        starts = bounds[:-1]
+        tocs = source[starts]
+        samples = numpy.asarray(
+            opuslib_next.packet.TOC_PACKET_SAMPLES,
+            dtype=numpy.int64)[tocs]
+        code3 = numpy.flatnonzero(samples == 0)
+        if len(code3):
+            if (lengths[code3] < 2).any():
+                raise opuslib_next.OpusError(opuslib_next.INVALID_PACKET)
+            samples[code3] = numpy.asarray(
+                opuslib_next.packet.TOC_SAMPLES_PER_FRAME,
+                dtype=numpy.int64)[tocs[code3]] * (
+                    source[starts[code3] + 1] & 0x3F)
+        positions = numpy.zeros(count + 1, dtype=numpy.int64)
+        numpy.cumsum(samples, out=positions[1:])
+
+        dtx = lengths <= opuslib_next.packet.DTX_MAX_BYTES
+        previous = numpy.empty(count, dtype=bool)
+        previous[0] = self._in_dtx
+        previous[1:] = dtx[:-1]
+        markers = (previous & ~dtx).astype(numpy.uint8) << 7
+
+        headers = numpy.zeros(count, dtype=[
+            ('flags', 'u1'), ('type', 'u1'), ('sequence', '>u2'),
+            ('timestamp', '>u4'), ('ssrc', '>u4')])
+        headers['flags'] = 0x80
+        headers['type'] = markers | self.payload_type
+        headers['sequence'] = (
+            self.sequence + numpy.arange(count, dtype=numpy.int64)) & 0xFFFF
+        headers['timestamp'] = (
+            self.timestamp + positions[:-1]) & 0xFFFFFFFF
+        headers['ssrc'] = self.ssrc
+
+        # Scatter headers and payloads into one buffer: datagram `i` starts
+        # at its packet's offset shifted by `i` headers
+        result = numpy.zeros(count + 1, dtype=numpy.uint64)
+        result[1:] = numpy.cumsum(lengths + HEADER_SIZE)
+        data = numpy.empty(int(result[-1]), dtype=numpy.uint8)
+        is_header = numpy.zeros(len(data), dtype=bool)
+        header_bytes = (
+            result[:-1].astype(numpy.int64)[:, None] +
+            numpy.arange(HEADER_SIZE))
+        is_header[header_bytes] = True
+        data[is_header] = headers.view(numpy.uint8)
+        data[~is_header] = source[bounds[0]:bounds[-1]]
+
+        self._in_dtx = bool(dtx[-1])
+        self.sequence = (self.sequence + count) & 0xFFFF
+        self.timestamp = (self.timestamp + int(positions[-1])) & 0xFFFFFFFF
+        return opuslib_next.packet.PacketBatch(
+            bytearray(data.tobytes()), array.array('Q', result.tobytes()))
+
+
+class RtpPacket(object):
+
+    """Header fields and payload of a received RTP datagram."""
+
+    __slots__ = (
+        'payload_type',
+        'marker',
+        'sequence',
+        'extended_sequence',
+        'timestamp',
+        'ssrc',
+        'payload',
+    )
+
+    def __init__(
+            self,
+            payload_type: int,
+            marker: bool,
+            sequence: int,
+            extended_sequence: int,
+            timestamp: int,
+            ssrc: int,
+            payload: memoryview
+    ) -> None:
+        self.payload_type = payload_type
+        self.marker = marker
+        self.sequence = sequence
+        self.extended_sequence = extended_sequence
+        self.timestamp = timestamp
+        self.ssrc = ssrc
+        self.payload = payload
+
+    def __repr__(self) -> str:
+        return (
+            '{}(payload_type={}, marker={}, sequence={}, timestamp={}, '
+            'ssrc={}, size={})'.format(
+                type(self).__name__, self.payload_type, self.marker,
+                self.sequence, self.timestamp, self.ssrc, len(self.payload))
+        )
+
+
+class Depayloader(object):
+
+    """
+    Parses RTP datagrams of one Opus stream.
+
+    Payloads are memoryviews of the datagrams. `extended_sequence` counts
+    sequence number wrap-arounds so that packets can be ordered across them.
+    Invalid datagrams, and those not matching the `ssrc` or `payload_type`
+    filters, are dropped and counted.
+    """
+
+    def __init__(
+            self,
+            ssrc: typing.Optional[int] = None,
+            payload_type: typing.Optional[int] = None
+    ) -> None:
+        """
+        :param ssrc: Only accept datagrams of this source.
+        :param payload_type: Only accept datagrams of this payload type.
+        """
+        self.ssrc = ssrc
+        self.payload_type = payload_type
+        self.received = 0
+        self.invalid = 0
+        self.filtered = 0
+        self._max_sequence = None
+        self._cycles = 0
+
+    def depayload(self, datagram) -> typing.Optional[RtpPacket]:
+        """Parses one datagram, returns None if it is dropped."""
+        view = memoryview(datagram)
+        if view.format != 'B':
+            view = view.cast('B')
+        size = len(view)
+        if size < HEADER_SIZE:
+            self.invalid += 1
+            return None
+
+        flags, second, sequence, timestamp, ssrc = _HEADER.unpack_from(view)
+        if flags >> 6 != RTP_VERSION:
+            self.invalid += 1
+            return None
+
+        start = HEADER_SIZE + 4 * (flags & 0x0F)
+        if flags & 0x10:
+            if start + 4 > size:
+                self.invalid += 1
+                return None
+            start += 4 + 4 * ((view[start + 2] << 8) | view[start + 3])
+        end = size
+        if flags & 0x20:
+            end -= view[-1]
+        if start >= end:
+            self.invalid += 1
+            return None
+
+        payload_type = second & 0x7F
+        if (self.ssrc is not None and ssrc != self.ssrc) or (
+                self.payload_type is not None and
+                payload_type != self.payload_type):
+            self.filtered += 1
+            return None
+
+        self.received += 1
+        return RtpPacket(
+            payload_type, bool(second & 0x80), sequence,
+            self._extend(sequence), timestamp, ssrc, view[start:end])
+
+    def depayload_batch(
+            self,
+            datagrams: typing.Iterable
+    ) -> typing.List[RtpPacket]:
+        """Parses many datagrams, leaving out the dropped ones."""
+        depayload = self.depayload
+        packets = []
+        append = packets.append
+        for datagram in datagrams:
+            packet = depayload(datagram)
+            if packet is not None:
+                append(packet)
+        return packets
+
+    def _extend(self, sequence: int) -> int:
+        highest = self._max_sequence
+        if highest is None:
+            self._max_sequence = sequence
+            return sequence
+
+        if (sequence - highest) & 0xFFFF < 0x8000:
+            # In order or ahead of the highest sequence number seen
+            if sequence < highest:
+                self._cycles += 0x10000
+            self._max_sequence = sequence
+            return self._cycles + sequence
+        # Late packet, possibly from before the last wrap-around
+        if sequence > highest:
+            return self._cycles - 0x10000 + sequence
+        return self._cycles + sequence
@@ -0,0 +1,339 @@
+"""
+Deterministic network impairment and an encode, impair, decode pipeline.
+
+Usage example:
+
+>>> import opuslib_next.sim
+>>> network = opuslib_next.sim.Network(
+...     loss=opuslib_next.sim.GilbertElliottLoss.from_rate(0.05, 3, seed=1),
+...     delay=2400, jitter=1920, seed=2)
+>>> result = opuslib_next.sim.simulate(pcm, network, inband_fec=True)
+>>> result.concealed_ratio, result.recovered, result.receive_cpu_per_frame
+
+Loss, jitter and reordering are drawn from seeded generators, so the same
+settings impair a stream the same way on every run. Times are in samples at
+48 kHz, the RTP clock of Opus. The pipeline runs the packets through
+`opuslib_next.rtp` and an `opuslib_next.jitter.JitterBuffer`, and measures
+the CPU time of the sending and receiving sides separately.
+"""
+
+import random
+import time
+import typing
+
+import opuslib_next
+import opuslib_next.framing
+import opuslib_next.jitter
+import opuslib_next.rtp
+
+
+class BernoulliLoss(object):
+
+    """Loses each packet independently with probability `rate`."""
+
+    def __init__(self, rate: float, seed: typing.Optional[int] = None) -> None:
+        if not 0 <= rate <= 1:
+            raise ValueError('`rate` must be between 0 and 1')
+        self.rate = rate
+        self._random = random.Random(seed).random
+
+    def lost(self) -> bool:
+        """Draws the fate of the next packet."""
+        return self._random() < self.rate
+
+
+class GilbertElliottLoss(object):
+
+    """
+    Two-state Markov loss model producing bursts.
+
+    In the good state packets are lost with probability `loss_good`, in the
+    bad state with `loss_bad`. The model moves from good to bad with
+    probability `p` and back with probability `r` after each packet.
+    """
+
+    def __init__(
+            self,
+            p: float,
+            r: float,
+            loss_good: float = 0.0,
+            loss_bad: float = 1.0,
+            seed: typing.Optional[int] = None
+    ) -> None:
+        for value in (p, r, loss_good, loss_bad):
+            if not 0 <= value <= 1:
+                raise ValueError('Probabilities must be between 0 and 1')
+        self.p = p
+        self.r = r
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+        self._random = random.Random(seed).random
+
+    @classmethod
+    def from_rate(
+            cls,
+            rate: float,
+            burst_length: float,
+            seed: typing.Optional[int] = None
+    ) -> 'GilbertElliottLoss':
+        """
+        Returns the model losing `rate` of the packets in bursts of
+        `burst_length` packets on average.
+        """
+        if not 0 <= rate < 1 or burst_length < 1:
+            raise ValueError(
+                '`rate` must be in [0, 1) and `burst_length` at least 1')
+        r = 1 / burst_length
+        return cls(min(rate * r / (1 - rate), 1.0), r, seed=seed)
+
+    @property
+    def rate(self) -> float:
+        """Long-run fraction of lost packets."""
+        if not self.p + self.r:
+            return self.loss_bad if self.bad else self.loss_good
+        bad = self.p / (self.p + self.r)
+        return bad * self.loss_bad + (1 - bad) * self.loss_good
+
+    def lost(self) -> bool:
+        """Draws the fate of the next packet."""
+        draw = self._random
+        lost = draw() < (self.loss_bad if self.bad else self.loss_good)
+        if self.bad:
+            self.bad = draw() >= self.r
+        else:
+            self.bad = draw() < self.p
+        return lost
+
+
+class Network(object):
+
+    """
+    Impairs a packet stream with loss, a base delay, jitter and reordering.
+
+    Each packet that is not lost arrives after `delay` plus a uniform draw
+    of up to `jitter` samples. A fraction `reorder` of the packets is held
+    back a further `reorder_delay` samples.
+    """
+
+    def __init__(
+            self,
+            loss=None,
+            delay: int = 0,
+            jitter: int = 0,
+            reorder: float = 0.0,
+            reorder_delay: int = 1920,
+            seed: typing.Optional[int] = None
+    ) -> None:
+        """
+        :param loss: Loss model with a `lost()` method, or None.
+        :param delay: Base one-way delay.
+        :param jitter: Largest delay added on top of `delay`.
+        :param reorder: Fraction of packets held back.
+        :param reorder_delay: Extra delay of held back packets.
+        """
+        if delay < 0 or jitter < 0 or reorder_delay < 0:
+            raise ValueError('Delays must not be negative')
+        if not 0 <= reorder <= 1:
+            raise ValueError('`reorder` must be between 0 and 1')
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self._random = random.Random(seed)
+
+    def transmit(
+            self,
+            send_times: typing.Iterable[int]
+    ) -> typing.List[typing.Tuple[int, int]]:
+        """
+        Returns the (arrival time, index) of each packet that gets through,
+        in order of arrival.
+        """
+        draw = self._random.random
+        lost = None if self.loss is None else self.loss.lost
+        arrivals = []
+        for index, sent in enumerate(send_times):
+            if lost is not None and lost():
+                continue
+            arrival = sent + self.delay
+            if self.jitter:
+                arrival += int(draw() * (self.jitter + 1))
+            if self.reorder and draw() < self.reorder:
+                arrival += self.reorder_delay
+            arrivals.append((arrival, index))
+        arrivals.sort()
+        return arrivals
+
+
+class SimulationResult(object):
+
+    """
+    Counters and CPU times of one simulated stream, of `frames` frames of
+    `duration` samples at 48 kHz.
+    """
+
+    __slots__ = (
+        'frames',
+        'duration',
+        'bytes',
+        'network_lost',
+        'late',
+        'lost',
+        'recovered',
+        'concealed',
+        'comfort_noise',
+        'expanded',
+        'dropped',
+        'ticks',
+        'send_cpu',
+        'receive_cpu',
+        'pcm',
+    )
+
+    def __init__(self, **values) -> None:
+        for name in self.__slots__:
+            setattr(self, name, values.get(name, 0))
+
+    def __repr__(self) -> str:
+        return (
+            '{}(frames={}, network_lost={}, recovered={}, concealed={}, '
+            'send_cpu={:.6f}, receive_cpu={:.6f})'.format(
+                type(self).__name__, self.frames, self.network_lost,
+                self.recovered, self.concealed, self.send_cpu,
+                self.receive_cpu)
+        )
+
+    @property
+    def bitrate(self) -> float:
+        """Average payload bitrate, in bits per second."""
+        samples = self.frames * self.duration
+        return self.bytes * 8 * 48000 / samples if samples else 0.0
+
+    @property
+    def concealed_ratio(self) -> float:
+        """
+        Fraction of playout ticks filled by loss concealment, not counting
+        the frames concealed to raise the delay.
+        """
+        return self.concealed / self.ticks if self.ticks else 0.0
+
+    @property
+    def send_cpu_per_frame(self) -> float:
+        """Encoding and packetization CPU time per frame, in seconds."""
+        return self.send_cpu / self.frames if self.frames else 0.0
+
+    @property
+    def receive_cpu_per_frame(self) -> float:
+        """Reception, buffering and decoding CPU time per frame, in seconds."""
+        return self.receive_cpu / self.frames if self.frames else 0.0
+
+
+def simulate(
+        pcm_data: bytes,
+        network: Network,
+        fs: int = 48000,
+        channels: int = 1,
+        application=opuslib_next.APPLICATION_VOIP,
+        bitrate: typing.Optional[int] = None,
+        inband_fec: bool = False,
+        packet_loss_perc: typing.Optional[int] = None,
+        buffer_options: typing.Optional[dict] = None,
+        keep_pcm: bool = False,
+        frame_duration: int = 960
+) -> SimulationResult:
+    """
+    Encodes 16-bit PCM in frames of `frame_duration`, sends it through
+    `network` and plays it out through a jitter buffer.
+
+    :param pcm_data: Interleaved 16-bit PCM.
+    :param network: Impairments applied to the packets.
+    :param bitrate: Encoder bitrate, the libopus default if omitted.
+    :param inband_fec: Whether the encoder adds in-band FEC.
+    :param packet_loss_perc: Expected loss the encoder plans FEC for,
+        derived from the network's loss model if omitted.
+    :param buffer_options: Keyword arguments of the `JitterBuffer`.
+    :param keep_pcm: Whether to keep the decoded PCM in the result.
+    :param frame_duration: Frame duration, in samples at 48 kHz.
+    """
+    if frame_duration not in [
+            duration for duration, _ in opuslib_next.framing.FRAME_DURATIONS]:
+        raise ValueError(
+            '`frame_duration` must be an Opus frame duration, 2.5 ms to '
+            '120 ms')
+    duration = frame_duration
+    frame_size = duration * fs // 48000
+    frame_bytes = 2 * channels * frame_size
+
+    encoder = opuslib_next.Encoder(fs, channels, application)
+    if bitrate is not None:
+        encoder.bitrate = bitrate
+    encoder.inband_fec = int(inband_fec)
+    if packet_loss_perc is None:
+        packet_loss_perc = int(100 * getattr(network.loss, 'rate', 0) + 0.5)
+    encoder.packet_loss_perc = packet_loss_perc
+    payloader = opuslib_next.rtp.Payloader(sequence=0, timestamp=0)
+
+    # Sending side
+    start = time.thread_time()
+    datagrams = [
+        bytes(payloader.payload(
+            encoder.encode(pcm_data[offset:offset + frame_bytes], frame_size),
+            duration))
+        for offset in range(
+            0, len(pcm_data) - frame_bytes + 1, frame_bytes)]
+    send_cpu = time.thread_time() - start
+
+    frames = len(datagrams)
+    arrivals = network.transmit(
+        index * duration for index in range(frames))
+
+    # Receiving side, ticking until the whole stream has been played out
+    depayloader = opuslib_next.rtp.Depayloader()
+    buffer = opuslib_next.jitter.JitterBuffer(
+        opuslib_next.Decoder(fs, channels),
+        **dict({'frame_size': duration}, **(buffer_options or {})))
+    stream_end = frames * duration
+    # Bound on the playout clock, should the stream never start
+    end = stream_end + network.delay + network.jitter + \
+        network.reorder_delay + buffer.max_delay
+    output = [] if keep_pcm else None
+    clock = 0
+    ticks = 0
+    position = 0
+    count = len(arrivals)
+    start = time.thread_time()
+    while clock < end and (
+            buffer.position is None or buffer.position < stream_end):
+        while position < count and arrivals[position][0] <= clock:
+            packet = depayloader.depayload(
+                datagrams[arrivals[position][1]])
+            if packet is not None:
+                buffer.put_rtp(packet)
+            position += 1
+        pcm = buffer.get()
+        if output is not None:
+            output.append(pcm)
+        clock += len(pcm) // (2 * channels) * 48000 // fs
+        ticks += 1
+    receive_cpu = time.thread_time() - start
+
+    return SimulationResult(
+        frames=frames,
+        duration=duration,
+        bytes=sum(len(datagram) for datagram in datagrams) -
+        frames * opuslib_next.rtp.HEADER_SIZE,
+        network_lost=frames - count,
+        late=buffer.late,
+        lost=buffer.lost,
+        recovered=buffer.recovered,
+        concealed=buffer.concealed,
+        comfort_noise=buffer.comfort_noise,
+        expanded=buffer.expanded,
+        dropped=buffer.dropped,
+        ticks=ticks,
+        send_cpu=send_cpu,
+        receive_cpu=receive_cpu,
+        pcm=b''.join(output) if output is not None else None,
+    )
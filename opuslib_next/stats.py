@@ -0,0 +1,199 @@
+"""
+Per-stream packet statistics computed from TOC bytes only.
+
+Usage example:
+
+>>> import opuslib_next.stats
+>>> stats = opuslib_next.stats.PacketStats()
+>>> for packet in forwarded:
+...     stats.add(packet)
+>>> stats.bitrate
+24000.0
+
+All counters live in one fixed-size ``array('Q')`` per accumulator and
+`add` only indexes precomputed tables, so feeding a packet allocates no
+Python objects beyond the integers involved.
+"""
+
+import array
+import typing
+
+import opuslib_next
+import opuslib_next.packet
+
+
+MODES = (
+    opuslib_next.packet.MODE_SILK_ONLY,
+    opuslib_next.packet.MODE_HYBRID,
+    opuslib_next.packet.MODE_CELT_ONLY,
+)
+
+BANDWIDTHS = (
+    opuslib_next.BANDWIDTH_NARROWBAND,
+    opuslib_next.BANDWIDTH_MEDIUMBAND,
+    opuslib_next.BANDWIDTH_WIDEBAND,
+    opuslib_next.BANDWIDTH_SUPERWIDEBAND,
+    opuslib_next.BANDWIDTH_FULLBAND,
+)
+
+# Frame durations in samples at 48 kHz
+FRAME_SIZES = (120, 240, 480, 960, 1920, 2880)
+
+# Size histogram bins: bin `i` counts packets of `2 ** (i - 1)` up to
+# `2 ** i - 1` bytes, bin 0 counts empty packets
+SIZE_BINS = 17
+
+# Counter layout
+_PACKETS = 0
+_BYTES = 1
+_SAMPLES = 2
+_STEREO = 3
+_DTX = 4
+_EMPTY = 5
+_MODE = 6
+_BANDWIDTH = _MODE + len(MODES)
+_FRAME_SIZE = _BANDWIDTH + len(BANDWIDTHS)
+_SIZE = _FRAME_SIZE + len(FRAME_SIZES)
+_COUNTERS = _SIZE + SIZE_BINS
+
+_TOC_MODE_INDEX = tuple(
+    _MODE + MODES.index(mode) for mode in opuslib_next.packet.TOC_MODE)
+_TOC_BANDWIDTH_INDEX = tuple(
+    _BANDWIDTH + BANDWIDTHS.index(bandwidth)
+    for bandwidth in opuslib_next.packet.TOC_BANDWIDTH)
+_TOC_FRAME_SIZE_INDEX = tuple(
+    _FRAME_SIZE + FRAME_SIZES.index(size)
+    for size in opuslib_next.packet.TOC_SAMPLES_PER_FRAME)
+
+
+class PacketStats(object):
+
+    """Accumulates codec telemetry of a packet stream without decoding."""
+
+    __slots__ = ('counters',)
+
+    def __init__(self) -> None:
+        self.counters = array.array('Q', bytes(8 * _COUNTERS))
+
+    def add(self, packet) -> None:
+        """Accounts one packet."""
+        counters = self.counters
+        length = len(packet)
+        counters[_PACKETS] += 1
+        counters[_BYTES] += length
+        counters[_SIZE + min(length.bit_length(), SIZE_BINS - 1)] += 1
+        if not length:
+            counters[_EMPTY] += 1
+            return
+
+        toc = packet[0]
+        samples = opuslib_next.packet.TOC_PACKET_SAMPLES[toc]
+        if not samples and length > 1:
+            samples = opuslib_next.packet.TOC_SAMPLES_PER_FRAME[toc] * \
+                (packet[1] & 0x3F)
+        counters[_SAMPLES] += samples
+        counters[_TOC_MODE_INDEX[toc]] += 1
+        counters[_TOC_BANDWIDTH_INDEX[toc]] += 1
+        counters[_TOC_FRAME_SIZE_INDEX[toc]] += 1
+        if toc & 0x4:
+            counters[_STEREO] += 1
+        if length <= opuslib_next.packet.DTX_MAX_BYTES:
+            counters[_DTX] += 1
+
+    def add_batch(self, batch: opuslib_next.packet.PacketBatch) -> None:
+        """Accounts every packet of a `PacketBatch`."""
+        data = memoryview(batch.data)
+        if data.format != 'B':
+            data = data.cast('B')
+        offsets = batch.offsets
+        add = self.add
+        for index in range(len(offsets) - 1):
+            add(data[offsets[index]:offsets[index + 1]])
+
+    def reset(self) -> None:
+        """Zeroes all counters."""
+        counters = self.counters
+        for index in range(_COUNTERS):
+            counters[index] = 0
+
+    def snapshot(self) -> 'PacketStats':
+        """Returns an independent copy of the current counters."""
+        copy = PacketStats.__new__(PacketStats)
+        copy.counters = array.array('Q', self.counters)
+        return copy
+
+    @property
+    def packets(self) -> int:
+        """Number of packets accounted."""
+        return self.counters[_PACKETS]
+
+    @property
+    def bytes(self) -> int:
+        """Total size of the packets in bytes."""
+        return self.counters[_BYTES]
+
+    @property
+    def samples(self) -> int:
+        """Total duration in samples at 48 kHz."""
+        return self.counters[_SAMPLES]
+
+    @property
+    def duration(self) -> float:
+        """Total duration in seconds."""
+        return self.counters[_SAMPLES] / 48000.0
+
+    @property
+    def stereo_packets(self) -> int:
+        """Number of packets coded in stereo."""
+        return self.counters[_STEREO]
+
+    @property
+    def dtx_packets(self) -> int:
+        """
+        Number of DTX/silence packets, of at most
+        `opuslib_next.packet.DTX_MAX_BYTES` bytes.
+        """
+        return self.counters[_DTX]
+
+    @property
+    def empty_packets(self) -> int:
+        """Number of zero-length packets."""
+        return self.counters[_EMPTY]
+
+    @property
+    def bitrate(self) -> float:
+        """Average bitrate in bits per second over all packets."""
+        return self.bitrate_since(None)
+
+    def bitrate_since(self, previous: typing.Optional['PacketStats']) -> float:
+        """
+        Bitrate in bits per second since the `previous` snapshot.
+        """
+        counters = self.counters
+        nbytes = counters[_BYTES]
+        samples = counters[_SAMPLES]
+        if previous is not None:
+            nbytes -= previous.counters[_BYTES]
+            samples -= previous.counters[_SAMPLES]
+        if not samples:
+            return 0.0
+        return nbytes * 8 * 48000.0 / samples
+
+    def as_dict(self) -> dict:
+        """Returns the counters as a plain dictionary."""
+        counters = self.counters
+        return {
+            'packets': counters[_PACKETS],
+            'bytes': counters[_BYTES],
+            'samples': counters[_SAMPLES],
+            'stereo': counters[_STEREO],
+            'dtx': counters[_DTX],
+            'empty': counters[_EMPTY],
+            'bitrate': self.bitrate,
+            'modes': dict(zip(MODES, counters[_MODE:_BANDWIDTH])),
+            'bandwidths': dict(
+                zip(BANDWIDTHS, counters[_BANDWIDTH:_FRAME_SIZE])),
+            'frame_sizes': dict(
+                zip(FRAME_SIZES, counters[_FRAME_SIZE:_SIZE])),
+            'sizes': counters[_SIZE:_COUNTERS].tolist(),
+        }
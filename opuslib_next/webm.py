@@ -0,0 +1,800 @@
+"""
+Minimal Matroska/WebM support for Opus audio.
+
+Usage example:
+
+>>> import opuslib_next
+>>> import opuslib_next.webm
+>>> encoder = opuslib_next.Encoder(48000, 2, 'audio')
+>>> with open('out.webm', 'wb') as fileobj:
+...     with opuslib_next.webm.WebMWriter(fileobj, encoder=encoder) as webm:
+...         for pcm in frames:
+...             webm.write_packet(encoder.encode(pcm, 960))
+>>> with opuslib_next.webm.WebMReader('out.webm') as webm:
+...     decoder = webm.decoder()
+...     for packet, timestamp, discard_padding in webm:
+...         pcm = decoder.decode(bytes(packet), 960)
+
+Only the elements needed for a single Opus track are handled: blocks of
+other tracks are skipped. The reader maps the file into memory and hands
+out packets as views of the mapping; unknown-size segments and clusters,
+as written by browsers, are supported. The writer buffers one cluster at
+a time and, on seekable files, fills in the segment size, duration,
+SeekHead and Cues on `close`.
+"""
+
+import mmap
+import os
+import random
+import struct
+import typing
+
+import opuslib_next
+import opuslib_next.api.info
+import opuslib_next.classes
+import opuslib_next.ogg
+import opuslib_next.packet
+
+
+CODEC_ID = b'A_OPUS'
+
+# Element IDs, marker bits included
+EBML = 0x1A45DFA3
+EBML_VERSION = 0x4286
+EBML_READ_VERSION = 0x42F7
+EBML_MAX_ID_LENGTH = 0x42F2
+EBML_MAX_SIZE_LENGTH = 0x42F3
+DOC_TYPE = 0x4282
+DOC_TYPE_VERSION = 0x4287
+DOC_TYPE_READ_VERSION = 0x4285
+VOID = 0xEC
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+MUXING_APP = 0x4D80
+WRITING_APP = 0x5741
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+TRACK_UID = 0x73C5
+TRACK_TYPE = 0x83
+CODEC_ID_ELEMENT = 0x86
+CODEC_PRIVATE = 0x63A2
+CODEC_DELAY = 0x56AA
+SEEK_PRE_ROLL = 0x56BB
+AUDIO = 0xE1
+SAMPLING_FREQUENCY = 0xB5
+CHANNELS = 0x9F
+CLUSTER = 0x1F43B675
+TIMECODE = 0xE7
+SIMPLE_BLOCK = 0xA3
+BLOCK_GROUP = 0xA0
+BLOCK = 0xA1
+DISCARD_PADDING = 0x75A2
+CUES = 0x1C53BB6B
+CUE_POINT = 0xBB
+CUE_TIME = 0xB3
+CUE_TRACK_POSITIONS = 0xB7
+CUE_TRACK = 0xF7
+CUE_CLUSTER_POSITION = 0xF1
+TAGS = 0x1254C367
+CHAPTERS = 0x1043A770
+ATTACHMENTS = 0x1941A469
+
+TRACK_TYPE_AUDIO = 2
+
+# Top-level elements of a segment, which end an unknown-size cluster
+_SEGMENT_CHILDREN = frozenset((
+    SEEK_HEAD, INFO, TRACKS, CLUSTER, CUES, TAGS, CHAPTERS, ATTACHMENTS))
+
+DEFAULT_TIMECODE_SCALE = 1000000
+
+# Decoder pre-roll after a seek, 80 ms in nanoseconds
+SEEK_PREROLL = 80000000
+
+# Default cluster length in milliseconds, block timecodes are relative
+# 16-bit offsets so clusters cannot exceed 32 seconds
+DEFAULT_CLUSTER_DURATION = 5000
+MAX_CLUSTER_DURATION = 32767
+
+# Block lacing modes
+LACING_NONE = 0
+LACING_XIPH = 1
+LACING_FIXED = 2
+LACING_EBML = 3
+
+_UNKNOWN_SIZE = (1 << 56) - 1
+_SEEK_HEAD_RESERVED = 96
+
+
+def _read_vint(view, offset: int) -> typing.Tuple[int, int, bool]:
+    """Returns the value, length and unknown flag of an EBML integer."""
+    first = view[offset]
+    if not first:
+        raise ValueError(
+            'invalid EBML variable size integer at {}'.format(offset))
+    length = 9 - first.bit_length()
+    value = first & (0xFF >> length)
+    for index in range(offset + 1, offset + length):
+        value = (value << 8) | view[index]
+    return value, length, value == (1 << (7 * length)) - 1
+
+
+def _read_id(view, offset: int) -> typing.Tuple[int, int]:
+    first = view[offset]
+    if not first:
+        raise ValueError('invalid EBML element ID at {}'.format(offset))
+    length = 9 - first.bit_length()
+    if length > 4:
+        raise ValueError('invalid EBML element ID at {}'.format(offset))
+    return int.from_bytes(view[offset:offset + length], 'big'), length
+
+
+def _read_element(
+        view,
+        offset: int
+) -> typing.Tuple[int, int, typing.Optional[int]]:
+    """Returns the ID, data offset and data size (None if unknown)."""
+    element_id, id_length = _read_id(view, offset)
+    size, size_length, unknown = _read_vint(view, offset + id_length)
+    return element_id, offset + id_length + size_length, \
+        None if unknown else size
+
+
+def _read_uint(view, start: int, end: int) -> int:
+    return int.from_bytes(view[start:end], 'big')
+
+
+def _children(
+        view,
+        start: int,
+        end: int
+) -> typing.Iterator[typing.Tuple[int, int, int, int]]:
+    """Yields ID, element offset, data offset and data end of children."""
+    while start < end:
+        element_id, data, size = _read_element(view, start)
+        stop = end if size is None else data + size
+        yield element_id, start, data, stop
+        start = stop
+
+
+def _encode_id(element_id: int) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+
+
+def _encode_size(size: int, length: typing.Optional[int] = None) -> bytes:
+    if length is None:
+        length = 1
+        while size >= (1 << (7 * length)) - 1:
+            length += 1
+    return ((1 << (7 * length)) | size).to_bytes(length, 'big')
+
+
+def _element(element_id: int, payload: bytes) -> bytes:
+    return _encode_id(element_id) + _encode_size(len(payload)) + payload
+
+
+def _uint_element(element_id: int, value: int) -> bytes:
+    return _element(
+        element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8),
+                                   'big'))
+
+
+def _int_element(element_id: int, value: int) -> bytes:
+    return _element(
+        element_id, value.to_bytes((value.bit_length() + 8) // 8 or 1,
+                                   'big', signed=True))
+
+
+def _float_element(element_id: int, value: float) -> bytes:
+    return _element(element_id, struct.pack('>d', value))
+
+
+def _void(size: int) -> bytes:
+    """Returns a Void element occupying exactly `size` bytes."""
+    return _encode_id(VOID) + _encode_size(size - 9, 8) + bytes(size - 9)
+
+
+class WebMReader(object):
+
+    """
+    Memory-mapped WebM/Matroska demuxer for one Opus track.
+
+    Packets are returned as memoryview slices of the mapping and stay valid
+    until `close` is called.
+    """
+
+    def __init__(
+            self,
+            path: typing.Union[str, os.PathLike],
+            track: typing.Optional[int] = None
+    ) -> None:
+        """
+        :param path: Path of the WebM or Matroska file.
+        :param track: Track number to read. Defaults to the first Opus
+            track.
+        """
+        with open(path, 'rb') as fileobj:
+            self._mmap = mmap.mmap(
+                fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        self.track = track
+        self.timecode_scale = DEFAULT_TIMECODE_SCALE
+        self.codec_delay = 0
+        self.seek_preroll = 0
+        self.head = None
+        self.cues = []
+        self._cue_points = []
+        try:
+            self._read_headers()
+        except BaseException:
+            self.close()
+            raise
+
+    def _read_headers(self) -> None:
+        view = self._view
+        size = len(view)
+        if size < 4 or _read_id(view, 0)[0] != EBML:
+            raise ValueError('not an EBML file')
+
+        element_id, data, length = _read_element(view, 0)
+        for child, _, start, end in _children(view, data, data + length):
+            if child == DOC_TYPE:
+                doc_type = bytes(view[start:end]).rstrip(b'\x00')
+                if doc_type not in (b'webm', b'matroska'):
+                    raise ValueError(
+                        'unsupported document type {!r}'.format(doc_type))
+
+        element_id, data, length = _read_element(view, data + length)
+        if element_id != SEGMENT:
+            raise ValueError('missing Matroska segment')
+        self._segment_start = data
+        self._segment_end = size if length is None else min(
+            data + length, size)
+
+        cues_position = None
+        self._first_cluster = self._segment_end
+        for child, offset, start, end in _children(
+                view, data, self._segment_end):
+            if child == CLUSTER:
+                self._first_cluster = offset
+                break
+            elif child == INFO:
+                self._read_info(start, end)
+            elif child == TRACKS:
+                self._read_tracks(start, end)
+            elif child == SEEK_HEAD:
+                cues_position = self._read_seek_head(start, end)
+            elif child == CUES:
+                self._read_cues(start, end)
+
+        if self.head is None:
+            raise ValueError('no Opus track found')
+        if not self._cue_points and cues_position is not None:
+            offset = self._segment_start + cues_position
+            if offset < size:
+                child, start, length = _read_element(view, offset)
+                if child == CUES and length is not None:
+                    self._read_cues(start, start + length)
+        self._select_cues()
+
+    def _read_info(self, start: int, end: int) -> None:
+        for child, _, data, stop in _children(self._view, start, end):
+            if child == TIMECODE_SCALE:
+                self.timecode_scale = _read_uint(self._view, data, stop)
+
+    def _read_tracks(self, start: int, end: int) -> None:
+        view = self._view
+        for child, _, entry_start, entry_end in _children(view, start, end):
+            if child != TRACK_ENTRY:
+                continue
+            number = codec = private = None
+            delay = preroll = 0
+            channels = 1
+            for field, _, data, stop in _children(view, entry_start, entry_end):
+                if field == TRACK_NUMBER:
+                    number = _read_uint(view, data, stop)
+                elif field == CODEC_ID_ELEMENT:
+                    codec = bytes(view[data:stop]).rstrip(b'\x00')
+                elif field == CODEC_PRIVATE:
+                    private = bytes(view[data:stop])
+                elif field == CODEC_DELAY:
+                    delay = _read_uint(view, data, stop)
+                elif field == SEEK_PRE_ROLL:
+                    preroll = _read_uint(view, data, stop)
+                elif field == AUDIO:
+                    for setting, _, value, value_end in _children(
+                            view, data, stop):
+                        if setting == CHANNELS:
+                            channels = _read_uint(view, value, value_end)
+
+            if codec != CODEC_ID or self.head is not None:
+                continue
+            if self.track is not None and number != self.track:
+                continue
+            self.track = number
+            self.codec_delay = delay
+            self.seek_preroll = preroll
+            if private:
+                self.head = opuslib_next.ogg.OpusHead.from_bytes(private)
+            else:
+                self.head = opuslib_next.ogg.OpusHead(
+                    channels, delay * 48000 // 1000000000)
+
+    def _read_seek_head(
+            self,
+            start: int,
+            end: int
+    ) -> typing.Optional[int]:
+        view = self._view
+        for child, _, seek_start, seek_end in _children(view, start, end):
+            if child != SEEK:
+                continue
+            target = position = None
+            for field, _, data, stop in _children(view, seek_start, seek_end):
+                if field == SEEK_ID:
+                    target = _read_uint(view, data, stop)
+                elif field == SEEK_POSITION:
+                    position = _read_uint(view, data, stop)
+            if target == CUES:
+                return position
+        return None
+
+    def _read_cues(self, start: int, end: int) -> None:
+        # Cues may precede the Tracks, the points are filtered by track
+        # once it is known
+        view = self._view
+        points = []
+        for child, _, point_start, point_end in _children(view, start, end):
+            if child != CUE_POINT:
+                continue
+            time = None
+            positions = []
+            for field, _, data, stop in _children(
+                    view, point_start, point_end):
+                if field == CUE_TIME:
+                    time = _read_uint(view, data, stop)
+                elif field == CUE_TRACK_POSITIONS:
+                    track = position = None
+                    for entry, _, value, value_end in _children(
+                            view, data, stop):
+                        if entry == CUE_TRACK:
+                            track = _read_uint(view, value, value_end)
+                        elif entry == CUE_CLUSTER_POSITION:
+                            position = _read_uint(view, value, value_end)
+                    if position is not None:
+                        positions.append((track, position))
+            if time is not None:
+                points.append((time, positions))
+        self._cue_points = points
+
+    def _select_cues(self) -> None:
+        """Keeps the cue positions of the Opus track."""
+        cues = []
+        for time, positions in self._cue_points:
+            for track, position in positions:
+                if track == self.track:
+                    cues.append((
+                        time * self.timecode_scale,
+                        self._segment_start + position))
+                    break
+        cues.sort()
+        self.cues = cues
+
+    def __enter__(self) -> 'WebMReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self) -> typing.Iterator[typing.Tuple[memoryview, int, int]]:
+        return self.packets()
+
+    def close(self) -> None:
+        """
+        Unmaps the file. Packet views handed out must be released first,
+        otherwise the mapping is only freed once they are garbage collected.
+        """
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+
+    @property
+    def channels(self) -> int:
+        """Number of output channels."""
+        return self.head.channels
+
+    @property
+    def pre_skip(self) -> int:
+        """Samples at 48 kHz to discard from the decoder output."""
+        if self.codec_delay:
+            return (self.codec_delay * 48000 + 500000000) // 1000000000
+        return self.head.pre_skip
+
+    def decoder(self, fs: int = 48000):
+        """
+        Creates a decoder matching the track's channel mapping: a `Decoder`
+        for mapping family 0 and a `MultiStreamDecoder` otherwise.
+        """
+        head = self.head
+        if head.mapping_family == 0:
+            return opuslib_next.classes.Decoder(fs, head.channels)
+        return opuslib_next.classes.MultiStreamDecoder(
+            fs, head.channels, head.streams, head.coupled_streams,
+            head.mapping)
+
+    def seek(self, timestamp: int) -> int:
+        """
+        Returns the offset of the cluster to start decoding at to output
+        `timestamp` (in nanoseconds), allowing for the track's seek pre-roll.
+        Uses the Cues; without them decoding starts at the first cluster.
+        """
+        target = timestamp - (self.seek_preroll or SEEK_PREROLL)
+        offset = self._first_cluster
+        for time, position in self.cues:
+            if time > target:
+                break
+            offset = position
+        return offset
+
+    def packets(
+            self,
+            offset: typing.Optional[int] = None
+    ) -> typing.Iterator[typing.Tuple[memoryview, int, int]]:
+        """
+        Yields ``(packet, timestamp, discard_padding)`` for every packet of
+        the track. `timestamp` is the start of the packet and
+        `discard_padding` the duration to drop from its end, both in
+        nanoseconds.
+
+        :param offset: Offset of the cluster to start at, as returned by
+            `seek`. Defaults to the first cluster.
+        """
+        view = self._view
+        end = self._segment_end
+        if offset is None:
+            offset = self._first_cluster
+        while offset < end:
+            element_id, data, size = _read_element(view, offset)
+            if element_id != CLUSTER:
+                if size is None:
+                    return
+                offset = data + size
+                continue
+            cluster_end = end if size is None else data + size
+            offset = yield from self._cluster_packets(
+                data, cluster_end, size is None)
+
+    def _cluster_packets(self, start: int, end: int, unknown: bool):
+        view = self._view
+        scale = self.timecode_scale
+        cluster_time = 0
+        while start < end:
+            element_id, data, size = _read_element(view, start)
+            if unknown and element_id in _SEGMENT_CHILDREN:
+                return start
+            stop = end if size is None else data + size
+            if element_id == TIMECODE:
+                cluster_time = _read_uint(view, data, stop)
+            elif element_id == SIMPLE_BLOCK:
+                yield from self._block_packets(
+                    data, stop, cluster_time, scale, 0)
+            elif element_id == BLOCK_GROUP:
+                block = None
+                discard_padding = 0
+                for child, _, child_start, child_end in _children(
+                        view, data, stop):
+                    if child == BLOCK:
+                        block = (child_start, child_end)
+                    elif child == DISCARD_PADDING:
+                        discard_padding = int.from_bytes(
+                            view[child_start:child_end], 'big', signed=True)
+                if block is not None:
+                    yield from self._block_packets(
+                        block[0], block[1], cluster_time, scale,
+                        discard_padding)
+            start = stop
+        return end
+
+    def _block_packets(
+            self,
+            start: int,
+            end: int,
+            cluster_time: int,
+            scale: int,
+            discard_padding: int
+    ):
+        view = self._view
+        track, length, _ = _read_vint(view, start)
+        if track != self.track:
+            return
+        position = start + length
+        timestamp = (cluster_time + int.from_bytes(
+            view[position:position + 2], 'big', signed=True)) * scale
+        lacing = (view[position + 2] >> 1) & 0x3
+        position += 3
+
+        if lacing == LACING_NONE:
+            yield view[position:end], timestamp, discard_padding
+            return
+
+        count = view[position] + 1
+        position += 1
+        sizes = []
+        if lacing == LACING_XIPH:
+            for _ in range(count - 1):
+                size = 0
+                while True:
+                    value = view[position]
+                    position += 1
+                    size += value
+                    if value != 255:
+                        break
+                sizes.append(size)
+        elif lacing == LACING_EBML:
+            size, length, _ = _read_vint(view, position)
+            position += length
+            sizes.append(size)
+            for _ in range(count - 2):
+                delta, length, _ = _read_vint(view, position)
+                position += length
+                # Signed difference to the previous size
+                size += delta - ((1 << (7 * length - 1)) - 1)
+                sizes.append(size)
+        else:
+            if (end - position) % count:
+                raise ValueError('invalid fixed-size lacing')
+            sizes = [(end - position) // count] * (count - 1)
+        sizes.append(end - position - sum(sizes))
+
+        for index, size in enumerate(sizes):
+            packet = view[position:position + size]
+            position += size
+            yield packet, timestamp, \
+                discard_padding if index == count - 1 else 0
+            try:
+                timestamp += opuslib_next.packet.get_nb_samples(
+                    packet) * 1000000000 // 48000
+            except opuslib_next.OpusError:
+                pass
+
+
+class WebMWriter(object):
+
+    """Muxes Opus packets into a WebM file with one audio track."""
+
+    def __init__(
+            self,
+            fileobj: typing.BinaryIO,
+            channels: typing.Optional[int] = None,
+            encoder=None,
+            pre_skip: typing.Optional[int] = None,
+            input_sample_rate: typing.Optional[int] = None,
+            output_gain: int = 0,
+            mapping_family: typing.Optional[int] = None,
+            streams: typing.Optional[int] = None,
+            coupled_streams: typing.Optional[int] = None,
+            mapping: typing.Optional[typing.Sequence[int]] = None,
+            cluster_duration: int = DEFAULT_CLUSTER_DURATION,
+            writing_app: typing.Optional[str] = None
+    ) -> None:
+        """
+        :param fileobj: Binary file object the file is written to. The
+            header fields only known at the end are filled in if it is
+            seekable.
+        :param channels: Number of channels. Taken from `encoder` if omitted.
+        :param encoder: `Encoder` or `MultiStreamEncoder` producing the
+            packets, see `opuslib_next.ogg.opus_head`.
+        :param cluster_duration: Milliseconds after which a new cluster, and
+            cue point, is started.
+        """
+        if not 0 < cluster_duration <= MAX_CLUSTER_DURATION:
+            raise ValueError(
+                '`cluster_duration` must be between 1 and {}'.format(
+                    MAX_CLUSTER_DURATION))
+
+        self.head = opuslib_next.ogg.opus_head(
+            channels, encoder, pre_skip, input_sample_rate, output_gain,
+            mapping_family, streams, coupled_streams, mapping)
+        self._fileobj = fileobj
+        self._cluster_duration = cluster_duration
+        self._seekable = getattr(fileobj, 'seekable', lambda: False)()
+        self._start = fileobj.tell() if self._seekable else 0
+        self._written = 0
+        self._cluster = bytearray()
+        self._cluster_time = None
+        self._pending = None
+        self._granule = 0
+        # Valid samples after end trimming, set by `close`
+        self._samples = None
+        self._cues = []
+        self._closed = False
+
+        app = 'opuslib_next ({})'.format(
+            opuslib_next.api.info.get_version_string().decode('utf-8'))
+        header = _element(EBML, b''.join((
+            _uint_element(EBML_VERSION, 1),
+            _uint_element(EBML_READ_VERSION, 1),
+            _uint_element(EBML_MAX_ID_LENGTH, 4),
+            _uint_element(EBML_MAX_SIZE_LENGTH, 8),
+            _element(DOC_TYPE, b'webm'),
+            _uint_element(DOC_TYPE_VERSION, 4),
+            _uint_element(DOC_TYPE_READ_VERSION, 2),
+        )))
+        header += _encode_id(SEGMENT) + _encode_size(_UNKNOWN_SIZE, 8)
+        self._segment_start = len(header)
+        header += _void(_SEEK_HEAD_RESERVED)
+
+        self._info_position = len(header) - self._segment_start
+        info = b''.join((
+            _uint_element(TIMECODE_SCALE, DEFAULT_TIMECODE_SCALE),
+            _element(MUXING_APP, app.encode('utf-8')),
+            _element(
+                WRITING_APP, (writing_app or app).encode('utf-8')),
+        ))
+        # Duration, the last 8 bytes of Info, is filled in by `close`
+        header += _element(INFO, info + _float_element(DURATION, 0.0))
+        self._duration_position = len(header) - 8
+
+        self._tracks_position = len(header) - self._segment_start
+        header += _element(TRACKS, _element(TRACK_ENTRY, b''.join((
+            _uint_element(TRACK_NUMBER, 1),
+            _uint_element(TRACK_UID, random.getrandbits(56) | 1),
+            _uint_element(TRACK_TYPE, TRACK_TYPE_AUDIO),
+            _element(CODEC_ID_ELEMENT, CODEC_ID),
+            _element(CODEC_PRIVATE, self.head.to_bytes()),
+            _uint_element(
+                CODEC_DELAY, self.head.pre_skip * 1000000000 // 48000),
+            _uint_element(SEEK_PRE_ROLL, SEEK_PREROLL),
+            _element(AUDIO, b''.join((
+                _float_element(SAMPLING_FREQUENCY, 48000.0),
+                _uint_element(CHANNELS, self.head.channels),
+            ))),
+        ))))
+        self._write(header)
+
+    def __enter__(self) -> 'WebMWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def pre_skip(self) -> int:
+        """Samples at 48 kHz the decoder discards at the beginning."""
+        return self.head.pre_skip
+
+    @property
+    def granule_position(self) -> int:
+        """Samples at 48 kHz written so far."""
+        return self._granule
+
+    def write_packet(self, packet, samples: typing.Optional[int] = None) -> None:
+        """
+        Appends one packet to the track.
+
+        :param samples: Duration of the packet in samples at 48 kHz. Read
+            from the TOC byte if omitted.
+        """
+        if self._closed:
+            raise ValueError('write to a closed WebMWriter')
+        if samples is None:
+            samples = opuslib_next.packet.get_nb_samples(packet)
+
+        # The last block is held back so that `close` can attach padding
+        if self._pending is not None:
+            self._add_block(*self._pending)
+        self._pending = (bytes(packet), self._granule * 1000 // 48000, 0)
+        self._granule += samples
+
+    def write_packets(self, packets: typing.Iterable) -> None:
+        """Appends every packet of `packets` to the track."""
+        for packet in packets:
+            self.write_packet(packet)
+
+    def close(self, samples: typing.Optional[int] = None) -> None:
+        """
+        Writes the last cluster and the Cues, and completes the headers if
+        the file object is seekable. The file object is not closed.
+
+        :param samples: Number of valid samples at 48 kHz in the stream,
+            excluding pre-skip. The rest of the last packet is marked as
+            discard padding.
+        """
+        if self._closed:
+            return
+
+        if samples is not None:
+            discard = self._granule - self.head.pre_skip - samples
+            if discard < 0:
+                raise ValueError(
+                    '`samples` exceeds the duration of the written packets')
+            if self._pending is not None:
+                packet, time, _ = self._pending
+                self._pending = (
+                    packet, time, discard * 1000000000 // 48000)
+            self._samples = samples
+        if self._pending is not None:
+            self._add_block(*self._pending)
+            self._pending = None
+        self._flush_cluster()
+        self._closed = True
+
+        cues_position = self._written - self._segment_start
+        self._write(_element(CUES, b''.join(
+            _element(CUE_POINT, _uint_element(CUE_TIME, time) + _element(
+                CUE_TRACK_POSITIONS,
+                _uint_element(CUE_TRACK, 1) +
+                _uint_element(CUE_CLUSTER_POSITION, position)))
+            for time, position in self._cues)))
+
+        if self._seekable:
+            self._finalize(cues_position)
+        flush = getattr(self._fileobj, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def _finalize(self, cues_position: int) -> None:
+        fileobj = self._fileobj
+        seek_head = _element(SEEK_HEAD, b''.join(
+            _element(SEEK, _element(SEEK_ID, _encode_id(element_id)) +
+                     _uint_element(SEEK_POSITION, position))
+            for element_id, position in (
+                (INFO, self._info_position),
+                (TRACKS, self._tracks_position),
+                (CUES, cues_position))))
+        seek_head += _void(_SEEK_HEAD_RESERVED - len(seek_head))
+
+        fileobj.seek(self._start + self._segment_start - 8)
+        fileobj.write(_encode_size(self._written - self._segment_start, 8))
+        fileobj.write(seek_head)
+        fileobj.seek(self._start + self._duration_position)
+        samples = self._samples
+        if samples is None:
+            samples = self._granule - self.head.pre_skip
+        fileobj.write(struct.pack('>d', samples * 1000 / 48000))
+        fileobj.seek(self._start + self._written)
+
+    def _add_block(self, packet: bytes, time: int, discard: int) -> None:
+        if self._cluster_time is None or \
+                time - self._cluster_time >= self._cluster_duration:
+            self._flush_cluster()
+            self._cluster_time = time
+            self._cluster += _uint_element(TIMECODE, time)
+
+        header = b'\x81' + struct.pack('>h', time - self._cluster_time)
+        if discard:
+            block = _element(BLOCK, header + b'\x00' + packet)
+            self._cluster += _element(
+                BLOCK_GROUP, block + _int_element(DISCARD_PADDING, discard))
+        else:
+            self._cluster += _encode_id(SIMPLE_BLOCK)
+            self._cluster += _encode_size(4 + len(packet))
+            self._cluster += header
+            self._cluster += b'\x80'
+            self._cluster += packet
+
+    def _flush_cluster(self) -> None:
+        if self._cluster_time is None:
+            return
+        self._cues.append(
+            (self._cluster_time, self._written - self._segment_start))
+        self._write(
+            _encode_id(CLUSTER) + _encode_size(len(self._cluster), 8) +
+            self._cluster)
+        self._cluster.clear()
+        self._cluster_time = None
+
+    def _write(self, data) -> None:
+        self._fileobj.write(data)
+        self._written += len(data)
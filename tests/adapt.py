@@ -0,0 +1,116 @@
+"""Tests for the adaptive rate controller"""
+
+import unittest
+
+import opuslib_next
+import opuslib_next.adapt
+
+
+class RateControllerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = opuslib_next.Encoder(
+            48000, 1, opuslib_next.APPLICATION_VOIP)
+        self.controller = opuslib_next.adapt.RateController(self.encoder)
+
+    def assertMirrored(self):
+        controller, encoder = self.controller, self.encoder
+        self.assertEqual(encoder.bitrate, controller.bitrate)
+        self.assertEqual(
+            encoder.packet_loss_perc, controller.packet_loss_perc)
+        self.assertEqual(bool(encoder.inband_fec), controller.inband_fec)
+        self.assertEqual(encoder.max_bandwidth, controller.max_bandwidth)
+
+    def test_initial_state(self):
+        controller = self.controller
+        self.assertEqual(controller.bitrate, 32000)
+        self.assertEqual(
+            controller.max_bandwidth, opuslib_next.BANDWIDTH_FULLBAND)
+        self.assertEqual(controller.frame_size, 960)
+        self.assertFalse(controller.inband_fec)
+        self.assertMirrored()
+
+    def test_loss_reduces_bitrate_and_enables_fec(self):
+        controller = self.controller
+        for _ in range(5):
+            controller.update(loss=0.3)
+        self.assertLess(controller.bitrate, 16000)
+        self.assertTrue(controller.inband_fec)
+        self.assertEqual(controller.packet_loss_perc, 30)
+        self.assertGreater(controller.frame_duration, 960)
+        self.assertMirrored()
+
+        for _ in range(40):
+            controller.update(loss=0.0)
+        self.assertEqual(controller.bitrate, controller.max_bitrate)
+        self.assertFalse(controller.inband_fec)
+        self.assertEqual(controller.packet_loss_perc, 0)
+        self.assertEqual(controller.frame_duration, 960)
+        self.assertMirrored()
+
+    def test_bandwidth_cap(self):
+        controller = self.controller
+        controller.update(loss=0.0, bandwidth=24000)
+        controller.update(loss=0.0, bandwidth=24000)
+        # 40 ms frames, leaving 21600 - 8000 bits per second for audio
+        self.assertEqual(controller.frame_duration, 1920)
+        self.assertEqual(controller.bitrate, 13600)
+        self.assertEqual(
+            controller.max_bandwidth, opuslib_next.BANDWIDTH_WIDEBAND)
+        self.assertMirrored()
+
+    def test_bandwidth_dip_recovers(self):
+        controller = self.controller
+        controller.update(loss=0.05, bandwidth=16000)
+        self.assertLess(controller.bitrate, 16000)
+        for _ in range(50):
+            controller.update(loss=0.05, bandwidth=200000)
+        # The loss-driven target was kept, not the capped bitrate
+        self.assertEqual(controller.bitrate, 32000)
+        self.assertEqual(controller.frame_duration, 960)
+        self.assertEqual(
+            controller.max_bandwidth, opuslib_next.BANDWIDTH_FULLBAND)
+        self.assertMirrored()
+
+    def test_no_writes_when_stable(self):
+        controller = self.controller
+        for _ in range(40):
+            controller.update(loss=0.0, rtt=0.05)
+        writes = controller.writes
+        for _ in range(100):
+            self.assertFalse(controller.update(loss=0.0, rtt=0.05))
+        self.assertEqual(controller.writes, writes)
+
+        # Small fluctuations stay within the hysteresis
+        for _ in range(10):
+            controller.update(loss=0.03)
+        writes = controller.writes
+        for loss in (0.03, 0.025, 0.035, 0.03) * 5:
+            controller.update(loss=loss)
+        self.assertEqual(controller.writes, writes)
+
+    def test_fec_threshold_follows_rtt(self):
+        self.controller.update(loss=0.015)
+        self.assertFalse(self.controller.inband_fec)
+
+        encoder = opuslib_next.Encoder(
+            48000, 1, opuslib_next.APPLICATION_VOIP)
+        controller = opuslib_next.adapt.RateController(encoder)
+        controller.update(loss=0.015, rtt=0.4)
+        self.assertTrue(controller.inband_fec)
+
+    def test_tier_hysteresis(self):
+        tiers = opuslib_next.adapt.FRAME_DURATION_TIERS
+        tier = opuslib_next.adapt._tier
+        self.assertEqual(tier(0, 21000, tiers, 0.1), 1)
+        self.assertEqual(tier(0, 23000, tiers, 0.1), 2)
+        self.assertEqual(tier(2, 19000, tiers, 0.1), 2)
+        self.assertEqual(tier(2, 17000, tiers, 0.1), 1)
+        self.assertEqual(tier(2, 5000, tiers, 0.1), 0)
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.controller, '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Tests for the asyncio encoder and decoder"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+import opuslib_next
+import opuslib_next.aio
+
+
+FS = 48000
+CHANNELS = 2
+FRAME_SIZE = 960
+FRAME_BYTES = FRAME_SIZE * CHANNELS * 2
+
+
+async def pcm_source(chunks, chunk_size, consumed=None):
+    for _ in range(chunks):
+        if consumed is not None:
+            consumed.append(chunk_size)
+        yield b'\x00' * chunk_size
+        await asyncio.sleep(0)
+
+
+class AsyncCodecTest(unittest.TestCase):
+
+    def test_encode_decode(self):
+        async def run():
+            encoder = opuslib_next.aio.AsyncEncoder(FS, CHANNELS, 'audio')
+            decoder = opuslib_next.aio.AsyncDecoder(FS, CHANNELS)
+            packet = await encoder.encode(b'\x00' * FRAME_BYTES, FRAME_SIZE)
+            return await decoder.decode(packet, FRAME_SIZE)
+
+        self.assertEqual(len(asyncio.run(run())), FRAME_BYTES)
+
+    def test_concurrent_calls_are_serialized(self):
+        async def run():
+            encoder = opuslib_next.aio.AsyncEncoder(FS, CHANNELS, 'audio')
+            return await asyncio.gather(*(
+                encoder.encode(b'\x00' * FRAME_BYTES, FRAME_SIZE)
+                for _ in range(8)
+            ))
+
+        self.assertEqual(len(asyncio.run(run())), 8)
+
+    def test_cancel_keeps_state_locked(self):
+        active = []
+        overlaps = []
+        lock = threading.Lock()
+
+        def slow_encode(pcm_data, frame_size):
+            with lock:
+                overlaps.append(bool(active))
+                active.append(None)
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+            return b'\x00'
+
+        async def run():
+            encoder = opuslib_next.aio.AsyncEncoder(FS, CHANNELS, 'audio')
+            encoder.encoder.encode = slow_encode
+            first = asyncio.ensure_future(encoder.encode(b'', FRAME_SIZE))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            second = await encoder.encode(b'', FRAME_SIZE)
+            self.assertTrue(first.cancelled())
+            return second
+
+        self.assertEqual(asyncio.run(run()), b'\x00')
+        self.assertEqual(overlaps, [False, False])
+
+    def test_stream_roundtrip_reframes_input(self):
+        async def run():
+            encoder = opuslib_next.aio.AsyncEncoder(FS, CHANNELS, 'audio')
+            decoder = opuslib_next.aio.AsyncDecoder(FS, CHANNELS)
+            # 10 chunks of 1000 bytes: 2 whole frames and a padded partial one
+            packets = opuslib_next.aio.encode_stream(
+                encoder, pcm_source(10, 1000), FRAME_SIZE)
+            return [
+                pcm async for pcm in opuslib_next.aio.decode_stream(
+                    decoder, packets, FRAME_SIZE)
+            ]
+
+        decoded = asyncio.run(run())
+        self.assertEqual(len(decoded), 3)
+        self.assertTrue(all(len(pcm) == FRAME_BYTES for pcm in decoded))
+
+    def test_backpressure_and_cancellation(self):
+        consumed = []
+
+        async def run():
+            encoder = opuslib_next.aio.AsyncEncoder(FS, CHANNELS, 'audio')
+            stream = opuslib_next.aio.encode_stream(
+                encoder, pcm_source(1000, FRAME_BYTES, consumed),
+                FRAME_SIZE, max_pending=2)
+            await stream.__anext__()
+            await asyncio.sleep(0.05)
+            await stream.aclose()
+
+        asyncio.run(run())
+        # The producer stops once the bounded queue is full
+        self.assertLess(len(consumed), 10)
+
+    def test_stream_propagates_errors(self):
+        async def run():
+            decoder = opuslib_next.aio.AsyncDecoder(FS, CHANNELS)
+
+            async def packets():
+                yield bytes([255, 49]) + bytes(49)
+
+            async for _ in opuslib_next.aio.decode_stream(
+                    decoder, packets(), FRAME_SIZE):
+                pass
+
+        with self.assertRaises(opuslib_next.OpusError):
+            asyncio.run(run())
@@ -150,6 +150,26 @@ class DecoderTest(unittest.TestCase):
 
         opuslib_next.api.decoder.destroy(dec)
 
+    def test_packet_has_lbrr(self):
+        """opus_packet_has_lbrr()"""
+
+        if opuslib_next.api.decoder.libopus_packet_has_lbrr is None:
+            self.skipTest('libopus does not expose opus_packet_has_lbrr')
+
+        # CELT-only packets never carry LBRR data
+        self.assertFalse(
+            opuslib_next.api.decoder.packet_has_lbrr(bytes([252, 0, 0])))
+
+        encoder = opuslib_next.Encoder(
+            48000, 1, opuslib_next.APPLICATION_VOIP)
+        encoder.inband_fec = 1
+        encoder.packet_loss_perc = 20
+        pcm = bytes(range(256)) * 7 + bytes(128)
+        packets = [encoder.encode(pcm, 960) for _ in range(5)]
+        self.assertTrue(any(
+            opuslib_next.api.decoder.packet_has_lbrr(packet)
+            for packet in packets))
+
     def test_packet_get_nb_frames(self):
         """opus_packet_get_nb_frames()"""
 
@@ -0,0 +1,101 @@
+"""Tests for the DTX encoder wrapper"""
+
+import array
+import math
+import random
+import unittest
+
+import opuslib_next
+import opuslib_next.dtx
+import opuslib_next.jitter
+import opuslib_next.rtp
+
+
+FRAME = 960
+
+
+class DtxEncoderTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        generator = random.Random(0)
+        cls.speech = array.array(
+            'h', (int(8000 * math.sin(i * 0.05)) for i in range(FRAME))
+        ).tobytes()
+        cls.silence = array.array(
+            'h', (generator.randint(-3, 3) for _ in range(FRAME))
+        ).tobytes()
+        # Speech, 1.2 s of silence, speech
+        cls.frames = [cls.speech] * 5 + [cls.silence] * 60 + [cls.speech] * 5
+
+    def _encoder(self):
+        return opuslib_next.Encoder(48000, 1, opuslib_next.APPLICATION_VOIP)
+
+    def test_suppression(self):
+        encoder = self._encoder()
+        stream = opuslib_next.dtx.DtxEncoder(encoder)
+        self.assertTrue(encoder.dtx)
+
+        packets = [stream.encode(pcm, FRAME) for pcm in self.frames]
+        sent = [packet for packet in packets if packet is not None]
+        self.assertGreater(stream.suppressed, 20)
+        self.assertEqual(stream.sent + stream.suppressed, len(self.frames))
+        self.assertEqual(stream.suppressed_samples, stream.suppressed * FRAME)
+        self.assertEqual(stream.position, len(self.frames) * FRAME)
+        self.assertEqual(stream.timestamp, (len(self.frames) - 1) * FRAME)
+
+        # The first DTX packet of each run is sent, the rest suppressed
+        for index, packet in enumerate(packets):
+            if packet is None:
+                previous = packets[index - 1]
+                self.assertTrue(previous is None or len(previous) <= 2)
+        self.assertTrue(any(len(packet) <= 2 for packet in sent))
+
+    def test_keepalive(self):
+        stream = opuslib_next.dtx.DtxEncoder(
+            self._encoder(), keepalive=5 * FRAME)
+        run = longest = 0
+        for pcm in self.frames:
+            if stream.encode(pcm, FRAME) is None:
+                run += 1
+                longest = max(longest, run)
+            else:
+                run = 0
+        self.assertGreater(stream.suppressed, 0)
+        self.assertEqual(longest, 4)
+
+    def test_rtp_and_comfort_noise(self):
+        stream = opuslib_next.dtx.DtxEncoder(self._encoder())
+        payloader = opuslib_next.rtp.Payloader(
+            ssrc=1, sequence=0, timestamp=0)
+        datagrams = [
+            stream.payload(pcm, FRAME, payloader) for pcm in self.frames]
+        self.assertEqual(payloader.timestamp, len(self.frames) * FRAME)
+
+        packets = opuslib_next.rtp.Depayloader().depayload_batch(
+            datagram for datagram in datagrams if datagram is not None)
+        self.assertEqual(len(packets), stream.sent)
+        self.assertEqual(
+            [packet.sequence for packet in packets], list(range(len(packets))))
+        # The packet ending a suppressed gap starts a talkspurt
+        for previous, packet in zip(packets, packets[1:]):
+            if packet.timestamp - previous.timestamp > FRAME:
+                self.assertTrue(packet.marker)
+
+        buffer = opuslib_next.jitter.JitterBuffer(
+            opuslib_next.Decoder(48000, 1))
+        outputs = []
+        clock = 0
+        while len(outputs) <= len(self.frames):
+            while packets and packets[0].timestamp <= clock:
+                buffer.put_rtp(packets.pop(0))
+            outputs.append(buffer.get())
+            clock += len(outputs[-1]) // 2
+        self.assertEqual(buffer.lost, 0)
+        self.assertEqual(buffer.concealed, 0)
+        self.assertEqual(buffer.comfort_noise, stream.suppressed)
+        self.assertTrue(all(len(pcm) == 2 * FRAME for pcm in outputs))
+
+
+if __name__ == '__main__':
+    unittest.main()
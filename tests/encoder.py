@@ -269,6 +269,23 @@ class EncoderTest(unittest.TestCase):
             (16, 24)
         )
 
+    def test_expert_frame_duration(self):
+        self.check_setget(
+            opuslib_next.api.ctl.set_expert_frame_duration,
+            opuslib_next.api.ctl.get_expert_frame_duration,
+            (4999, 5010),
+            (opuslib_next.FRAMESIZE_2_5_MS, opuslib_next.FRAMESIZE_120_MS,
+             opuslib_next.FRAMESIZE_ARG)
+        )
+
+    def test_prediction_disabled(self):
+        self.check_setget(
+            opuslib_next.api.ctl.set_prediction_disabled,
+            opuslib_next.api.ctl.get_prediction_disabled,
+            (-1, 2),
+            (1, 0)
+        )
+
     def check_setget(self, v_set, v_get, bad, good):
         enc = opuslib_next.api.encoder.create_state(
             48000, 2, opuslib_next.APPLICATION_AUDIO)
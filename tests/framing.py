@@ -0,0 +1,109 @@
+"""Tests for variable frame duration encoding"""
+
+import array
+import math
+import unittest
+
+import opuslib_next
+import opuslib_next.framing
+import opuslib_next.packet
+
+
+class VariableFrameEncoderTest(unittest.TestCase):
+
+    def _stream(self, fs=48000, channels=1, **kwargs):
+        encoder = opuslib_next.Encoder(
+            fs, channels, opuslib_next.APPLICATION_AUDIO)
+        return opuslib_next.framing.VariableFrameEncoder(encoder, **kwargs)
+
+    def _pcm(self, samples, channels=1):
+        return array.array('h', (
+            int(8000 * math.sin(i * 0.05))
+            for i in range(samples * channels))).tobytes()
+
+    def test_frame_selection(self):
+        stream = self._stream()
+        self.assertEqual(
+            stream.frame_duration,
+            opuslib_next.framing.DEFAULT_FRAME_DURATION)
+
+        stream.max_latency = 300
+        self.assertEqual(stream.frame_duration, 240)
+
+        # 40 bytes per packet within 16 kb/s needs 50 packets a second
+        stream.max_latency = None
+        stream.overhead_budget = 16000
+        self.assertEqual(stream.frame_duration, 960)
+        stream.overhead_budget = 4000
+        self.assertEqual(stream.frame_duration, 3840)
+        stream.overhead_budget = 100
+        self.assertEqual(stream.frame_duration, 5760)
+
+        # The latency target wins over the budget
+        stream.max_latency = 2000
+        self.assertEqual(stream.frame_duration, 1920)
+
+        self.assertRaises(ValueError, setattr, stream, 'max_latency', 100)
+        self.assertRaises(ValueError, setattr, stream, 'overhead_budget', 0)
+
+    def test_arbitrary_chunks(self):
+        stream = self._stream(max_latency=480)
+        pcm = self._pcm(2000)
+        packets = []
+        for start in range(0, len(pcm), 2 * 333):
+            packets += stream.encode(pcm[start:start + 2 * 333])
+        self.assertEqual(len(packets), 4)
+        self.assertEqual(stream.pending, 2000 - 4 * 480)
+        self.assertEqual(stream.encoder.expert_frame_duration,
+                         opuslib_next.FRAMESIZE_10_MS)
+        for packet in packets:
+            self.assertEqual(opuslib_next.packet.get_nb_samples(packet), 480)
+
+        # The remaining 80 samples are padded to 2.5 ms
+        packets = stream.flush()
+        self.assertEqual(len(packets), 1)
+        self.assertEqual(opuslib_next.packet.get_nb_samples(packets[0]), 120)
+        self.assertEqual(stream.pending, 0)
+        self.assertEqual(stream.position, 4 * 480 + 120)
+        self.assertEqual(stream.flush(), [])
+
+    def test_switch_duration(self):
+        stream = self._stream(fs=16000, channels=2, overhead_budget=1000)
+        pcm = self._pcm(16000, channels=2)
+        packets = stream.encode(pcm)
+        self.assertEqual(len(packets), 8)
+        self.assertEqual(
+            opuslib_next.packet.get_nb_samples(packets[0], 16000), 1920)
+
+        stream.max_latency = 120
+        packets = stream.encode(self._pcm(80, channels=2))
+        self.assertEqual(len(packets), (640 + 80) // 40)
+        self.assertTrue(all(
+            opuslib_next.packet.get_nb_samples(packet, 16000) == 40
+            for packet in packets))
+
+    def test_flush_keeps_latency(self):
+        stream = self._stream(overhead_budget=100)
+        self.assertEqual(stream.encode(self._pcm(5000)), [])
+
+        # 41 frames of 2.5 ms, then the last 80 samples padded
+        stream.max_latency = 120
+        packets = stream.flush()
+        self.assertEqual(len(packets), 42)
+        self.assertTrue(all(
+            opuslib_next.packet.get_nb_samples(packet) == 120
+            for packet in packets))
+        self.assertEqual(stream.position, 42 * 120)
+        self.assertEqual(stream.pending, 0)
+
+    def test_float(self):
+        stream = self._stream(max_latency=960)
+        pcm = array.array('f', [0.1] * 1500).tobytes()
+        self.assertEqual(len(stream.encode_float(pcm)), 1)
+        self.assertRaises(ValueError, stream.encode, bytes(2 * 960))
+        self.assertEqual(len(stream.flush()), 1)
+        self.assertEqual(len(stream.encode(bytes(2 * 960))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,11 @@ class DecoderTest(unittest.TestCase):
         decoder = opuslib_next.Decoder(48000, 2)
         self.assertEqual(decoder.bandwidth, 0)
 
+    def test_channels_and_sample_rate(self):
+        decoder = opuslib_next.Decoder(16000, 2)
+        self.assertEqual(decoder.channels, 2)
+        self.assertEqual(decoder.sample_rate, 16000)
+
     def test_get_pitch(self):
         decoder = opuslib_next.Decoder(48000, 2)
 
@@ -91,3 +96,35 @@ class DecoderTest(unittest.TestCase):
             decoder.decode_float(packet, frame_size=960)
         except opuslib_next.OpusError:
             self.fail('Decode failed')
+
+    def test_conceal(self):
+        decoder = opuslib_next.Decoder(48000, 2)
+        self.assertEqual(decoder.last_packet_duration, 0)
+        # 20 ms before any packet was decoded
+        self.assertEqual(len(decoder.conceal()), 960 * 2 * 2)
+        self.assertEqual(
+            len(opuslib_next.Decoder(16000, 1).conceal()), 320 * 2)
+
+        decoder.decode(bytes([252, 0, 0]), frame_size=960)
+        self.assertEqual(decoder.last_packet_duration, 960)
+
+        # Defaults to the duration of the last packet
+        self.assertEqual(len(decoder.conceal()), 960 * 2 * 2)
+        self.assertEqual(len(decoder.conceal(480)), 480 * 2 * 2)
+        self.assertEqual(decoder.last_packet_duration, 480)
+
+        with self.assertRaises(opuslib_next.OpusError) as cm:
+            decoder.conceal(100)
+        self.assertEqual(cm.exception.code, opuslib_next.BAD_ARG)
+
+    def test_conceal_into(self):
+        decoder = opuslib_next.Decoder(48000, 1)
+        decoder.decode(bytes([252, 0, 0]), frame_size=960)
+
+        buffer = bytearray(b'\xff' * (100 + 960 * 2))
+        self.assertEqual(decoder.conceal_into(buffer, offset=100), 960)
+        self.assertEqual(buffer[:100], b'\xff' * 100)
+
+        self.assertEqual(
+            decoder.conceal_into(memoryview(buffer)[100:], 240), 240)
+        self.assertRaises(ValueError, decoder.conceal_into, bytearray(10))
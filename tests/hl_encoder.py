@@ -29,3 +29,19 @@ class EncoderTest(unittest.TestCase):
 
         encoder.inband_fec = 0
         self.assertEqual(encoder.inband_fec, 0)
+
+    def test_frame_duration_properties(self):
+        encoder = opuslib_next.Encoder(
+            48000, 1, opuslib_next.APPLICATION_AUDIO)
+        self.assertEqual(
+            encoder.expert_frame_duration, opuslib_next.FRAMESIZE_ARG)
+
+        encoder.expert_frame_duration = opuslib_next.FRAMESIZE_5_MS
+        encoder.prediction_disabled = 1
+        self.assertEqual(
+            encoder.expert_frame_duration, opuslib_next.FRAMESIZE_5_MS)
+        self.assertEqual(encoder.prediction_disabled, 1)
+
+        # Frames shorter than the expert duration are rejected
+        self.assertRaises(
+            opuslib_next.OpusError, encoder.encode, bytes(2 * 120), 120)
@@ -20,7 +20,9 @@ class HighLevelMultiStreamTest(unittest.TestCase):
     def test_create(self):
         opuslib_next.MultiStreamEncoder(
             48000, 2, 1, 1, [0, 1], opuslib_next.APPLICATION_AUDIO)
-        opuslib_next.MultiStreamDecoder(48000, 2, 1, 1, [0, 1])
+        decoder = opuslib_next.MultiStreamDecoder(24000, 2, 1, 1, [0, 1])
+        self.assertEqual(decoder.channels, 2)
+        self.assertEqual(decoder.sample_rate, 24000)
 
     def test_reset_state(self):
         encoder = opuslib_next.MultiStreamEncoder(
@@ -48,6 +50,25 @@ class HighLevelMultiStreamTest(unittest.TestCase):
             ctypes.sizeof(ctypes.c_int16) * channels * frame_size
         )
 
+    def test_conceal(self):
+        decoder = opuslib_next.MultiStreamDecoder(
+            48000, 2, 1, 1, [0, 1])
+        # 20 ms before any packet was decoded
+        self.assertEqual(
+            decoder.conceal_into(
+                bytearray(ctypes.sizeof(ctypes.c_int16) * 2 * 960)),
+            960)
+        decoder.decode(bytes([252, 0, 0]), 960)
+        self.assertEqual(decoder.last_packet_duration, 960)
+
+        self.assertEqual(
+            len(decoder.conceal()),
+            ctypes.sizeof(ctypes.c_int16) * 2 * 960)
+
+        buffer = bytearray(ctypes.sizeof(ctypes.c_int16) * 2 * 480)
+        self.assertEqual(decoder.conceal_into(buffer, 480), 480)
+        self.assertEqual(decoder.last_packet_duration, 480)
+
     def test_encode_decode_float_roundtrip(self):
         frame_size = 960
         channels = 2
@@ -82,6 +103,13 @@ class HighLevelMultiStreamTest(unittest.TestCase):
         encoder.packet_loss_perc = 10
         self.assertEqual(encoder.packet_loss_perc, 10)
 
+        encoder.expert_frame_duration = opuslib_next.FRAMESIZE_10_MS
+        self.assertEqual(
+            encoder.expert_frame_duration, opuslib_next.FRAMESIZE_10_MS)
+
+        encoder.prediction_disabled = 1
+        self.assertEqual(encoder.prediction_disabled, 1)
+
     def test_decoder_gain_property(self):
         decoder = opuslib_next.MultiStreamDecoder(48000, 2, 1, 1, [0, 1])
 
@@ -45,6 +45,8 @@ class HighLevelProjectionTest(unittest.TestCase):
         self.assertEqual(encoder.coupled_streams, 2)
         self.assertEqual(decoder.streams, encoder.streams)
         self.assertEqual(decoder.coupled_streams, encoder.coupled_streams)
+        self.assertEqual(decoder.channels, CHANNELS)
+        self.assertEqual(decoder.sample_rate, 48000)
 
     def test_demixing_matrix_properties(self):
         encoder = self._create_encoder()
@@ -80,6 +82,24 @@ class HighLevelProjectionTest(unittest.TestCase):
             ctypes.sizeof(ctypes.c_int16) * CHANNELS * frame_size
         )
 
+    def test_conceal(self):
+        encoder, decoder = self._create_encoder_and_decoder()
+        # 20 ms before any packet was decoded
+        self.assertEqual(
+            len(decoder.conceal()),
+            ctypes.sizeof(ctypes.c_int16) * CHANNELS * 960)
+        pcm = b'\x00' * ctypes.sizeof(ctypes.c_int16) * CHANNELS * 960
+        decoder.decode(encoder.encode(pcm, 960), 960)
+        self.assertEqual(decoder.last_packet_duration, 960)
+
+        self.assertEqual(
+            len(decoder.conceal()),
+            ctypes.sizeof(ctypes.c_int16) * CHANNELS * 960)
+
+        buffer = bytearray(ctypes.sizeof(ctypes.c_int16) * CHANNELS * 480)
+        self.assertEqual(decoder.conceal_into(buffer, 480), 480)
+        self.assertEqual(decoder.last_packet_duration, 480)
+
     def test_encode_decode_float_roundtrip(self):
         frame_size = 960
         encoder, decoder = self._create_encoder_and_decoder()
@@ -109,6 +129,13 @@ class HighLevelProjectionTest(unittest.TestCase):
         encoder.packet_loss_perc = 10
         self.assertEqual(encoder.packet_loss_perc, 10)
 
+        encoder.expert_frame_duration = opuslib_next.FRAMESIZE_10_MS
+        self.assertEqual(
+            encoder.expert_frame_duration, opuslib_next.FRAMESIZE_10_MS)
+
+        encoder.prediction_disabled = 1
+        self.assertEqual(encoder.prediction_disabled, 1)
+
     def test_decoder_gain_property(self):
         _, decoder = self._create_encoder_and_decoder()
 
@@ -0,0 +1,55 @@
+"""Tests for a high-level Repacketizer object"""
+
+import unittest
+
+import opuslib_next
+import opuslib_next.packet
+
+
+class RepacketizerTest(unittest.TestCase):
+
+    def setUp(self):
+        encoder = opuslib_next.Encoder(48000, 2, 'audio')
+        encoder.bitrate = 64000
+        self.packets = [encoder.encode(bytes(3840), 960) for _ in range(6)]
+
+    def test_merge_and_split(self):
+        repacketizer = opuslib_next.Repacketizer()
+
+        merged = repacketizer.merge(self.packets[:3])
+        info = opuslib_next.packet.parse_toc(merged)
+        self.assertEqual(info.frame_count, 3)
+        self.assertEqual(info.samples, 2880)
+
+        split = repacketizer.split(merged)
+        self.assertEqual(len(split), 3)
+        for original, packet in zip(self.packets[:3], split):
+            self.assertEqual(
+                bytes(opuslib_next.packet.parse(original).frames[0]),
+                bytes(opuslib_next.packet.parse(packet).frames[0]))
+
+        decoder = opuslib_next.Decoder(48000, 2)
+        self.assertEqual(len(decoder.decode(merged, 2880)), 2880 * 4)
+
+    def test_state_is_reused(self):
+        repacketizer = opuslib_next.Repacketizer()
+        for _ in range(3):
+            repacketizer.reset()
+            for packet in self.packets:
+                repacketizer.cat(memoryview(packet))
+            self.assertEqual(repacketizer.nb_frames, 6)
+            self.assertEqual(
+                opuslib_next.packet.parse_toc(
+                    repacketizer.out_range(2, 4)).frame_count, 2)
+
+    def test_incompatible_packets(self):
+        repacketizer = opuslib_next.Repacketizer()
+        repacketizer.cat(self.packets[0])
+        with self.assertRaises(opuslib_next.OpusError) as context:
+            # SILK narrowband mono differs from the encoded configuration
+            repacketizer.cat(bytes([0x00, 0x01]))
+        self.assertEqual(context.exception.code, opuslib_next.INVALID_PACKET)
+
+        with self.assertRaises(opuslib_next.OpusError):
+            # More than 120 ms
+            repacketizer.merge(self.packets + self.packets[:1])
@@ -0,0 +1,45 @@
+"""Tests for the sub-interpreter executor"""
+
+import concurrent.futures
+import unittest
+
+import opuslib_next
+import opuslib_next.interpreters
+
+
+FS = 48000
+CHANNELS = 2
+FRAME_SIZE = 960
+FRAME_BYTES = FRAME_SIZE * CHANNELS * 2
+
+HAS_INTERPRETERS = hasattr(concurrent.futures, 'InterpreterPoolExecutor')
+
+
+class InterpreterExecutorTest(unittest.TestCase):
+
+    def roundtrip(self, executor):
+        segments = [b'\x00' * FRAME_BYTES * 3, b'\x00' * (FRAME_BYTES + 10)]
+        packets = executor.encode(
+            segments, FS, CHANNELS, 'audio', FRAME_SIZE, bitrate=32000)
+        self.assertEqual([len(item) for item in packets], [3, 2])
+
+        decoded = executor.decode(packets, FS, CHANNELS, FRAME_SIZE)
+        self.assertEqual(
+            [len(pcm) for pcm in decoded], [FRAME_BYTES * 3, FRAME_BYTES * 2])
+
+    def test_jobs_on_thread_executor(self):
+        with opuslib_next.interpreters.InterpreterExecutor(
+                executor=concurrent.futures.ThreadPoolExecutor(2)) as executor:
+            self.roundtrip(executor)
+            self.assertEqual(
+                executor.encode([], FS, CHANNELS, 'audio', FRAME_SIZE), [])
+
+    @unittest.skipUnless(HAS_INTERPRETERS, 'requires Python 3.14+')
+    def test_jobs_on_interpreters(self):
+        with opuslib_next.interpreters.InterpreterExecutor(2) as executor:
+            self.roundtrip(executor)
+
+    @unittest.skipIf(HAS_INTERPRETERS, 'InterpreterPoolExecutor available')
+    def test_requires_interpreter_pool(self):
+        with self.assertRaises(RuntimeError):
+            opuslib_next.interpreters.InterpreterExecutor()
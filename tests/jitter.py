@@ -0,0 +1,227 @@
+"""Tests for the adaptive jitter buffer"""
+
+import array
+import math
+import unittest
+
+import opuslib_next
+import opuslib_next.api.decoder
+import opuslib_next.jitter
+
+
+FRAME = 960
+
+
+class JitterBufferTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        encoder = opuslib_next.Encoder(48000, 1, opuslib_next.APPLICATION_VOIP)
+        encoder.inband_fec = 1
+        encoder.packet_loss_perc = 20
+        pcm = array.array(
+            'h', (int(8000 * math.sin(i * 0.05)) for i in range(FRAME * 60)))
+        cls.packets = [
+            encoder.encode(pcm[i * FRAME:(i + 1) * FRAME].tobytes(), FRAME)
+            for i in range(60)]
+
+    def _buffer(self, **kwargs):
+        return opuslib_next.jitter.JitterBuffer(
+            opuslib_next.Decoder(48000, 1), **kwargs)
+
+    def _run(self, buffer, arrivals, ticks, base=0, clock=0, sequences=None):
+        """
+        Plays `ticks` ticks, delivering (arrival, index) pairs in time, with
+        the sequence numbers of the packets by index if given.
+        """
+        arrivals = sorted(arrivals)
+        outputs = []
+        for _ in range(ticks):
+            while arrivals and arrivals[0][0] <= clock:
+                index = arrivals.pop(0)[1]
+                buffer.put(
+                    self.packets[index], (base + index * FRAME) & 0xFFFFFFFF,
+                    None if sequences is None else sequences[index])
+            pcm = buffer.get()
+            outputs.append(pcm)
+            clock += len(pcm) // 2
+        return outputs
+
+    def test_in_order(self):
+        buffer = self._buffer()
+        outputs = self._run(
+            buffer, [(i * FRAME, i) for i in range(40)], 41,
+            base=0xFFFFFFFF - 10 * FRAME)
+        self.assertEqual(buffer.received, 40)
+        self.assertEqual(
+            (buffer.lost, buffer.late, buffer.concealed, buffer.expanded),
+            (0, 0, 0, 0))
+        # One frame of lead-in silence at the minimum delay
+        self.assertEqual(outputs[0], bytes(2 * FRAME))
+        self.assertEqual(buffer.delay, opuslib_next.jitter.DEFAULT_MIN_DELAY)
+
+    def test_position(self):
+        buffer = self._buffer()
+        self.assertIsNone(buffer.position)
+        buffer.put(self.packets[0], 5000)
+        # Playout starts the minimum delay before the first packet
+        self.assertEqual(
+            buffer.position, 5000 - opuslib_next.jitter.DEFAULT_MIN_DELAY)
+        buffer.get()
+        self.assertEqual(buffer.position, 5000)
+        buffer.get()
+        self.assertEqual(buffer.position, 5000 + FRAME)
+
+    def test_reordering(self):
+        buffer = self._buffer()
+        arrivals = [(i * FRAME, i) for i in range(20)]
+        arrivals[5], arrivals[6] = (6 * FRAME, 5), (5 * FRAME, 6)
+        self._run(buffer, arrivals, 21)
+        self.assertEqual(buffer.received, 20)
+        self.assertEqual((buffer.lost, buffer.late), (0, 0))
+
+    def test_loss_recovered_from_fec(self):
+        buffer = self._buffer(min_delay=2 * FRAME)
+        arrivals = [(i * FRAME, i) for i in range(20) if i != 8]
+        outputs = self._run(buffer, arrivals, 22)
+        self.assertEqual((buffer.lost, buffer.recovered), (1, 1))
+        self.assertEqual(buffer.concealed, 0)
+        self.assertTrue(all(len(pcm) == 2 * FRAME for pcm in outputs))
+
+    def test_loss_concealed_without_fec(self):
+        if opuslib_next.api.decoder.libopus_packet_has_lbrr is None:
+            self.skipTest('libopus does not expose opus_packet_has_lbrr')
+        encoder = opuslib_next.Encoder(48000, 1, opuslib_next.APPLICATION_VOIP)
+        pcm = bytes(range(256)) * 7 + bytes(128)
+        packets = self.packets
+        self.packets = [encoder.encode(pcm, FRAME) for _ in range(20)]
+        try:
+            buffer = self._buffer(min_delay=2 * FRAME)
+            arrivals = [(i * FRAME, i) for i in range(20) if i != 8]
+            self._run(buffer, arrivals, 22)
+        finally:
+            self.packets = packets
+        self.assertEqual((buffer.lost, buffer.recovered), (1, 0))
+        self.assertEqual(buffer.concealed, 1)
+
+    def test_loss_after_dtx_recovered_from_fec(self):
+        # Speech lost at the end of a DTX run, shown by the FEC of the next
+        dtx = self.packets[0][:1]
+        packets = self.packets
+        self.packets = packets[:6] + [dtx] + packets[7:]
+        try:
+            buffer = self._buffer()
+            arrivals = [
+                (i * FRAME, i) for i in range(20) if not 7 <= i <= 11]
+            self._run(buffer, arrivals, 21)
+        finally:
+            self.packets = packets
+        self.assertEqual((buffer.lost, buffer.recovered), (1, 1))
+        self.assertEqual(buffer.comfort_noise, 4)
+        self.assertEqual(buffer.concealed, 0)
+
+    def _dtx_run(self, sent, received, sequenced):
+        """
+        Plays a stream with a DTX packet at index 6, sending the packets in
+        `sent`, of which those in `received` arrive. The delay leaves time
+        for the packet after a gap to arrive before the gap is played.
+        """
+        dtx = self.packets[0][:1]
+        packets = self.packets
+        self.packets = packets[:6] + [dtx] + packets[7:]
+        sequences = {index: number for number, index in enumerate(sent)}
+        try:
+            buffer = self._buffer(min_delay=3 * FRAME)
+            self._run(
+                buffer, [(i * FRAME, i) for i in received], 23,
+                sequences=sequences if sequenced else None)
+        finally:
+            self.packets = packets
+        return buffer
+
+    def test_silence_after_dtx_from_sequence(self):
+        # Silence until the speech packet at 11, which carries FEC
+        sent = [i for i in range(20) if not 7 <= i <= 10]
+        buffer = self._dtx_run(sent, sent, True)
+        self.assertEqual((buffer.lost, buffer.recovered), (0, 0))
+        self.assertEqual(buffer.comfort_noise, 4)
+
+        # Without sequence numbers, the FEC is taken as a sign of loss
+        buffer = self._dtx_run(sent, sent, False)
+        self.assertEqual((buffer.lost, buffer.recovered), (1, 1))
+        self.assertEqual(buffer.comfort_noise, 3)
+
+    def test_loss_after_dtx_from_sequence(self):
+        # Speech resumes at 10, its first two packets are lost
+        sent = [i for i in range(20) if not 7 <= i <= 9]
+        received = [i for i in sent if i not in (10, 11)]
+        buffer = self._dtx_run(sent, received, True)
+        self.assertEqual((buffer.lost, buffer.recovered), (2, 1))
+        self.assertEqual((buffer.concealed, buffer.comfort_noise), (1, 3))
+
+        # Without sequence numbers, only the frame FEC covers is found
+        buffer = self._dtx_run(sent, received, False)
+        self.assertEqual((buffer.lost, buffer.recovered), (1, 1))
+        self.assertEqual((buffer.concealed, buffer.comfort_noise), (0, 4))
+
+    def test_late_packet_and_adaptation(self):
+        # Adapt to the slowest packet, a single outlier is ignored otherwise
+        buffer = self._buffer(quantile=1.0)
+        arrivals = [(i * FRAME, i) for i in range(30)]
+        arrivals[10] = (14 * FRAME, 10)
+        self._run(buffer, arrivals, 32)
+        self.assertEqual(buffer.late, 1)
+        self.assertEqual(buffer.lost, 1)
+        self.assertGreater(
+            buffer.target_delay, opuslib_next.jitter.DEFAULT_MIN_DELAY)
+        self.assertLessEqual(
+            buffer.target_delay, opuslib_next.jitter.DEFAULT_MAX_DELAY)
+        # The delay is raised by playing concealed frames, which are not
+        # counted as concealment of the stream
+        self.assertGreater(buffer.expanded, 0)
+        self.assertEqual((buffer.recovered, buffer.concealed), (1, 0))
+        self.assertGreaterEqual(buffer.delay, buffer.target_delay - FRAME)
+
+    def test_drops_when_too_deep(self):
+        # A stall raises the delay, which comes down once it leaves the window
+        buffer = self._buffer(window=10, quantile=1.0)
+        arrivals = [
+            (15 * FRAME if 10 <= i < 15 else i * FRAME, i) for i in range(60)]
+        outputs = self._run(buffer, arrivals[:20], 20)
+        raised = buffer.delay
+        self.assertGreaterEqual(raised, 4 * FRAME)
+        clock = sum(len(pcm) for pcm in outputs) // 2
+        self._run(buffer, arrivals[20:], 40, clock=clock)
+        self.assertGreater(buffer.dropped, 0)
+        self.assertLess(buffer.delay, raised)
+        self.assertLess(buffer.delay, buffer.target_delay + 2 * FRAME)
+
+    def test_duplicates_and_invalid(self):
+        buffer = self._buffer()
+        self.assertTrue(buffer.put(self.packets[0], 0))
+        self.assertFalse(buffer.put(self.packets[0], 0))
+        self.assertFalse(buffer.put(b'', FRAME))
+        self.assertFalse(buffer.put(bytes([0x03]), FRAME))
+        self.assertEqual((buffer.duplicates, buffer.invalid), (1, 2))
+        self.assertEqual(len(buffer), 1)
+
+    def test_fades_to_silence(self):
+        buffer = self._buffer(fade_after=2 * FRAME, fade_length=2 * FRAME)
+        outputs = self._run(buffer, [(i * FRAME, i) for i in range(10)], 20)
+        # Every tick after the stream is concealed, the last five silent
+        self.assertEqual(buffer.concealed, 9)
+        self.assertEqual(outputs[-5:], [bytes(2 * FRAME)] * 5)
+        self.assertNotEqual(outputs[-6], bytes(2 * FRAME))
+        faded = array.array('h', outputs[14])
+        self.assertLess(abs(faded[-1]), 2)
+
+    def test_reset(self):
+        buffer = self._buffer()
+        self._run(buffer, [(i * FRAME, i) for i in range(5)], 3)
+        buffer.reset()
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(buffer.get(), bytes(2 * FRAME))
+
+
+if __name__ == '__main__':
+    unittest.main()
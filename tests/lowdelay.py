@@ -0,0 +1,79 @@
+"""Tests for the low-latency profile and latency probe"""
+
+import unittest
+
+import opuslib_next
+import opuslib_next.lowdelay
+
+
+class LowDelayTest(unittest.TestCase):
+
+    def test_create_encoder(self):
+        encoder = opuslib_next.lowdelay.create_encoder(48000, 2, 120)
+        self.assertEqual(
+            encoder.application, opuslib_next.APPLICATION_RESTRICTED_LOWDELAY)
+        self.assertEqual(
+            encoder.expert_frame_duration, opuslib_next.FRAMESIZE_2_5_MS)
+        self.assertEqual(encoder.prediction_disabled, 1)
+
+        decoder = opuslib_next.Decoder(48000, 2)
+        pcm = decoder.decode(encoder.encode(bytes(4 * 120), 120), 120)
+        self.assertEqual(len(pcm), 4 * 120)
+
+        self.assertRaises(
+            ValueError, opuslib_next.lowdelay.create_encoder, 48000, 1, 480)
+
+    def test_algorithmic_delay(self):
+        encoder = opuslib_next.lowdelay.create_encoder(16000, 1)
+        budget = opuslib_next.lowdelay.algorithmic_delay(encoder)
+        # 2.5 ms of lookahead and a 5 ms frame
+        self.assertEqual((budget.lookahead, budget.frame), (120, 240))
+        self.assertEqual(budget.milliseconds, 7.5)
+
+        budget = opuslib_next.lowdelay.algorithmic_delay(
+            encoder, decoder_delay=480)
+        self.assertEqual(budget.total, 840)
+
+        encoder = opuslib_next.Encoder(
+            48000, 1, opuslib_next.APPLICATION_AUDIO)
+        self.assertRaises(
+            ValueError, opuslib_next.lowdelay.algorithmic_delay, encoder)
+        budget = opuslib_next.lowdelay.algorithmic_delay(encoder, 960)
+        self.assertGreater(budget.lookahead, 120)
+
+
+class LatencyProbeTest(unittest.TestCase):
+
+    def test_measure(self):
+        probe = opuslib_next.lowdelay.LatencyProbe(size=8, every=2)
+        results = [probe.measure(pow, i, 2) for i in range(20)]
+        self.assertEqual(results, [i ** 2 for i in range(20)])
+        self.assertEqual((probe.count, len(probe)), (10, 8))
+        self.assertEqual(len(probe.samples), 8)
+        self.assertTrue(all(sample >= 0 for sample in probe.samples))
+        self.assertLessEqual(probe.percentile(0.5), probe.percentile(1.0))
+        self.assertGreaterEqual(probe.jitter, 0)
+        self.assertGreater(probe.mean, 0)
+
+        probe.reset()
+        self.assertEqual(len(probe), 0)
+        self.assertRaises(ValueError, probe.percentile, 0.5)
+
+    def test_encode_decode(self):
+        encoder = opuslib_next.lowdelay.create_encoder(48000, 1)
+        decoder = opuslib_next.Decoder(48000, 1)
+        encode_probe = opuslib_next.lowdelay.LatencyProbe()
+        decode_probe = opuslib_next.lowdelay.LatencyProbe()
+        for _ in range(50):
+            packet = encode_probe.measure(encoder.encode, bytes(480), 240)
+            decode_probe.measure(decoder.decode, packet, 240)
+        self.assertEqual((len(encode_probe), len(decode_probe)), (50, 50))
+
+        baseline = encode_probe.baseline(100)
+        self.assertEqual(len(baseline), 100)
+        self.assertLess(baseline.percentile(0.5),
+                        encode_probe.percentile(0.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,527 @@
+"""Tests for the Ogg Opus muxer"""
+
+import array
+import io
+import math
+import os
+import struct
+import tempfile
+import unittest
+
+import opuslib_next
+import opuslib_next.ogg
+
+
+def _read_pages(data):
+    pages = []
+    offset = 0
+    while offset < len(data):
+        (capture, version, flags, granule, serial, sequence, crc,
+         segments) = struct.unpack_from('<4sBBqIIIB', data, offset)
+        lacing = data[offset + 27:offset + 27 + segments]
+        size = 27 + segments + sum(lacing)
+        page = bytearray(data[offset:offset + size])
+        page[22:26] = bytes(4)
+        pages.append({
+            'capture': capture,
+            'flags': flags,
+            'granule': granule,
+            'serial': serial,
+            'sequence': sequence,
+            'crc_ok': crc == opuslib_next.ogg.crc32(page),
+            'lacing': bytes(lacing),
+            'body': data[offset + 27 + segments:offset + size],
+        })
+        offset += size
+    return pages
+
+
+def _read_packets(pages):
+    packets = []
+    pending = b''
+    for page in pages:
+        position = 0
+        for value in page['lacing']:
+            pending += page['body'][position:position + value]
+            position += value
+            if value < 255:
+                packets.append(pending)
+                pending = b''
+    return packets
+
+
+def _bytewise_crc(data):
+    crc = 0
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ (0x04C11DB7 if crc & 0x80000000 else 0))
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+class CrcTest(unittest.TestCase):
+
+    def test_check_value(self):
+        self.assertEqual(opuslib_next.ogg.crc32(b'123456789'), 0x89A1897F)
+        self.assertEqual(opuslib_next.ogg.crc32(b''), 0)
+
+    def test_slicing_matches_bytewise(self):
+        for length in (1, 7, 8, 9, 15, 16, 17, 100, 1001):
+            data = os.urandom(length)
+            self.assertEqual(
+                opuslib_next.ogg.crc32(data), _bytewise_crc(data))
+            self.assertEqual(
+                opuslib_next.ogg.crc32(memoryview(data)), _bytewise_crc(data))
+            self.assertEqual(
+                opuslib_next.ogg.crc32(data[3:], opuslib_next.ogg.crc32(
+                    data[:3])),
+                _bytewise_crc(data))
+
+    def test_page_checksums(self):
+        fileobj = io.BytesIO()
+        with opuslib_next.ogg.OggOpusWriter(
+                fileobj, 1, max_page_duration=960 * 3) as writer:
+            for size in range(100):
+                writer.write_packet(bytes([31 << 3]) + os.urandom(size * 7))
+        data = fileobj.getvalue()
+        pages = _read_pages(data)
+
+        offsets = []
+        sizes = []
+        offset = 0
+        for page in pages:
+            size = 27 + len(page['lacing']) + len(page['body'])
+            offsets.append(offset)
+            sizes.append(size)
+            offset += size
+        expected = [
+            struct.unpack_from('<I', data, offset + 22)[0]
+            for offset in offsets]
+
+        self.assertEqual(
+            list(opuslib_next.ogg.page_checksums(data, offsets, sizes)),
+            expected)
+
+
+class OggOpusWriterTest(unittest.TestCase):
+
+    def test_headers(self):
+        fileobj = io.BytesIO()
+        writer = opuslib_next.ogg.OggOpusWriter(
+            fileobj, 2, pre_skip=312, input_sample_rate=44100, serial=7,
+            tags={'TITLE': 'test'}, vendor='vendor')
+        writer.close()
+
+        pages = _read_pages(fileobj.getvalue())
+        self.assertEqual(len(pages), 3)
+        self.assertTrue(all(page['crc_ok'] for page in pages))
+        self.assertTrue(all(page['serial'] == 7 for page in pages))
+        self.assertEqual([page['sequence'] for page in pages], [0, 1, 2])
+        self.assertEqual(pages[0]['flags'], opuslib_next.ogg.HEADER_BOS)
+        self.assertEqual(pages[2]['flags'], opuslib_next.ogg.HEADER_EOS)
+
+        head, tags = _read_packets(pages)
+        self.assertEqual(
+            head, b'OpusHead' + struct.pack('<BBHIhB', 1, 2, 312, 44100, 0, 0))
+        self.assertEqual(
+            tags,
+            b'OpusTags' + struct.pack('<I', 6) + b'vendor' +
+            struct.pack('<II', 1, 10) + b'TITLE=test')
+
+    def test_encoder_defaults(self):
+        encoder = opuslib_next.Encoder(
+            16000, 1, opuslib_next.APPLICATION_AUDIO)
+        writer = opuslib_next.ogg.OggOpusWriter(io.BytesIO(), encoder=encoder)
+        self.assertEqual(writer.head.channels, 1)
+        self.assertEqual(writer.head.input_sample_rate, 16000)
+        self.assertEqual(writer.pre_skip, encoder.lookahead * 3)
+
+    def test_multistream_head(self):
+        encoder = opuslib_next.MultiStreamEncoder(
+            48000, 3, 2, 1, [0, 1, 2], opuslib_next.APPLICATION_AUDIO)
+        writer = opuslib_next.ogg.OggOpusWriter(io.BytesIO(), encoder=encoder)
+        self.assertEqual(writer.head.mapping_family, 1)
+        self.assertEqual(
+            writer.head.to_bytes()[19:], bytes([2, 1, 0, 1, 2]))
+
+    def test_granules_and_pages(self):
+        encoder = opuslib_next.Encoder(
+            48000, 2, opuslib_next.APPLICATION_AUDIO)
+        fileobj = io.BytesIO()
+        packets = [encoder.encode(bytes(960 * 4), 960) for _ in range(50)]
+        with opuslib_next.ogg.OggOpusWriter(
+                fileobj, encoder=encoder, max_page_duration=9600) as writer:
+            writer.write_packets(packets)
+
+        pages = _read_pages(fileobj.getvalue())
+        audio = pages[2:]
+        self.assertTrue(all(page['crc_ok'] for page in pages))
+        self.assertEqual(len(audio), 5)
+        self.assertEqual(
+            [page['granule'] for page in audio],
+            [9600, 19200, 28800, 38400, 48000])
+        self.assertEqual(audio[-1]['flags'], opuslib_next.ogg.HEADER_EOS)
+        self.assertEqual(_read_packets(pages)[2:], packets)
+
+    def test_end_trim(self):
+        fileobj = io.BytesIO()
+        writer = opuslib_next.ogg.OggOpusWriter(fileobj, 1, pre_skip=312)
+        for _ in range(3):
+            writer.write_packet(bytes([31 << 3, 0]))
+        writer.close(samples=2000)
+        self.assertEqual(_read_pages(fileobj.getvalue())[-1]['granule'], 2312)
+
+        writer = opuslib_next.ogg.OggOpusWriter(io.BytesIO(), 1)
+        writer.write_packet(bytes([31 << 3, 0]))
+        with self.assertRaises(ValueError):
+            writer.close(samples=960)
+
+    def test_flush_then_close(self):
+        fileobj = io.BytesIO()
+        writer = opuslib_next.ogg.OggOpusWriter(fileobj, 1, pre_skip=312)
+        for _ in range(3):
+            writer.write_packet(bytes([31 << 3, 0]))
+        writer.flush()
+        # The flushed page holds the final packet and cannot be trimmed
+        with self.assertRaises(ValueError):
+            writer.close(samples=2000)
+
+        # Trimming into the packets of the last page is still allowed
+        writer.write_packet(bytes([31 << 3, 0]))
+        writer.close(samples=3000)
+        granules = [
+            page['granule'] for page in _read_pages(fileobj.getvalue())[2:]]
+        self.assertEqual(granules, [2880, 3312])
+
+    def test_spanning_packet(self):
+        fileobj = io.BytesIO()
+        packet = bytes([31 << 3]) + bytes(range(256)) * 300
+        writer = opuslib_next.ogg.OggOpusWriter(
+            fileobj, 1, max_page_size=4096)
+        writer.write_packet(packet)
+        writer.write_packet(bytes([31 << 3, 1]))
+        writer.close()
+
+        pages = _read_pages(fileobj.getvalue())
+        self.assertTrue(all(page['crc_ok'] for page in pages))
+        self.assertEqual(pages[2]['granule'], opuslib_next.ogg.NO_GRANULE)
+        self.assertEqual(len(pages[2]['lacing']), 255)
+        self.assertTrue(pages[3]['flags'] & opuslib_next.ogg.HEADER_CONTINUED)
+        self.assertEqual(
+            _read_packets(pages)[2:], [packet, bytes([31 << 3, 1])])
+
+    def test_batched_writes(self):
+        class Recorder(io.BytesIO):
+            writes = 0
+
+            def write(self, data):
+                Recorder.writes += 1
+                return super().write(data)
+
+        fileobj = Recorder()
+        writer = opuslib_next.ogg.OggOpusWriter(
+            fileobj, 1, max_page_duration=960, buffer_size=1 << 20)
+        for _ in range(100):
+            writer.write_packet(bytes([31 << 3, 0]))
+        self.assertEqual(Recorder.writes, 0)
+        writer.close()
+        self.assertEqual(Recorder.writes, 1)
+        self.assertEqual(len(_read_pages(fileobj.getvalue())), 102)
+
+
+class OggOpusReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.opus')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, packets, **kwargs):
+        with open(self.path, 'wb') as fileobj:
+            with opuslib_next.ogg.OggOpusWriter(fileobj, **kwargs) as writer:
+                writer.write_packets(packets)
+
+    def test_roundtrip(self):
+        encoder = opuslib_next.Encoder(
+            48000, 2, opuslib_next.APPLICATION_AUDIO)
+        packets = [encoder.encode(bytes(960 * 4), 960) for _ in range(120)]
+        self.write(
+            packets, encoder=encoder, tags=[('ARTIST', 'a'), ('ARTIST', 'b')],
+            max_page_duration=4800)
+
+        with opuslib_next.ogg.OggOpusReader(self.path) as reader:
+            self.assertEqual(reader.channels, 2)
+            self.assertEqual(reader.pre_skip, encoder.lookahead)
+            self.assertEqual(reader.tags, [('ARTIST', 'a'), ('ARTIST', 'b')])
+            read = [(bytes(packet), granule) for packet, granule in reader]
+            self.assertEqual([packet for packet, _ in read], packets)
+            self.assertEqual(
+                [granule for _, granule in read],
+                [960 * (i + 1) for i in range(120)])
+
+            decoder = reader.decoder()
+            self.assertIsInstance(decoder, opuslib_next.Decoder)
+            self.assertEqual(
+                len(decoder.decode(bytes(read[0][0]), 960)), 960 * 4)
+
+    def test_end_trimmed_first_page(self):
+        # A single audio page, trimmed at the end
+        with open(self.path, 'wb') as fileobj:
+            writer = opuslib_next.ogg.OggOpusWriter(fileobj, 1, pre_skip=312)
+            writer.write_packets([bytes([31 << 3, 0])] * 3)
+            writer.close(samples=2000)
+        with opuslib_next.ogg.OggOpusReader(self.path) as reader:
+            self.assertEqual(
+                [granule for _, granule in reader], [960, 1920, 2312])
+
+    def test_zero_copy(self):
+        self.write([bytes([31 << 3, 1, 2])] * 3, channels=1)
+        with opuslib_next.ogg.OggOpusReader(self.path) as reader:
+            for packet, _ in reader:
+                self.assertIsInstance(packet, memoryview)
+                self.assertEqual(packet.obj, reader._mmap)
+                packet.release()
+
+    def test_spanning_packets(self):
+        large = bytes([31 << 3]) + os.urandom(70000)
+        packets = [bytes([31 << 3, 1]), large, bytes([31 << 3, 2])]
+        self.write(packets, channels=1)
+        with opuslib_next.ogg.OggOpusReader(self.path) as reader:
+            read = [bytes(packet) for packet, _ in reader]
+        self.assertEqual(read, packets)
+
+    def test_batches(self):
+        packets = [bytes([31 << 3, n]) for n in range(10)]
+        self.write(packets, channels=1, max_page_duration=2880)
+        with opuslib_next.ogg.OggOpusReader(self.path) as reader:
+            batches = list(reader.batches(max_packets=4))
+        self.assertEqual([len(batch) for batch, _ in batches], [4, 4, 2])
+        self.assertEqual(
+            [bytes(p) for batch, _ in batches for p in batch], packets)
+        self.assertEqual(list(batches[-1][1]), [960 * 9, 960 * 10])
+
+    def test_multistream_decoder(self):
+        encoder = opuslib_next.MultiStreamEncoder(
+            48000, 3, 2, 1, [0, 1, 2], opuslib_next.APPLICATION_AUDIO)
+        self.write(
+            [encoder.encode(bytes(960 * 6), 960)], encoder=encoder)
+        with opuslib_next.ogg.OggOpusReader(self.path) as reader:
+            self.assertEqual(reader.head.mapping, (0, 1, 2))
+            decoder = reader.decoder()
+            self.assertIsInstance(decoder, opuslib_next.MultiStreamDecoder)
+            packet, _ = next(iter(reader))
+            self.assertEqual(
+                len(decoder.decode(bytes(packet), 960)), 960 * 6)
+
+    def test_skips_other_streams_and_garbage(self):
+        other = io.BytesIO()
+        with opuslib_next.ogg.OggOpusWriter(other, 1, serial=1) as writer:
+            writer.write_packet(bytes([31 << 3, 9]))
+        mine = io.BytesIO()
+        with opuslib_next.ogg.OggOpusWriter(mine, 1, serial=2) as writer:
+            writer.write_packet(bytes([31 << 3, 7]))
+
+        with open(self.path, 'wb') as fileobj:
+            fileobj.write(b'junk' + mine.getvalue() + other.getvalue())
+
+        with opuslib_next.ogg.OggOpusReader(self.path) as reader:
+            self.assertEqual(reader.serial, 2)
+            self.assertEqual(
+                [bytes(packet) for packet, _ in reader],
+                [bytes([31 << 3, 7])])
+        with opuslib_next.ogg.OggOpusReader(self.path, serial=1) as reader:
+            self.assertEqual(
+                [bytes(packet) for packet, _ in reader],
+                [bytes([31 << 3, 9])])
+
+    def test_verify_modes(self):
+        packets = [bytes([31 << 3, n]) * 50 for n in range(20)]
+        self.write(packets, channels=1, max_page_duration=960 * 2)
+        with open(self.path, 'rb') as fileobj:
+            data = bytearray(fileobj.read())
+        pages = _read_pages(bytes(data))
+        # Corrupt the body of the third audio page (packets 4 and 5)
+        offset = sum(
+            27 + len(page['lacing']) + len(page['body'])
+            for page in pages[:4])
+        data[offset + 40] ^= 0xFF
+        with open(self.path, 'wb') as fileobj:
+            fileobj.write(data)
+
+        expected = packets[:4] + packets[6:]
+        for verify in (
+                opuslib_next.ogg.VERIFY_PAGE, opuslib_next.ogg.VERIFY_BULK):
+            with opuslib_next.ogg.OggOpusReader(
+                    self.path, verify=verify) as reader:
+                self.assertEqual(
+                    [bytes(packet) for packet, _ in reader], expected)
+                self.assertEqual(reader.corrupt_pages, {offset})
+
+        with opuslib_next.ogg.OggOpusReader(self.path) as reader:
+            self.assertEqual(len(list(reader)), 20)
+            self.assertEqual(reader.corrupt_pages, set())
+
+        with self.assertRaises(ValueError):
+            opuslib_next.ogg.OggOpusReader(self.path, verify='sometimes')
+
+    def test_lost_page_drops_partial_packet(self):
+        large = bytes([31 << 3]) + os.urandom(70000)
+        packets = [large, bytes([31 << 3, 2])]
+        self.write(packets, channels=1)
+        with open(self.path, 'rb') as fileobj:
+            data = bytearray(fileobj.read())
+        pages = _read_pages(bytes(data))
+        offset = sum(
+            27 + len(page['lacing']) + len(page['body'])
+            for page in pages[:2])
+        data[offset + 100] ^= 0xFF
+        with open(self.path, 'wb') as fileobj:
+            fileobj.write(data)
+
+        with opuslib_next.ogg.OggOpusReader(
+                self.path, verify=opuslib_next.ogg.VERIFY_PAGE) as reader:
+            self.assertEqual(
+                [bytes(packet) for packet, _ in reader], packets[1:])
+
+    def test_not_ogg(self):
+        with open(self.path, 'wb') as fileobj:
+            fileobj.write(b'not an ogg file')
+        with self.assertRaises(ValueError):
+            opuslib_next.ogg.OggOpusReader(self.path)
+
+    def test_head_roundtrip(self):
+        head = opuslib_next.ogg.OpusHead(
+            4, 312, 44100, -256, 1, 2, 2, [0, 1, 2, 3])
+        parsed = opuslib_next.ogg.OpusHead.from_bytes(head.to_bytes())
+        self.assertEqual(repr(parsed), repr(head))
+
+
+class SeekIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.path = tempfile.mkstemp(suffix='.opus')
+        os.close(handle)
+        encoder = opuslib_next.Encoder(
+            48000, 1, opuslib_next.APPLICATION_AUDIO)
+        cls.samples = 48000 * 3 - 500
+        pcm = array.array('h', (
+            int(8000 * math.sin(2 * math.pi * 440 * i / 48000))
+            for i in range(48000 * 3)))
+        with open(cls.path, 'wb') as fileobj:
+            with opuslib_next.ogg.OggOpusWriter(
+                    fileobj, encoder=encoder,
+                    max_page_duration=4800) as writer:
+                for start in range(0, len(pcm), 960):
+                    writer.write_packet(encoder.encode(
+                        pcm[start:start + 960].tobytes(), 960))
+                writer.close(samples=cls.samples)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.path)
+
+    def setUp(self):
+        self.reader = opuslib_next.ogg.OggOpusReader(self.path)
+
+    def tearDown(self):
+        self.reader.close()
+
+    def decode_all(self):
+        decoder = self.reader.decoder()
+        pcm = b''.join(
+            decoder.decode(bytes(packet), 5760) for packet, _ in self.reader)
+        return array.array('h', pcm)[self.reader.pre_skip:][:self.samples]
+
+    def test_build_and_lookup(self):
+        index = opuslib_next.ogg.SeekIndex.build(self.reader)
+        self.assertEqual(len(index), 30)
+        self.assertEqual(index.granules[0], 0)
+        self.assertEqual(list(index.granules[:3]), [0, 4800, 9600])
+        self.assertEqual(index.lookup(10000), (index.offsets[2], 9600))
+        self.assertEqual(index.lookup(-5), (index.offsets[0], 0))
+
+        sparse = opuslib_next.ogg.SeekIndex.build(self.reader, interval=48000)
+        self.assertEqual(list(sparse.granules), [0, 48000, 96000])
+
+    def test_save_load(self):
+        index = opuslib_next.ogg.SeekIndex.build(self.reader)
+        sidecar = self.path + '.idx'
+        try:
+            index.save(sidecar)
+            self.assertEqual(
+                os.path.getsize(sidecar), 24 + 16 * len(index))
+            loaded = opuslib_next.ogg.SeekIndex.load(sidecar)
+        finally:
+            os.remove(sidecar)
+        self.assertEqual(loaded.granules, index.granules)
+        self.assertEqual(loaded.offsets, index.offsets)
+        self.assertEqual(loaded.serial, self.reader.serial)
+
+        with self.assertRaises(ValueError):
+            opuslib_next.ogg.SeekIndex.from_bytes(b'garbage')
+
+    def test_mismatched_index(self):
+        index = opuslib_next.ogg.SeekIndex.build(self.reader)
+        index.serial ^= 1
+        with self.assertRaises(ValueError):
+            self.reader.seek(1000, index)
+
+    def test_seek_preroll(self):
+        index = opuslib_next.ogg.SeekIndex.build(self.reader)
+        offset, granule = self.reader.seek(48000, index)
+        self.assertLessEqual(
+            granule, 48000 + self.reader.pre_skip -
+            opuslib_next.ogg.SEEK_PREROLL)
+
+    def test_decode_from_start_is_exact(self):
+        pcm = array.array('h', b''.join(self.reader.decode_from(0)))
+        self.assertEqual(pcm, self.decode_all())
+
+    def test_decode_from(self):
+        reference = self.decode_all()
+        index = opuslib_next.ogg.SeekIndex.build(self.reader)
+        for sample in (12345, 96000, 139000):
+            pcm = array.array(
+                'h', b''.join(self.reader.decode_from(sample, index)))
+            self.assertEqual(len(pcm), self.samples - sample)
+            error = max(abs(a - b) for a, b in zip(pcm, reference[sample:]))
+            self.assertLess(error, 400)
+
+    def test_end_trimmed_first_page(self):
+        encoder = opuslib_next.Encoder(
+            48000, 1, opuslib_next.APPLICATION_AUDIO)
+        handle, path = tempfile.mkstemp(suffix='.opus')
+        os.close(handle)
+        try:
+            with open(path, 'wb') as fileobj:
+                writer = opuslib_next.ogg.OggOpusWriter(
+                    fileobj, 1, pre_skip=312)
+                for start in range(3):
+                    writer.write_packet(encoder.encode(
+                        array.array('h', (
+                            int(8000 * math.sin(0.05 * (start * 960 + i)))
+                            for i in range(960))).tobytes(), 960))
+                writer.close(samples=2000)
+            with opuslib_next.ogg.OggOpusReader(path) as reader:
+                index = opuslib_next.ogg.SeekIndex.build(reader)
+                self.assertEqual(list(index.granules), [0])
+                decoder = reader.decoder()
+                reference = b''.join(
+                    decoder.decode(bytes(packet), 960)
+                    for packet, _ in reader)[2 * 312:2 * 2312]
+                pcm = b''.join(reader.decode_from(0, index))
+        finally:
+            os.remove(path)
+        self.assertEqual(pcm, reference)
+
+    def test_decode_from_resampled(self):
+        pcm = b''.join(self.reader.decode_from(48000, fs=16000))
+        self.assertEqual(len(pcm) // 2, (self.samples - 48000) // 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,362 @@
+"""Tests for the pure-Python packet inspection helpers"""
+
+import array
+import math
+import random
+import unittest
+
+import opuslib_next
+import opuslib_next.api.decoder
+import opuslib_next.packet
+
+
+class ParseTocTest(unittest.TestCase):
+
+    def test_matches_libopus(self):
+        for toc in range(256):
+            packet = bytes([toc, 2, 0, 0])
+            info = opuslib_next.packet.parse_toc(packet)
+
+            self.assertEqual(
+                info.bandwidth,
+                opuslib_next.api.decoder.packet_get_bandwidth(packet))
+            self.assertEqual(
+                info.channels,
+                opuslib_next.api.decoder.packet_get_nb_channels(packet))
+            self.assertEqual(
+                info.frame_count,
+                opuslib_next.api.decoder.packet_get_nb_frames(packet))
+            for fs in (8000, 16000, 48000):
+                self.assertEqual(
+                    opuslib_next.packet.parse_toc(packet, fs).samples_per_frame,
+                    opuslib_next.api.decoder.packet_get_samples_per_frame(
+                        packet, fs))
+
+    def test_modes(self):
+        self.assertEqual(
+            opuslib_next.packet.parse_toc(bytes([0])).mode,
+            opuslib_next.packet.MODE_SILK_ONLY)
+        self.assertEqual(
+            opuslib_next.packet.parse_toc(bytes([15 << 3])).mode,
+            opuslib_next.packet.MODE_HYBRID)
+        self.assertEqual(
+            opuslib_next.packet.parse_toc(bytes([31 << 3])).mode,
+            opuslib_next.packet.MODE_CELT_ONLY)
+
+    def test_fields(self):
+        # CELT fullband 20 ms, stereo, code 3 with 3 frames
+        info = opuslib_next.packet.parse_toc(bytes([0xFF, 3]))
+        self.assertEqual(info.config, 31)
+        self.assertTrue(info.stereo)
+        self.assertEqual(info.code, 3)
+        self.assertEqual(info.frame_count, 3)
+        self.assertEqual(info.frame_duration, 20.0)
+        self.assertEqual(info.samples, 2880)
+        self.assertFalse(hasattr(info, '__dict__'))
+
+    def test_get_nb_samples(self):
+        self.assertEqual(opuslib_next.packet.get_nb_samples(bytes([0xF8])), 960)
+        self.assertEqual(
+            opuslib_next.packet.get_nb_samples(bytes([0xFF, 3])), 2880)
+        self.assertEqual(
+            opuslib_next.packet.get_nb_samples(bytes([0xF9]), 16000), 640)
+
+    def test_invalid_packets(self):
+        for packet, code in (
+                (b'', opuslib_next.BAD_ARG),
+                (bytes([3]), opuslib_next.INVALID_PACKET),
+                (bytes([3, 0]), opuslib_next.INVALID_PACKET),
+                # 7 frames of 20 ms exceed 120 ms
+                (bytes([0xFB, 7]), opuslib_next.INVALID_PACKET)):
+            with self.assertRaises(opuslib_next.OpusError) as context:
+                opuslib_next.packet.parse_toc(packet)
+            self.assertEqual(context.exception.code, code)
+
+
+class ParseTest(unittest.TestCase):
+
+    def assert_matches_libopus(self, packet):
+        try:
+            expected = opuslib_next.api.decoder.packet_parse(packet)
+        except opuslib_next.OpusError:
+            with self.assertRaises(opuslib_next.OpusError):
+                opuslib_next.packet.parse(packet)
+            return
+
+        parsed = opuslib_next.packet.parse(packet)
+        self.assertEqual(
+            (parsed.toc, parsed.frame_offsets, parsed.frame_sizes,
+             parsed.payload_offset),
+            expected)
+        for offset, frame in zip(parsed.frame_offsets, parsed.frames):
+            self.assertEqual(
+                bytes(frame), packet[offset:offset + len(frame)])
+
+    def test_encoded_packets(self):
+        encoder = opuslib_next.Encoder(48000, 2, 'audio')
+        for _ in range(5):
+            self.assert_matches_libopus(encoder.encode(bytes(3840), 960))
+
+    def test_framing_codes(self):
+        for packet in (
+                bytes([0xF8, 1, 2, 3]),
+                bytes([0xF9, 1, 2, 3, 4]),
+                bytes([0xF9, 1, 2, 3]),
+                bytes([0xFA, 1, 9, 8, 7]),
+                bytes([0xFA, 252, 1, 0]),
+                # CBR code 3 with two bytes of padding
+                bytes([0xFB, 0x43, 2, 1, 2, 3, 4, 5, 6, 7, 8]),
+                # VBR code 3: sizes 1 and 2, last frame takes the rest
+                bytes([0xFB, 0x83, 1, 2, 9, 8, 8, 7, 7, 7]),
+                bytes([0xFB, 0x83, 1, 9, 9]),
+                bytes([0xFB, 0x40, 0])):
+            self.assert_matches_libopus(packet)
+
+    def test_fuzz_against_libopus(self):
+        generator = random.Random(1234)
+        for _ in range(2000):
+            size = generator.randrange(1, 24)
+            packet = bytes(generator.randrange(256) for _ in range(size))
+            self.assert_matches_libopus(packet)
+
+    def test_padding_and_length(self):
+        packet = bytes([0xFB, 0x43, 2, 1, 2, 3, 4, 5, 6, 7, 8])
+        parsed = opuslib_next.packet.parse(packet)
+        self.assertEqual(parsed.padding, 2)
+        self.assertEqual(parsed.length, len(packet))
+        self.assertEqual(parsed.info.frame_count, 3)
+
+    def test_frames_are_views(self):
+        packet = bytearray([0xF9, 1, 2, 3, 4])
+        parsed = opuslib_next.packet.parse(packet)
+        packet[1] = 42
+        self.assertEqual(parsed.frames[0][0], 42)
+
+    def test_self_delimited(self):
+        # Code 0 frame of 2 bytes followed by the next packet
+        data = bytes([0xF8, 2, 7, 7, 0xF8, 9])
+        parsed = opuslib_next.packet.parse(data, self_delimited=True)
+        self.assertEqual(parsed.length, 4)
+        self.assertEqual(bytes(parsed.frames[0]), b'\x07\x07')
+
+
+class PacketBatchTest(unittest.TestCase):
+
+    def test_batch(self):
+        packets = [bytes([0xF8, 1]), bytes([0xF9, 1, 2]), bytes([0xF8])]
+        batch = opuslib_next.packet.PacketBatch.from_packets(packets)
+
+        self.assertEqual(len(batch), 3)
+        self.assertEqual([bytes(item) for item in batch], packets)
+        self.assertEqual(bytes(batch[-1]), packets[-1])
+        self.assertEqual(batch.sizes, [2, 3, 1])
+
+        parsed = opuslib_next.packet.parse_batch(batch)
+        self.assertEqual(
+            [item.frame_sizes for item in parsed], [(1,), (1, 1), (0,)])
+
+
+class PaddingTest(unittest.TestCase):
+
+    def setUp(self):
+        encoder = opuslib_next.Encoder(48000, 1, 'voip')
+        encoder.bitrate = 16000
+        self.packets = [encoder.encode(bytes(1920), 960) for _ in range(4)]
+
+    def test_pad_and_unpad(self):
+        packet = self.packets[0]
+        padded = opuslib_next.packet.pad(packet, 200)
+
+        self.assertEqual(len(padded), 200)
+        self.assertGreater(opuslib_next.packet.parse(padded).padding, 0)
+        self.assertEqual(
+            [bytes(frame) for frame in opuslib_next.packet.parse(padded).frames],
+            [bytes(frame) for frame in opuslib_next.packet.parse(packet).frames])
+        self.assertLessEqual(
+            len(opuslib_next.packet.unpad(padded)), len(packet))
+
+        decoder = opuslib_next.Decoder(48000, 1)
+        self.assertEqual(len(decoder.decode(padded, 960)), 1920)
+
+        with self.assertRaises(opuslib_next.OpusError) as context:
+            opuslib_next.packet.pad(packet, len(packet) - 1)
+        self.assertEqual(context.exception.code, opuslib_next.BAD_ARG)
+
+    def test_in_place(self):
+        packet = self.packets[0]
+        buffer = bytearray(128)
+        buffer[:len(packet)] = packet
+
+        opuslib_next.packet.pad_into(buffer, len(packet))
+        self.assertEqual(opuslib_next.packet.parse(buffer).length, 128)
+
+        length = opuslib_next.packet.unpad_into(buffer)
+        self.assertEqual(opuslib_next.packet.parse(buffer[:length]).padding, 0)
+
+    def test_multistream(self):
+        try:
+            encoder = opuslib_next.MultiStreamEncoder(
+                48000, 2, 2, 0, [0, 1], 'audio')
+        except opuslib_next.OpusError as exc:
+            if exc.code == opuslib_next.UNIMPLEMENTED:
+                self.skipTest('libopus does not expose multistream APIs')
+            raise
+        packet = encoder.encode(bytes(3840), 960)
+
+        padded = opuslib_next.packet.multistream_pad(packet, 300, 2)
+        self.assertEqual(len(padded), 300)
+        unpadded = opuslib_next.packet.multistream_unpad(padded, 2)
+        self.assertLessEqual(len(unpadded), len(packet))
+
+        buffer = bytearray(padded)
+        self.assertEqual(
+            opuslib_next.packet.multistream_unpad_into(buffer, 2),
+            len(unpadded))
+
+        decoder = opuslib_next.MultiStreamDecoder(48000, 2, 2, 0, [0, 1])
+        self.assertEqual(len(decoder.decode(padded, 960)), 3840)
+
+    def test_batches(self):
+        batch = opuslib_next.packet.PacketBatch.from_packets(self.packets)
+
+        padded = opuslib_next.packet.pad_batch(batch, 100)
+        self.assertEqual(padded.sizes, [100] * 4)
+
+        unpadded = opuslib_next.packet.unpad_batch(padded)
+        self.assertEqual(
+            [bytes(packet) for packet in unpadded],
+            [opuslib_next.packet.unpad(packet) for packet in self.packets])
+
+
+class SamplePositionsTest(unittest.TestCase):
+
+    def setUp(self):
+        generator = random.Random(7)
+        tocs = [toc for toc in range(256) if toc & 0x3 != 3]
+        packets = [bytes([generator.choice(tocs), 0]) for _ in range(500)]
+        packets.append(bytes([0xFB, 0x03, 0]))
+        self.batch = opuslib_next.packet.PacketBatch.from_packets(packets)
+        self.expected = [0]
+        for packet in packets:
+            self.expected.append(
+                self.expected[-1] +
+                opuslib_next.packet.parse_toc(packet).samples)
+
+    def test_pure_python(self):
+        positions = opuslib_next.packet.sample_positions(
+            self.batch, use_numpy=False)
+        self.assertEqual(positions.typecode, 'Q')
+        self.assertEqual(list(positions), self.expected)
+
+        positions = opuslib_next.packet.sample_positions(
+            self.batch.data, self.batch.offsets, fs=16000, use_numpy=False)
+        self.assertEqual(
+            list(positions), [value // 3 for value in self.expected])
+
+    def test_numpy(self):
+        try:
+            import numpy  # noqa: F401 pylint: disable=unused-import
+        except ImportError:
+            self.skipTest('NumPy is not installed')
+        positions = opuslib_next.packet.sample_positions(
+            self.batch, use_numpy=True)
+        self.assertEqual(positions.tolist(), self.expected)
+
+    def test_invalid(self):
+        for use_numpy in (False, None):
+            for packet in (b'', bytes([0x03]), bytes([0x1B, 0x07])):
+                batch = opuslib_next.packet.PacketBatch.from_packets(
+                    [bytes([0xF8]), packet])
+                with self.assertRaises(opuslib_next.OpusError):
+                    opuslib_next.packet.sample_positions(
+                        batch, use_numpy=use_numpy)
+
+
+class MultiStreamSplitTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            self.encoder = opuslib_next.MultiStreamEncoder(
+                48000, 3, 2, 1, [0, 1, 2], 'audio')
+        except opuslib_next.OpusError as exc:
+            if exc.code == opuslib_next.UNIMPLEMENTED:
+                self.skipTest('libopus does not expose multistream APIs')
+            raise
+        self.encoder.bitrate = 128000
+        pcm = array.array('h', (
+            int(8000 * math.sin(i / (10.0 + i % 3)))
+            for i in range(960 * 3)))
+        self.packets = [
+            self.encoder.encode(pcm.tobytes(), 960) for _ in range(3)]
+
+    def test_split_and_assemble(self):
+        for packet in self.packets:
+            streams = opuslib_next.packet.split_multistream(packet, 2)
+            self.assertEqual(len(streams), 2)
+            self.assertEqual(
+                opuslib_next.packet.parse_toc(streams[0]).channels, 2)
+            self.assertEqual(
+                opuslib_next.packet.parse_toc(streams[1]).channels, 1)
+            self.assertEqual(
+                opuslib_next.packet.assemble_multistream(streams), packet)
+
+    def test_selected_stream_decodes(self):
+        front = opuslib_next.Decoder(48000, 2)
+        reference = opuslib_next.MultiStreamDecoder(
+            48000, 2, 2, 1, [0, 1])
+        for packet in self.packets:
+            stream, = opuslib_next.packet.split_multistream(
+                packet, 2, select=(0,))
+            self.assertEqual(
+                front.decode(stream, 960), reference.decode(packet, 960))
+
+    def test_parse_multistream_is_zero_copy(self):
+        packet = bytearray(self.packets[0])
+        parsed = opuslib_next.packet.parse_multistream(packet, 2)
+        self.assertEqual(len(parsed), 2)
+        self.assertEqual(
+            sum(item.length for item in parsed), len(packet))
+        self.assertIsInstance(parsed[0].frames[0], memoryview)
+
+
+class ValidateTest(unittest.TestCase):
+
+    def test_agrees_with_libopus(self):
+        generator = random.Random(99)
+        packets = [bytes(generator.randrange(256) for _ in range(size))
+                   for size in (generator.randrange(0, 16)
+                                for _ in range(3000))]
+        packets.append(bytes([0xF8]) + bytes(1276))
+        packets.append(bytes([0xFA, 253, 200]) + bytes(1020))
+        for packet in packets:
+            reason = opuslib_next.packet.validate(packet)
+            try:
+                opuslib_next.api.decoder.packet_parse(packet)
+            except opuslib_next.OpusError:
+                self.assertNotEqual(reason, opuslib_next.packet.VALID, packet)
+            else:
+                self.assertEqual(reason, opuslib_next.packet.VALID, packet)
+
+    def test_reasons(self):
+        packet = opuslib_next.packet
+        for data, reason in (
+                (b'', packet.INVALID_EMPTY),
+                (bytes([0xF8]) + bytes(1276), packet.INVALID_FRAME_LENGTH),
+                (bytes([0xF9, 1, 2, 3]), packet.INVALID_CODE1_LENGTH),
+                (bytes([0xFA, 5, 1]), packet.INVALID_CODE2_LENGTH),
+                (bytes([0xFB]), packet.INVALID_FRAME_COUNT),
+                (bytes([0xFB, 0x00]), packet.INVALID_FRAME_COUNT),
+                (bytes([0xFB, 0x02, 1, 2, 3]), packet.INVALID_CBR_LENGTH),
+                (bytes([0xFB, 0x41, 9, 1]), packet.INVALID_CBR_LENGTH),
+                (bytes([0xFB, 0x82, 9, 1]), packet.INVALID_VBR_LENGTH),
+                (bytes([0xFB, 0x82, 1, 1, 2]), packet.VALID)):
+            self.assertEqual(packet.validate(data), reason, data)
+            self.assertTrue(packet.VALIDATION_REASONS[reason])
+
+    def test_batch(self):
+        batch = opuslib_next.packet.PacketBatch.from_packets(
+            [bytes([0xF8, 1]), b'', bytes([0xF9, 1, 2, 3])])
+        self.assertEqual(
+            list(opuslib_next.packet.validate_batch(batch)),
+            [opuslib_next.packet.VALID, opuslib_next.packet.INVALID_EMPTY,
+             opuslib_next.packet.INVALID_CODE1_LENGTH])
@@ -0,0 +1,111 @@
+"""Tests for the parallel chunked encoder"""
+
+import array
+import concurrent.futures
+import math
+import unittest
+
+import opuslib_next
+import opuslib_next.parallel
+
+
+FS = 48000
+CHANNELS = 2
+FRAME_SIZE = 960
+
+
+def make_pcm(seconds):
+    pcm = array.array('h')
+    for i in range(int(FS * seconds)):
+        value = int(
+            8000 * math.sin(2 * math.pi * 440 * i / FS) +
+            4000 * math.sin(2 * math.pi * 1234 * i / FS)
+        )
+        pcm.extend((value, value))
+    return pcm.tobytes()
+
+
+def decode_all(packets):
+    decoder = opuslib_next.Decoder(FS, CHANNELS)
+    return array.array(
+        'h', b''.join(decoder.decode(packet, FRAME_SIZE) for packet in packets))
+
+
+class ChunkedEncoderTest(unittest.TestCase):
+
+    def test_preroll_covers_lookahead(self):
+        encoder = opuslib_next.parallel.ChunkedEncoder(
+            FS, CHANNELS, 'audio', FRAME_SIZE)
+        self.assertGreaterEqual(
+            encoder.preroll_frames * FRAME_SIZE, encoder.lookahead)
+
+        with self.assertRaises(ValueError):
+            opuslib_next.parallel.ChunkedEncoder(
+                FS, CHANNELS, 'audio', 2880, preroll_frames=0)
+
+    def test_matches_serial_encode(self):
+        pcm = make_pcm(1.01)
+        frame_bytes = FRAME_SIZE * CHANNELS * 2
+
+        serial_encoder = opuslib_next.Encoder(FS, CHANNELS, 'audio')
+        serial = []
+        for offset in range(0, len(pcm), frame_bytes):
+            frame = pcm[offset:offset + frame_bytes]
+            frame += b'\x00' * (frame_bytes - len(frame))
+            serial.append(serial_encoder.encode(frame, FRAME_SIZE))
+
+        encoder = opuslib_next.parallel.ChunkedEncoder(
+            FS, CHANNELS, 'audio', FRAME_SIZE, chunk_frames=10, max_workers=2)
+        packets = encoder.encode(pcm)
+
+        self.assertEqual(len(packets), len(serial))
+
+        expected = decode_all(serial)
+        decoded = decode_all(packets)
+        self.assertEqual(len(decoded), len(expected))
+
+        signal = sum(sample * sample for sample in expected)
+        error = sum((a - b) ** 2 for a, b in zip(decoded, expected))
+        # Chunk boundaries must not introduce audible discontinuities
+        self.assertLess(error, signal / 1000)
+
+    def test_custom_executor_and_ctls(self):
+        pcm = make_pcm(0.2)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            encoder = opuslib_next.parallel.ChunkedEncoder(
+                FS, CHANNELS, 'audio', FRAME_SIZE, chunk_frames=3,
+                executor=executor, bitrate=32000)
+            packets = encoder.encode(pcm)
+
+        self.assertEqual(len(packets), 10)
+
+    def test_bounded_in_flight(self):
+        pcm = make_pcm(0.5)
+
+        class Executor(concurrent.futures.ThreadPoolExecutor):
+            in_flight = peak = 0
+
+            def submit(self, fn, *args):
+                Executor.in_flight += 1
+                Executor.peak = max(Executor.peak, Executor.in_flight)
+                future = super().submit(fn, *args)
+                future.add_done_callback(lambda _: self._done())
+                return future
+
+            @staticmethod
+            def _done():
+                Executor.in_flight -= 1
+
+        with Executor(1) as executor:
+            encoder = opuslib_next.parallel.ChunkedEncoder(
+                FS, CHANNELS, 'audio', FRAME_SIZE, chunk_frames=2,
+                max_workers=1, executor=executor)
+            packets = encoder.encode(pcm)
+
+        self.assertEqual(len(packets), 25)
+        self.assertLessEqual(
+            Executor.peak, opuslib_next.parallel.IN_FLIGHT_PER_WORKER + 1)
+
+    def test_empty_input(self):
+        encoder = opuslib_next.parallel.ChunkedEncoder(FS, CHANNELS, 'audio')
+        self.assertEqual(encoder.encode(b''), [])
@@ -0,0 +1,110 @@
+"""Tests for the sharded multiprocess codec pool"""
+
+import unittest
+
+import opuslib_next
+import opuslib_next.pool
+
+
+FS = 48000
+CHANNELS = 1
+FRAME_SIZE = 960
+PCM = b'\x00' * FRAME_SIZE * CHANNELS * 2
+
+
+class HashRingTest(unittest.TestCase):
+
+    def test_lookup_is_stable_and_spread(self):
+        ring = opuslib_next.pool.HashRing(4)
+        owners = [ring.lookup('stream-{}'.format(i)) for i in range(400)]
+
+        self.assertEqual(
+            owners, [ring.lookup('stream-{}'.format(i)) for i in range(400)])
+        self.assertEqual(set(owners), {0, 1, 2, 3})
+
+    def test_adding_a_node_moves_few_streams(self):
+        before = opuslib_next.pool.HashRing(4)
+        after = opuslib_next.pool.HashRing(5)
+        moved = sum(
+            before.lookup(i) != after.lookup(i) for i in range(1000))
+        self.assertLess(moved, 400)
+
+
+class ShardedPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = opuslib_next.pool.ShardedPool(workers=2, slots=4)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_encode_decode(self):
+        self.pool.open_encoder('enc', FS, CHANNELS, 'voip', bitrate=24000)
+        self.pool.open_decoder('dec', FS, CHANNELS)
+
+        packet = self.pool.encode('enc', PCM, FRAME_SIZE)
+        self.assertGreater(len(packet), 0)
+        self.assertEqual(
+            len(self.pool.decode('dec', packet, FRAME_SIZE)), len(PCM))
+
+    def test_batch_across_streams(self):
+        streams = ['s{}'.format(i) for i in range(8)]
+        for stream_id in streams:
+            self.pool.open_encoder(stream_id, FS, CHANNELS, 'voip')
+
+        # More requests per worker than there are slots
+        packets = self.pool.process(
+            [(stream_id, PCM, FRAME_SIZE) for stream_id in streams * 3])
+        self.assertEqual(len(packets), 24)
+        self.assertTrue(all(packets))
+
+        stats = self.pool.stats()
+        self.assertEqual(sum(item['streams'] for item in stats), 8)
+        self.assertEqual(
+            sum(item['bytes_in'] for item in stats), 24 * len(PCM))
+
+    def test_errors_are_raised(self):
+        self.pool.open_decoder('dec', FS, CHANNELS)
+        with self.assertRaises(opuslib_next.OpusError):
+            self.pool.decode('dec', bytes([255, 49]) + bytes(49), FRAME_SIZE)
+
+        with self.assertRaises(ValueError):
+            self.pool.decode('dec', bytes(1 << 17), FRAME_SIZE)
+
+        # The pool is still usable afterwards
+        self.pool.decode('dec', bytes([252, 0, 0]), FRAME_SIZE)
+
+    def test_dead_worker_releases_slots(self):
+        self.pool.open_encoder('enc', FS, CHANNELS, 'voip')
+        worker = self.pool._workers[self.pool.worker_for('enc')]
+        slots = len(worker.free)
+
+        class DeadConnection(object):
+            def send(self, message):
+                pass
+
+            def recv(self):
+                raise EOFError
+
+        # Requests are sent, then the worker dies before replying
+        connection, worker.conn = worker.conn, DeadConnection()
+        try:
+            with self.assertRaises(opuslib_next.pool.WorkerError):
+                self.pool.process([('enc', PCM, FRAME_SIZE)] * 6)
+        finally:
+            worker.conn = connection
+        self.assertEqual(len(worker.free), slots)
+        self.assertFalse(worker.pending)
+
+    def test_restart_rebuilds_streams(self):
+        self.pool.open_encoder('enc', FS, CHANNELS, 'voip')
+        self.pool.set_ctl('enc', 'complexity', 3)
+        index = self.pool.worker_for('enc')
+
+        worker = self.pool._workers[index]
+        worker.process.terminate()
+        worker.process.join()
+
+        self.assertEqual(self.pool.check_workers(), [index])
+        self.assertGreater(len(self.pool.encode('enc', PCM, FRAME_SIZE)), 0)
+        self.assertEqual(self.pool.stats()[index]['restarts'], 1)
@@ -0,0 +1,165 @@
+"""Tests for the Opus RTP payloader and depayloader"""
+
+import struct
+import unittest
+
+import opuslib_next
+import opuslib_next.packet
+import opuslib_next.rtp
+
+# CELT fullband 20 ms, code 0
+FRAME = bytes([31 << 3]) + bytes(range(40))
+DTX = bytes([31 << 3])
+
+
+def _header(datagram):
+    return struct.unpack_from('>BBHII', datagram)
+
+
+class PayloaderTest(unittest.TestCase):
+
+    def test_header(self):
+        payloader = opuslib_next.rtp.Payloader(
+            ssrc=0xDEADBEEF, payload_type=96, sequence=10, timestamp=1000)
+        datagram = payloader.payload(FRAME)
+        self.assertEqual(
+            _header(datagram), (0x80, 96, 10, 1000, 0xDEADBEEF))
+        self.assertEqual(bytes(datagram[12:]), FRAME)
+        self.assertEqual(payloader.sequence, 11)
+        self.assertEqual(payloader.timestamp, 1960)
+
+    def test_toc_durations_and_wrap(self):
+        payloader = opuslib_next.rtp.Payloader(
+            ssrc=1, sequence=0xFFFF, timestamp=0xFFFFFFFF - 100)
+        payloader.payload(FRAME)
+        # Code 3 packet of three 20 ms frames
+        second = payloader.payload(bytes([(31 << 3) | 3, 3, 0, 0, 0]))
+        self.assertEqual(_header(second)[2:4], (0, 859))
+        self.assertEqual(payloader.timestamp, 859 + 2880)
+
+    def test_marker_after_dtx(self):
+        payloader = opuslib_next.rtp.Payloader(ssrc=1)
+        markers = [
+            bool(payloader.payload(packet)[1] & 0x80)
+            for packet in (FRAME, DTX, DTX, FRAME, FRAME, DTX, FRAME)]
+        self.assertEqual(
+            markers, [False, False, False, True, False, False, True])
+
+    def test_advance(self):
+        payloader = opuslib_next.rtp.Payloader(
+            ssrc=1, sequence=5, timestamp=0xFFFFFFFF - 959)
+        payloader.payload(FRAME)
+        payloader.advance(2 * 960)
+        datagram = payloader.payload(FRAME)
+        self.assertEqual(_header(datagram)[1:4], (0x80 | 111, 6, 1920))
+
+    def test_payload_into(self):
+        payloader = opuslib_next.rtp.Payloader(ssrc=1, sequence=0)
+        buffer = bytearray(1500)
+        size = payloader.payload_into(FRAME, buffer, 100)
+        self.assertEqual(size, 12 + len(FRAME))
+        self.assertEqual(_header(buffer[100:])[2], 0)
+        self.assertEqual(bytes(buffer[112:100 + size]), FRAME)
+
+    def test_batch(self):
+        packets = [FRAME, DTX, FRAME[:20], bytes([0xFB, 2, 1, 2]), FRAME] * 40
+        expected = opuslib_next.rtp.Payloader(
+            ssrc=7, sequence=65000, timestamp=0xFFFFF000)
+        single = [bytes(expected.payload(packet)) for packet in packets]
+        following = bytes(expected.payload(FRAME))
+
+        modes = [False]
+        try:
+            import numpy  # noqa: F401
+            modes.append(True)
+        except ImportError:
+            pass
+        for use_numpy in modes:
+            payloader = opuslib_next.rtp.Payloader(
+                ssrc=7, sequence=65000, timestamp=0xFFFFF000)
+            batch = payloader.payload_batch(
+                opuslib_next.packet.PacketBatch.from_packets(packets),
+                use_numpy=use_numpy)
+            self.assertEqual([bytes(datagram) for datagram in batch], single)
+            # State carries over, including the marker after a DTX tail
+            self.assertEqual(bytes(payloader.payload(FRAME)), following)
+
+
+    def test_batch_invalid_packets(self):
+        modes = [False]
+        try:
+            import numpy  # noqa: F401
+            modes.append(True)
+        except ImportError:
+            pass
+        # Empty, and code 3 without its frame count byte
+        for bad in (b'', bytes([0xFB])):
+            packets = [FRAME] * 3 + [bad] + [FRAME] * 200
+            with self.assertRaises(opuslib_next.OpusError) as single:
+                opuslib_next.rtp.Payloader(ssrc=1).payload(bad)
+            for use_numpy in modes:
+                with self.assertRaises(opuslib_next.OpusError) as batch:
+                    opuslib_next.rtp.Payloader(ssrc=1).payload_batch(
+                        packets, use_numpy=use_numpy)
+                self.assertEqual(
+                    batch.exception.code, single.exception.code)
+
+
+class DepayloaderTest(unittest.TestCase):
+
+    def test_roundtrip(self):
+        payloader = opuslib_next.rtp.Payloader(ssrc=5, sequence=3)
+        depayloader = opuslib_next.rtp.Depayloader()
+        packets = depayloader.depayload_batch(
+            payloader.payload(packet) for packet in (FRAME, DTX, FRAME))
+        self.assertEqual(
+            [bytes(packet.payload) for packet in packets], [FRAME, DTX, FRAME])
+        self.assertEqual([packet.sequence for packet in packets], [3, 4, 5])
+        self.assertEqual(
+            [packet.marker for packet in packets], [False, False, True])
+        self.assertIsInstance(packets[0].payload, memoryview)
+        self.assertEqual(packets[0].ssrc, 5)
+        self.assertEqual(depayloader.received, 3)
+
+    def test_csrc_extension_and_padding(self):
+        datagram = (
+            struct.pack('>BBHII', 0x80 | 0x20 | 0x10 | 2, 111, 1, 2, 3) +
+            bytes(8) +                          # two CSRCs
+            struct.pack('>HH', 0xBEDE, 1) + bytes(4) +   # extension
+            FRAME + bytes([0, 0, 3]))           # three bytes of padding
+        packet = opuslib_next.rtp.Depayloader().depayload(datagram)
+        self.assertEqual(bytes(packet.payload), FRAME)
+
+    def test_truncated_extension(self):
+        depayloader = opuslib_next.rtp.Depayloader()
+        datagram = struct.pack('>BBHII', 0x90, 111, 1, 2, 3) + b'\xbe'
+        self.assertIsNone(depayloader.depayload(datagram))
+        self.assertEqual(depayloader.invalid, 1)
+
+    def test_invalid_and_filtered(self):
+        depayloader = opuslib_next.rtp.Depayloader(ssrc=1, payload_type=111)
+        datagrams = [
+            b'short',
+            struct.pack('>BBHII', 0x40, 111, 0, 0, 1) + FRAME,
+            struct.pack('>BBHII', 0x80, 111, 0, 0, 2) + FRAME,
+            struct.pack('>BBHII', 0x80, 0, 0, 0, 1) + FRAME,
+            struct.pack('>BBHII', 0x80, 111, 0, 0, 1),
+            struct.pack('>BBHII', 0x80, 111, 0, 0, 1) + FRAME,
+        ]
+        packets = depayloader.depayload_batch(datagrams)
+        self.assertEqual(len(packets), 1)
+        self.assertEqual(depayloader.invalid, 3)
+        self.assertEqual(depayloader.filtered, 2)
+
+    def test_extended_sequence(self):
+        depayloader = opuslib_next.rtp.Depayloader()
+        extended = []
+        for sequence in (65533, 65535, 65534, 0, 1, 65535, 2):
+            datagram = struct.pack('>BBHII', 0x80, 111, sequence, 0, 1) + FRAME
+            extended.append(depayloader.depayload(datagram).extended_sequence)
+        self.assertEqual(
+            extended, [65533, 65535, 65534, 65536, 65537, 65535, 65538])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""Tests for the network impairment simulator"""
+
+import array
+import math
+import unittest
+
+import opuslib_next
+import opuslib_next.sim
+
+
+class LossModelTest(unittest.TestCase):
+
+    def test_bernoulli(self):
+        first = opuslib_next.sim.BernoulliLoss(0.1, seed=3)
+        second = opuslib_next.sim.BernoulliLoss(0.1, seed=3)
+        draws = [first.lost() for _ in range(20000)]
+        self.assertEqual(draws, [second.lost() for _ in range(20000)])
+        self.assertAlmostEqual(sum(draws) / len(draws), 0.1, delta=0.01)
+        self.assertRaises(ValueError, opuslib_next.sim.BernoulliLoss, 1.5)
+
+    def test_gilbert_elliott(self):
+        model = opuslib_next.sim.GilbertElliottLoss.from_rate(0.05, 4, seed=5)
+        self.assertAlmostEqual(model.rate, 0.05)
+        draws = [model.lost() for _ in range(100000)]
+        self.assertAlmostEqual(sum(draws) / len(draws), 0.05, delta=0.01)
+
+        bursts = []
+        run = 0
+        for lost in draws + [False]:
+            if lost:
+                run += 1
+            elif run:
+                bursts.append(run)
+                run = 0
+        self.assertAlmostEqual(sum(bursts) / len(bursts), 4, delta=0.4)
+
+
+class NetworkTest(unittest.TestCase):
+
+    def test_transmit(self):
+        network = opuslib_next.sim.Network(
+            loss=opuslib_next.sim.BernoulliLoss(0.2, seed=1),
+            delay=100, jitter=500, reorder=0.1, reorder_delay=2000, seed=2)
+        arrivals = network.transmit(range(0, 960 * 1000, 960))
+        self.assertLess(len(arrivals), 900)
+        self.assertEqual(arrivals, sorted(arrivals))
+        late = 0
+        for arrival, index in arrivals:
+            delay = arrival - index * 960
+            self.assertGreaterEqual(delay, 100)
+            self.assertLessEqual(delay, 100 + 500 + 2000)
+            late += delay > 600
+        self.assertGreater(late, 40)
+
+        # Packets overtake each other
+        indexes = [index for _, index in arrivals]
+        self.assertNotEqual(indexes, sorted(indexes))
+
+    def test_lossless(self):
+        arrivals = opuslib_next.sim.Network(delay=10).transmit([0, 960])
+        self.assertEqual(arrivals, [(10, 0), (970, 1)])
+
+
+class SimulateTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pcm = array.array('h', (
+            int(8000 * math.sin(i * 0.05)) for i in range(48000))).tobytes()
+
+    def test_clean_network(self):
+        result = opuslib_next.sim.simulate(
+            self.pcm, opuslib_next.sim.Network(delay=480), keep_pcm=True)
+        self.assertEqual(result.frames, 50)
+        self.assertEqual(
+            (result.network_lost, result.lost, result.concealed), (0, 0, 0))
+        self.assertEqual(result.concealed_ratio, 0.0)
+        self.assertGreater(result.bitrate, 0)
+        self.assertGreater(result.send_cpu_per_frame, 0)
+        # Lead-in silence over the transit and minimum delay, then the stream
+        self.assertEqual(len(result.pcm), len(self.pcm) + 2 * 2 * 960)
+
+    def test_expansion_is_not_concealment(self):
+        # Without loss, only the packets arriving too late are concealed
+        result = opuslib_next.sim.simulate(
+            self.pcm, opuslib_next.sim.Network(delay=480, jitter=1920, seed=1))
+        self.assertEqual(result.network_lost, 0)
+        self.assertGreater(result.expanded, 0)
+        self.assertEqual(result.concealed, result.late)
+        self.assertEqual(
+            result.concealed_ratio, result.late / result.ticks)
+        self.assertEqual(result.duration, 960)
+        self.assertAlmostEqual(
+            result.bitrate, result.bytes * 8 * 50 / result.frames)
+
+    def test_frame_duration(self):
+        result = opuslib_next.sim.simulate(
+            self.pcm, opuslib_next.sim.Network(delay=480), keep_pcm=True,
+            frame_duration=480)
+        self.assertEqual((result.frames, result.duration), (100, 480))
+        self.assertEqual(result.concealed, 0)
+        self.assertAlmostEqual(
+            result.bitrate, result.bytes * 8 * 100 / result.frames)
+        self.assertEqual(len(result.pcm) % (2 * 480), 0)
+        with self.assertRaises(ValueError):
+            opuslib_next.sim.simulate(
+                self.pcm, opuslib_next.sim.Network(), frame_duration=1000)
+
+    def test_outage_is_concealed_throughout(self):
+        class Outage(object):
+            sent = 0
+
+            def lost(self):
+                self.sent += 1
+                return self.sent > 20
+
+        # The ticks faded to silence are concealment too
+        result = opuslib_next.sim.simulate(
+            self.pcm, opuslib_next.sim.Network(loss=Outage(), delay=480))
+        self.assertEqual(result.network_lost, 30)
+        self.assertEqual(result.concealed, 30)
+        self.assertEqual(result.concealed_ratio, 30 / result.ticks)
+
+    def test_impaired_network_is_deterministic(self):
+        def run():
+            network = opuslib_next.sim.Network(
+                loss=opuslib_next.sim.GilbertElliottLoss.from_rate(
+                    0.1, 2, seed=7),
+                delay=960, jitter=1920, seed=8)
+            return opuslib_next.sim.simulate(
+                self.pcm, network, inband_fec=True)
+
+        first, second = run(), run()
+        self.assertGreater(first.network_lost, 0)
+        self.assertGreater(first.concealed + first.recovered, 0)
+        for name in ('network_lost', 'late', 'lost', 'recovered',
+                     'concealed', 'ticks'):
+            self.assertEqual(getattr(first, name), getattr(second, name))
+
+
+if __name__ == '__main__':
+    unittest.main()
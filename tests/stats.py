@@ -0,0 +1,90 @@
+"""Tests for the TOC-based packet statistics accumulator"""
+
+import unittest
+
+import opuslib_next
+import opuslib_next.packet
+import opuslib_next.stats
+
+
+class PacketStatsTest(unittest.TestCase):
+
+    def test_counters(self):
+        stats = opuslib_next.stats.PacketStats()
+        # CELT fullband 20 ms stereo, 100 bytes
+        stats.add(bytes([(31 << 3) | 0x4]) + bytes(99))
+        # SILK narrowband 10 ms mono DTX frame
+        stats.add(bytes([0]))
+        # Hybrid superwideband 20 ms, code 3 with 2 frames
+        stats.add(bytes([(13 << 3) | 0x3, 2]) + bytes(40))
+        stats.add(b'')
+
+        self.assertEqual(stats.packets, 4)
+        self.assertEqual(stats.bytes, 100 + 1 + 42)
+        self.assertEqual(stats.samples, 960 + 480 + 1920)
+        self.assertEqual(stats.stereo_packets, 1)
+        self.assertEqual(stats.dtx_packets, 1)
+        self.assertEqual(stats.empty_packets, 1)
+
+        counters = stats.as_dict()
+        self.assertEqual(counters['modes'], {
+            opuslib_next.packet.MODE_SILK_ONLY: 1,
+            opuslib_next.packet.MODE_HYBRID: 1,
+            opuslib_next.packet.MODE_CELT_ONLY: 1,
+        })
+        self.assertEqual(
+            counters['bandwidths'][opuslib_next.BANDWIDTH_FULLBAND], 1)
+        self.assertEqual(
+            counters['bandwidths'][opuslib_next.BANDWIDTH_SUPERWIDEBAND], 1)
+        self.assertEqual(counters['frame_sizes'][960], 2)
+        self.assertEqual(counters['frame_sizes'][480], 1)
+        self.assertEqual(counters['sizes'][0], 1)
+        self.assertEqual(counters['sizes'][1], 1)
+        self.assertEqual(counters['sizes'][6], 1)
+        self.assertEqual(counters['sizes'][7], 1)
+
+    def test_bitrate(self):
+        stats = opuslib_next.stats.PacketStats()
+        self.assertEqual(stats.bitrate, 0.0)
+        for _ in range(50):
+            stats.add(bytes([31 << 3]) + bytes(59))
+        self.assertAlmostEqual(stats.bitrate, 24000.0)
+        self.assertAlmostEqual(stats.duration, 1.0)
+
+        previous = stats.snapshot()
+        for _ in range(50):
+            stats.add(bytes([31 << 3]) + bytes(119))
+        self.assertAlmostEqual(stats.bitrate_since(previous), 48000.0)
+        self.assertAlmostEqual(stats.bitrate, 36000.0)
+        self.assertEqual(previous.packets, 50)
+
+    def test_reset(self):
+        stats = opuslib_next.stats.PacketStats()
+        stats.add(bytes([0x4, 1, 2]))
+        stats.reset()
+        self.assertEqual(
+            stats.as_dict(), opuslib_next.stats.PacketStats().as_dict())
+
+    def test_add_batch(self):
+        packets = [bytes([31 << 3]) + bytes(n) for n in (10, 20, 30)]
+        batch = opuslib_next.packet.PacketBatch.from_packets(packets)
+        batched = opuslib_next.stats.PacketStats()
+        batched.add_batch(batch)
+        single = opuslib_next.stats.PacketStats()
+        for packet in packets:
+            single.add(packet)
+        self.assertEqual(batched.counters, single.counters)
+
+    def test_encoded_stream(self):
+        encoder = opuslib_next.Encoder(
+            48000, 1, opuslib_next.APPLICATION_AUDIO)
+        stats = opuslib_next.stats.PacketStats()
+        pcm = bytes(960 * 2)
+        for _ in range(10):
+            stats.add(encoder.encode(pcm, 960))
+        self.assertEqual(stats.samples, 9600)
+        self.assertEqual(stats.packets, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
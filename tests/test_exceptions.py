@@ -1,3 +1,4 @@
+import pickle
 import unittest
 from unittest import mock
 
@@ -11,3 +12,7 @@ class OpusErrorTest(unittest.TestCase):
             return_value=b"bad argument"
         ):
             self.assertEqual("bad argument", str(opuslib_next.OpusError(-1)))
+
+    def test_pickle_roundtrip(self):
+        error = pickle.loads(pickle.dumps(opuslib_next.OpusError(-4)))
+        self.assertEqual(-4, error.code)
@@ -0,0 +1,237 @@
+"""Tests for the WebM Opus muxer and demuxer"""
+
+import io
+import os
+import struct
+import tempfile
+import unittest
+
+import opuslib_next
+import opuslib_next.webm
+
+webm = opuslib_next.webm
+
+
+class WebMTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.webm')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write_file(self, data):
+        with open(self.path, 'wb') as fileobj:
+            fileobj.write(data)
+
+    def test_roundtrip(self):
+        encoder = opuslib_next.Encoder(
+            48000, 2, opuslib_next.APPLICATION_AUDIO)
+        packets = [encoder.encode(bytes(960 * 4), 960) for _ in range(300)]
+        with open(self.path, 'wb') as fileobj:
+            with webm.WebMWriter(
+                    fileobj, encoder=encoder,
+                    cluster_duration=2000) as writer:
+                writer.write_packets(packets)
+
+        with webm.WebMReader(self.path) as reader:
+            self.assertEqual(reader.track, 1)
+            self.assertEqual(reader.channels, 2)
+            self.assertEqual(reader.pre_skip, encoder.lookahead)
+            self.assertEqual(reader.seek_preroll, webm.SEEK_PREROLL)
+            self.assertEqual(
+                [time for time, _ in reader.cues],
+                [0, 2000000000, 4000000000])
+
+            read = list(reader)
+            self.assertEqual([bytes(packet) for packet, _, _ in read], packets)
+            self.assertEqual(
+                [timestamp for _, timestamp, _ in read],
+                [index * 20000000 for index in range(300)])
+            self.assertTrue(all(padding == 0 for _, _, padding in read))
+            self.assertIsInstance(read[0][0], memoryview)
+
+            decoder = reader.decoder()
+            self.assertEqual(len(decoder.decode(bytes(read[0][0]), 960)),
+                             960 * 4)
+            del read
+
+    def test_finalized_headers(self):
+        with open(self.path, 'wb') as fileobj:
+            with webm.WebMWriter(fileobj, 1) as writer:
+                for _ in range(50):
+                    writer.write_packet(bytes([31 << 3, 0]))
+        with open(self.path, 'rb') as fileobj:
+            data = fileobj.read()
+
+        element_id, start, size = webm._read_element(data, 0)
+        element_id, start, size = webm._read_element(data, start + size)
+        self.assertEqual(element_id, webm.SEGMENT)
+        self.assertEqual(start + size, len(data))
+        self.assertEqual(
+            webm._read_element(data, start)[0], webm.SEEK_HEAD)
+
+        duration = data.index(b'\x44\x89\x88') + 3
+        self.assertEqual(
+            struct.unpack('>d', data[duration:duration + 8])[0],
+            (50 * 960 - 312) / 48)
+
+    def test_non_seekable(self):
+        class Stream(io.BytesIO):
+            def seekable(self):
+                return False
+
+        stream = Stream()
+        with webm.WebMWriter(stream, 1) as writer:
+            for _ in range(10):
+                writer.write_packet(bytes([31 << 3, 0]))
+        self.write_file(stream.getvalue())
+
+        with webm.WebMReader(self.path) as reader:
+            self.assertEqual(len(list(reader)), 10)
+            # Without a SeekHead the trailing Cues are not located
+            self.assertEqual(reader.cues, [])
+            self.assertEqual(reader.seek(10 ** 9), reader.seek(0))
+
+    def test_discard_padding(self):
+        with open(self.path, 'wb') as fileobj:
+            writer = webm.WebMWriter(fileobj, 1, pre_skip=312)
+            for _ in range(3):
+                writer.write_packet(bytes([31 << 3, 0]))
+            writer.close(samples=2000)
+
+        with webm.WebMReader(self.path) as reader:
+            paddings = [padding for _, _, padding in reader]
+        self.assertEqual(
+            paddings, [0, 0, (3 * 960 - 312 - 2000) * 1000000000 // 48000])
+
+        # The Duration is the trimmed length
+        with open(self.path, 'rb') as fileobj:
+            data = fileobj.read()
+        duration = data.index(b'\x44\x89\x88') + 3
+        self.assertEqual(
+            struct.unpack('>d', data[duration:duration + 8])[0], 2000 / 48)
+
+    def test_seek(self):
+        with open(self.path, 'wb') as fileobj:
+            with webm.WebMWriter(
+                    fileobj, 1, cluster_duration=1000) as writer:
+                for _ in range(250):
+                    writer.write_packet(bytes([31 << 3, 0]))
+
+        with webm.WebMReader(self.path) as reader:
+            offset = reader.seek(3050000000)
+            packet, timestamp, _ = next(reader.packets(offset))
+            self.assertEqual(timestamp, 2000000000)
+            offset = reader.seek(3100000000)
+            packet, timestamp, _ = next(reader.packets(offset))
+            self.assertEqual(timestamp, 3000000000)
+            self.assertEqual(reader.seek(0), reader.seek(-1))
+
+    def test_multistream(self):
+        encoder = opuslib_next.MultiStreamEncoder(
+            48000, 3, 2, 1, [0, 1, 2], opuslib_next.APPLICATION_AUDIO)
+        with open(self.path, 'wb') as fileobj:
+            with webm.WebMWriter(fileobj, encoder=encoder) as writer:
+                writer.write_packet(encoder.encode(bytes(960 * 6), 960))
+
+        with webm.WebMReader(self.path) as reader:
+            self.assertEqual(reader.head.mapping_family, 1)
+            self.assertIsInstance(
+                reader.decoder(), opuslib_next.MultiStreamDecoder)
+
+    def test_browser_style_file(self):
+        # Unknown-size segment and clusters, laced blocks, a foreign track
+        head = opuslib_next.ogg.OpusHead(1).to_bytes()
+        packet = [bytes([31 << 3, n]) for n in range(7)]
+        tracks = webm._element(webm.TRACKS, b''.join((
+            webm._element(webm.TRACK_ENTRY, b''.join((
+                webm._uint_element(webm.TRACK_NUMBER, 1),
+                webm._element(webm.CODEC_ID_ELEMENT, b'V_VP8'),
+            ))),
+            webm._element(webm.TRACK_ENTRY, b''.join((
+                webm._uint_element(webm.TRACK_NUMBER, 2),
+                webm._element(webm.CODEC_ID_ELEMENT, b'A_OPUS'),
+                webm._element(webm.CODEC_PRIVATE, head),
+            ))),
+        )))
+
+        def block(track, time, flags, payload):
+            return webm._element(
+                webm.SIMPLE_BLOCK,
+                bytes([0x80 | track]) + struct.pack('>hB', time, flags) +
+                payload)
+
+        unknown = webm._encode_size(webm._UNKNOWN_SIZE, 8)
+        data = webm._element(
+            webm.EBML, webm._element(webm.DOC_TYPE, b'webm'))
+        data += webm._encode_id(webm.SEGMENT) + unknown + tracks
+        data += webm._encode_id(webm.CLUSTER) + unknown
+        data += webm._uint_element(webm.TIMECODE, 100)
+        data += block(1, 0, 0x80, b'video')
+        data += block(2, 0, 0x80, packet[0])
+        # Xiph lacing of two packets
+        data += block(2, 20, 0x82, bytes([1, 2]) + packet[1] + packet[2])
+        data += webm._encode_id(webm.CLUSTER) + unknown
+        data += webm._uint_element(webm.TIMECODE, 200)
+        # Fixed-size lacing of two packets
+        data += block(2, 0, 0x84, bytes([1]) + packet[3] + packet[4])
+        # EBML lacing of two packets
+        data += block(2, 40, 0x86, bytes([1, 0x82]) + packet[5] + packet[6])
+        self.write_file(data)
+
+        with webm.WebMReader(self.path) as reader:
+            self.assertEqual(reader.track, 2)
+            read = [(bytes(p), t // 1000000) for p, t, _ in reader]
+        self.assertEqual(read, [
+            (packet[0], 100), (packet[1], 120), (packet[2], 140),
+            (packet[3], 200), (packet[4], 220),
+            (packet[5], 240), (packet[6], 260)])
+
+    def test_cues_of_other_tracks(self):
+        head = opuslib_next.ogg.OpusHead(1).to_bytes()
+        tracks = webm._element(webm.TRACKS, b''.join((
+            webm._element(webm.TRACK_ENTRY, b''.join((
+                webm._uint_element(webm.TRACK_NUMBER, 1),
+                webm._element(webm.CODEC_ID_ELEMENT, b'V_VP8'),
+            ))),
+            webm._element(webm.TRACK_ENTRY, b''.join((
+                webm._uint_element(webm.TRACK_NUMBER, 2),
+                webm._element(webm.CODEC_ID_ELEMENT, b'A_OPUS'),
+                webm._element(webm.CODEC_PRIVATE, head),
+            ))),
+        )))
+
+        def point(time, *positions):
+            return webm._element(webm.CUE_POINT, webm._uint_element(
+                webm.CUE_TIME, time) + b''.join(
+                webm._element(
+                    webm.CUE_TRACK_POSITIONS,
+                    webm._uint_element(webm.CUE_TRACK, track) +
+                    webm._uint_element(webm.CUE_CLUSTER_POSITION, position))
+                for track, position in positions))
+
+        # Cues ahead of the Tracks, points of the video track only or both
+        cues = webm._element(webm.CUES, point(0, (1, 1000), (2, 2000)) +
+                             point(500, (1, 3000)) +
+                             point(1000, (2, 4000), (1, 5000)))
+        body = cues + tracks
+        data = webm._element(
+            webm.EBML, webm._element(webm.DOC_TYPE, b'webm'))
+        data += webm._element(webm.SEGMENT, body)
+        self.write_file(data)
+
+        with webm.WebMReader(self.path) as reader:
+            start = reader._segment_start
+            self.assertEqual(reader.cues, [
+                (0, start + 2000), (1000000000, start + 4000)])
+
+    def test_not_webm(self):
+        self.write_file(b'OggS not a webm file')
+        with self.assertRaises(ValueError):
+            webm.WebMReader(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()